@@ -0,0 +1,341 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+from HashEngine import HashEngine
+from HashIndex import HashIndex
+from FolderCompare import FolderCompare
+from ZipBuilder import ZipBuilder
+
+#resource 只在类 Unix 系统上可用，Windows 下不统计 CPU 子进程时间和峰值内存
+try:
+    import resource
+except ImportError:
+    resource = None
+
+#定义一个基准测试工具
+#生成可复现的 previous / current 模拟目录树，分别测试比较、导出、压缩各个阶段，
+#输出每个阶段的耗时、CPU 时间、读写字节数和峰值内存，并可以与保存的基线对比，超过阈值时返回非 0
+class Benchmark:
+    TREE_INFO_NAME = "tree.json"
+    #基线对比的指标
+    CHECK_KEYS = ("wall_seconds", "cpu_seconds")
+    DEFAULT_THRESHOLD = 0.2
+    #仓库中保存的基线，使用默认的目录树参数记录，不同机器上需要用 --save-baseline 重新记录
+    BASELINE_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "benchmark_baseline.json")
+    BLOCK_SIZE = 4096
+
+    def __init__(self, work_dir, files=2000, min_size=1024, max_size=4 * 1024 * 1024, change_ratio=0.05, rename_ratio=0.01,
+                 add_ratio=0.01, delete_ratio=0.01, compressibility=0.5, seed=1):
+        self.work_dir = work_dir
+        self.params = {
+            "files": files,
+            "min_size": min_size,
+            "max_size": max_size,
+            "change_ratio": change_ratio,
+            "rename_ratio": rename_ratio,
+            "add_ratio": add_ratio,
+            "delete_ratio": delete_ratio,
+            "compressibility": compressibility,
+            "seed": seed
+        }
+        self.previous_path = os.path.join(work_dir, "previous")
+        self.current_path = os.path.join(work_dir, "current")
+        self.export_path = os.path.join(work_dir, "export")
+
+    #生成指定大小的文件内容：按块混合随机数据和可压缩的重复数据，compressibility 为可压缩块的比例
+    def _content(self, generator, size):
+        blocks = []
+        pattern = b"upgrade package benchmark payload "
+        for offset in range(0, size, Benchmark.BLOCK_SIZE):
+            length = min(Benchmark.BLOCK_SIZE, size - offset)
+            if generator.random() < self.params["compressibility"]:
+                blocks.append((pattern * (length // len(pattern) + 1))[:length])
+            else:
+                blocks.append(generator.randbytes(length))
+        return b"".join(blocks)
+
+    #文件大小按对数均匀分布，小文件多、大文件少，接近真实安装包的分布
+    def _size(self, generator):
+        low = max(self.params["min_size"], 1)
+        high = max(self.params["max_size"], low)
+        return int(round(low * (high / low) ** generator.random()))
+
+    @staticmethod
+    def _relative_path(index, prefix="file"):
+        return os.path.join("App", "dir%03d" % (index % 97), "sub%02d" % (index % 13), prefix + "%07d.bin" % index)
+
+    @staticmethod
+    def _write(path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    #生成两个版本的目录树，参数与已有的目录树相同时直接复用
+    def generate(self, force=False):
+        info_path = os.path.join(self.work_dir, Benchmark.TREE_INFO_NAME)
+        if not force and os.path.exists(info_path):
+            with open(info_path, 'r', -1, "utf-8") as f:
+                if json.load(f) == self.params:
+                    return False
+        for path in (self.previous_path, self.current_path, self.export_path):
+            if os.path.exists(path):
+                shutil.rmtree(path)
+        generator = random.Random(self.params["seed"])
+        files = self.params["files"]
+        for index in range(files):
+            relativePath = Benchmark._relative_path(index)
+            data = self._content(generator, self._size(generator))
+            Benchmark._write(os.path.join(self.previous_path, relativePath), data)
+            choice = generator.random()
+            bound = self.params["delete_ratio"]
+            if choice < bound:
+                continue
+            bound += self.params["rename_ratio"]
+            if choice < bound:
+                relativePath = Benchmark._relative_path(index, "renamed")
+            else:
+                bound += self.params["change_ratio"]
+                if choice < bound and len(data) > 0:
+                    #修改一小段内容，一半的文件同时改变大小
+                    position = generator.randrange(len(data))
+                    length = min(Benchmark.BLOCK_SIZE, len(data) - position)
+                    patch = generator.randbytes(length)
+                    if generator.random() < 0.5:
+                        patch += generator.randbytes(16)
+                    data = data[:position] + patch + data[position + length:]
+            Benchmark._write(os.path.join(self.current_path, relativePath), data)
+        for index in range(int(files * self.params["add_ratio"])):
+            Benchmark._write(os.path.join(self.current_path, Benchmark._relative_path(index, "added")),
+                             self._content(generator, self._size(generator)))
+        os.makedirs(self.work_dir, exist_ok=True)
+        with open(info_path, 'w', -1, "utf-8") as f:
+            json.dump(self.params, f)
+        return True
+
+    #当前进程的读写字节数，只有 Linux 提供 /proc/self/io【静态函数】
+    @staticmethod
+    def _io_counters():
+        try:
+            with open("/proc/self/io") as f:
+                counters = dict(line.split(": ") for line in f.read().splitlines())
+            return {key: int(counters[key]) for key in ("rchar", "wchar", "read_bytes", "write_bytes")}
+        except (OSError, KeyError, ValueError):
+            return None
+
+    #当前进程和已结束子进程的 CPU 时间，进程池的工作进程计入子进程【静态函数】
+    @staticmethod
+    def _cpu_seconds():
+        if resource is None:
+            return time.process_time()
+        total = 0
+        for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+            usage = resource.getrusage(who)
+            total += usage.ru_utime + usage.ru_stime
+        return total
+
+    #重置峰值内存统计，这样每个阶段的峰值只反映该阶段，不支持时返回 False【静态函数】
+    @staticmethod
+    def _reset_peak_rss():
+        try:
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+            return True
+        except OSError:
+            return False
+
+    #峰值内存（字节），Linux 读取 VmHWM，其他系统使用 ru_maxrss【静态函数】
+    @staticmethod
+    def _peak_rss():
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        #macOS 的 ru_maxrss 单位是字节，Linux 是 KB
+        return peak if sys.platform == "darwin" else peak * 1024
+
+    #运行一个阶段并统计资源消耗，返回 (统计信息, 阶段函数的返回值)【静态函数】
+    @staticmethod
+    def measure(stage):
+        Benchmark._reset_peak_rss()
+        io_begin = Benchmark._io_counters()
+        cpu_begin = Benchmark._cpu_seconds()
+        begin = time.perf_counter()
+        value = stage()
+        result = {
+            "wall_seconds": round(time.perf_counter() - begin, 4),
+            "cpu_seconds": round(Benchmark._cpu_seconds() - cpu_begin, 4),
+            "peak_rss_bytes": Benchmark._peak_rss()
+        }
+        io_end = Benchmark._io_counters()
+        if io_begin is not None and io_end is not None:
+            for key in io_begin:
+                result[key] = io_end[key] - io_begin[key]
+        return result, value
+
+    #按输入字节数补充吞吐量【静态函数】
+    @staticmethod
+    def throughput(stage, input_bytes):
+        stage["input_bytes"] = input_bytes
+        stage["mb_per_second"] = round(input_bytes / max(stage["wall_seconds"], 1e-9) / 1024 / 1024, 1)
+
+    #提示内核丢弃目录树的页缓存，不需要 root 权限，只对没有修改过的页有效【静态函数】
+    @staticmethod
+    def evict(directory):
+        if not hasattr(os, "posix_fadvise"):
+            return False
+        for record in FolderCompare.walk(directory):
+            fd = os.open(record[0], os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+        return True
+
+    #对比两种方式计算整个当前版本的哈希值：按遍历顺序读取，以及按磁盘顺序读取并使用预读提示
+    #每次运行前先丢弃页缓存，尽量从磁盘读取
+    def run_io_order(self, hash_engine):
+        records = list(FolderCompare.walk(self.current_path))
+        file_list = [record[0] for record in records]
+        sizes = [record[2] for record in records]
+        inodes = [record[4] for record in records]
+        io_order = hash_engine.io_order if hash_engine.io_order != HashEngine.ORDER_NONE else HashEngine.ORDER_INODE
+        stages = {}
+        for name, order, hints in (("hash_naive", HashEngine.ORDER_NONE, False), ("hash_ordered", io_order, True)):
+            with HashEngine(hash_engine.workers, hash_engine.use_process, hash_engine.buffer_size, hash_engine.algorithm,
+                            hash_engine.mmap_threshold, order, hints, hash_engine.window_bytes) as engine:
+                Benchmark.evict(self.current_path)
+                stages[name], value = Benchmark.measure(lambda: engine.hash_files_raw(file_list, sizes, inodes))
+        return stages
+
+    #依次运行比较、导出、压缩阶段，direct 阶段测试不经过暂存目录直接写入压缩包
+    #io_compare 为 True 时额外对比按遍历顺序和按磁盘顺序读取的耗时
+    #zip_compare 为 True 时额外用单线程和系统压缩工具压缩暂存目录
+    #hash_engine 为空时使用默认参数的哈希引擎
+    def run(self, hash_engine=None, index_path="", io_compare=False, zip_compare=False):
+        if hash_engine is None:
+            hash_engine = HashEngine()
+        if os.path.exists(self.export_path):
+            shutil.rmtree(self.export_path)
+        os.makedirs(self.export_path)
+        hash_index = HashIndex(index_path, hash_engine.algorithm) if index_path != "" else None
+        folderCompare = FolderCompare(self.previous_path, self.current_path, hash_engine, hash_index)
+        stages = {}
+        stages["compare"], value = Benchmark.measure(folderCompare.compare)
+        stage_path = os.path.join(self.export_path, "diff")
+        stages["stage"], value = Benchmark.measure(lambda: folderCompare.copyDiff(stage_path))
+        staged_records = list(FolderCompare.walk(stage_path))
+        staged_entries = [(record[0], record[1].replace(os.sep, "/")) for record in staged_records]
+        stages["compress"], value = Benchmark.measure(
+            lambda: ZipBuilder.compress_files(staged_entries, os.path.join(self.export_path, "staged.zip")))
+        stages["direct"], value = Benchmark.measure(
+            lambda: ZipBuilder.compress_files(folderCompare.diffEntries(), os.path.join(self.export_path, "direct.zip")))
+        #压缩阶段的吞吐量按暂存文件的总大小计算，符号链接按链接本身计算，与遍历记录的大小一致
+        staged_bytes = sum(record[2] for record in staged_records)
+        for name in ("compress", "direct"):
+            Benchmark.throughput(stages[name], staged_bytes)
+        if zip_compare:
+            #同样的暂存目录分别用单线程和系统工具压缩，对比吞吐量
+            stages["compress_serial"], value = Benchmark.measure(
+                lambda: ZipBuilder.compress_files(staged_entries, os.path.join(self.export_path, "serial.zip"), workers=1))
+            Benchmark.throughput(stages["compress_serial"], staged_bytes)
+            #系统工具在源文件夹的上级目录中执行，需要绝对路径
+            system_zip = os.path.abspath(os.path.join(self.export_path, "system.zip"))
+            stages["compress_system"], value = Benchmark.measure(
+                lambda: ZipBuilder(os.path.abspath(stage_path), ZipBuilder.ENGINE_SYSTEM).compress(system_zip))
+            Benchmark.throughput(stages["compress_system"], staged_bytes)
+        if hash_index is not None:
+            hash_index.close()
+        hash_engine.close()
+        if io_compare:
+            stages.update(self.run_io_order(hash_engine))
+        return {
+            "params": self.params,
+            "python": sys.version.split()[0],
+            "platform": sys.platform,
+            "compare_stats": folderCompare.stage_stats,
+            "stages": stages
+        }
+
+    #与基线对比，返回超过阈值的指标列表【静态函数】
+    #只对比参数相同的结果；很短的阶段容易受噪声影响，低于 min_seconds 的指标不参与对比
+    @staticmethod
+    def check(result, baseline, threshold=DEFAULT_THRESHOLD, min_seconds=0.05):
+        if baseline.get("params") != result["params"]:
+            raise ValueError("baseline was recorded with different tree parameters")
+        regressions = []
+        for name, stage in result["stages"].items():
+            base_stage = baseline["stages"].get(name)
+            if base_stage is None:
+                continue
+            for key in Benchmark.CHECK_KEYS:
+                base_value = base_stage.get(key)
+                if base_value is None or max(base_value, stage[key]) < min_seconds:
+                    continue
+                if stage[key] > base_value * (1 + threshold):
+                    regressions.append("%s.%s: %.4f > %.4f * %.2f" % (name, key, stage[key], base_value, 1 + threshold))
+        return regressions
+
+
+#main函数
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='benchmark the compare -> stage -> compress pipeline on synthetic trees')
+    parser.add_argument('workDir')
+    parser.add_argument('--files', type=int, default=2000, help='file count of the previous tree')
+    parser.add_argument('--min-size', type=int, default=1024, help='smallest file size in bytes')
+    parser.add_argument('--max-size', type=int, default=4 * 1024 * 1024, help='largest file size in bytes, sizes are log-uniform')
+    parser.add_argument('--change-ratio', type=float, default=0.05, help='ratio of modified files')
+    parser.add_argument('--rename-ratio', type=float, default=0.01, help='ratio of renamed files')
+    parser.add_argument('--add-ratio', type=float, default=0.01, help='ratio of added files')
+    parser.add_argument('--delete-ratio', type=float, default=0.01, help='ratio of deleted files')
+    parser.add_argument('--compressibility', type=float, default=0.5, help='ratio of compressible blocks in every file')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--regenerate', action='store_true', help='regenerate the trees even if the parameters did not change')
+    parser.add_argument('--workers', type=int, default=0, help='hash worker count, 0 means cpu count')
+    parser.add_argument('--process', action='store_true', help='hash with a process pool instead of threads')
+    parser.add_argument('--auto-process', action='store_true', help='choose threads or processes from the algorithm and file sizes')
+    parser.add_argument('--algorithm', default=HashEngine.DEFAULT_ALGORITHM, choices=HashEngine.available_algorithms())
+    parser.add_argument('--io-order', default=HashEngine.ORDER_INODE, choices=[HashEngine.ORDER_NONE, HashEngine.ORDER_INODE, HashEngine.ORDER_EXTENT], help='order in which files are read for hashing')
+    parser.add_argument('--io-hints', action='store_true', help='issue posix_fadvise readahead and drop-behind hints, for NAS or cold trees')
+    parser.add_argument('--io-compare', action='store_true', help='also hash the current tree in walk order and in disk order with a cold page cache')
+    parser.add_argument('--zip-compare', action='store_true', help='also compress the staged tree single-threaded and with the system zip tool')
+    parser.add_argument('--index', default='', help='persistent hash index file, empty means no index')
+    parser.add_argument('--output', default='', help='write the result json to this file')
+    parser.add_argument('--baseline', default='', help='baseline result json to check against, benchmark_baseline.json is recorded with the default tree parameters')
+    parser.add_argument('--save-baseline', action='store_true', help='store this run as the baseline instead of checking it')
+    parser.add_argument('--threshold', type=float, default=Benchmark.DEFAULT_THRESHOLD, help='allowed slowdown ratio against the baseline')
+    args = parser.parse_args()
+
+    benchmark = Benchmark(args.workDir, args.files, args.min_size, args.max_size, args.change_ratio, args.rename_ratio,
+                          args.add_ratio, args.delete_ratio, args.compressibility, args.seed)
+    if benchmark.generate(args.regenerate):
+        print('generated trees in ' + args.workDir)
+    engine = HashEngine(args.workers, HashEngine.POOL_AUTO if args.auto_process else args.process, algorithm=args.algorithm,
+                        io_order=args.io_order, io_hints=args.io_hints)
+    result = benchmark.run(engine, args.index, args.io_compare, args.zip_compare)
+    text = json.dumps(result, indent=4)
+    print(text)
+    if args.output != '':
+        with open(args.output, 'w', -1, "utf-8") as f:
+            f.write(text)
+    if args.baseline == '':
+        sys.exit(0)
+    if args.save_baseline:
+        with open(args.baseline, 'w', -1, "utf-8") as f:
+            f.write(text)
+        print('baseline saved to ' + args.baseline)
+        sys.exit(0)
+    with open(args.baseline, 'r', -1, "utf-8") as f:
+        regressions = Benchmark.check(result, json.load(f), args.threshold)
+    for regression in regressions:
+        print('regression: ' + regression)
+    sys.exit(1 if len(regressions) > 0 else 0)
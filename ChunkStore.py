@@ -0,0 +1,203 @@
+import os
+import sys
+import json
+import random
+import hashlib
+
+#定义一个内容分块存储
+#使用 FastCDC 风格的 gear 滚动哈希按内容切分文件，切分点只取决于附近的字节，
+#文件中间插入或删除少量字节时，其余分块保持不变，可以跨版本复用
+#差异包只包含旧版本中不存在的分块（chunks.pack），每个文件用一份 recipe 描述如何拼装
+#切分点在 Python 层逐字节计算，吞吐量只有每秒十几 MB，只适合文件总量不大的目录树，需要在配置中显式打开；
+#大于 max_file_size 的文件不分块，按完整文件导出，也不参与旧版本的分块索引
+class ChunkStore:
+    PACK_NAME = "chunks.pack"
+    RECIPE_NAME = "chunk_recipes.json"
+    DEFAULT_MIN_SIZE = 16 * 1024
+    DEFAULT_AVG_SIZE = 64 * 1024
+    DEFAULT_MAX_SIZE = 256 * 1024
+    #参与分块的最大文件大小
+    DEFAULT_MAX_FILE_SIZE = 64 * 1024 * 1024
+    #固定种子生成 gear 表，保证每次构建的切分结果一致
+    GEAR_SEED = 0x5EED
+    IO_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, min_size=DEFAULT_MIN_SIZE, avg_size=DEFAULT_AVG_SIZE, max_size=DEFAULT_MAX_SIZE,
+                 max_file_size=DEFAULT_MAX_FILE_SIZE):
+        self.min_size = min_size
+        self.avg_size = avg_size
+        self.max_size = max_size
+        self.max_file_size = max_file_size
+        generator = random.Random(ChunkStore.GEAR_SEED)
+        self.gear = [generator.getrandbits(32) for i in range(256)]
+        #归一化分块：未到平均大小前使用更严格的掩码，超过后使用更宽松的掩码，让分块大小集中在平均值附近
+        bits = max(avg_size.bit_length() - 1, 4)
+        self.mask_small = ChunkStore._mask(bits + 2)
+        self.mask_large = ChunkStore._mask(bits - 2)
+
+    #生成 bits 个 1 分布在高位的掩码，gear 哈希的高位混合了更多字节
+    @staticmethod
+    def _mask(bits):
+        return ((1 << bits) - 1) << (32 - bits)
+
+    #在 buffer 中寻找第一个切分点，返回分块长度，buffer 为 memoryview，切片不拷贝数据
+    #前 min_size 个字节不可能是切分点，直接跳过不计算哈希
+    def _cut(self, buffer):
+        size = len(buffer)
+        if size <= self.min_size:
+            return size
+        if size > self.max_size:
+            size = self.max_size
+        normal = min(self.avg_size, size)
+        gear = self.gear
+        mask = self.mask_small
+        hash_value = 0
+        position = self.min_size
+        for byte in buffer[self.min_size:normal]:
+            hash_value = ((hash_value << 1) + gear[byte]) & 0xFFFFFFFF
+            position += 1
+            if not hash_value & mask:
+                return position
+        mask = self.mask_large
+        for byte in buffer[normal:size]:
+            hash_value = ((hash_value << 1) + gear[byte]) & 0xFFFFFFFF
+            position += 1
+            if not hash_value & mask:
+                return position
+        return size
+
+    #切分文件，返回 (偏移, 长度, 摘要) 列表
+    def chunks(self, file_path):
+        result = []
+        offset = 0
+        buffer = b""
+        position = 0
+        eof = False
+        with open(file_path, "rb") as file:
+            while True:
+                #缓冲区剩余数据不足一个最大分块时继续读取
+                if not eof and len(buffer) - position < self.max_size:
+                    data = file.read(ChunkStore.IO_SIZE)
+                    if data:
+                        buffer = buffer[position:] + data
+                        view = memoryview(buffer)
+                        position = 0
+                        continue
+                    eof = True
+                if position >= len(buffer):
+                    break
+                window = view[position:position + self.max_size]
+                length = self._cut(window)
+                result.append((offset, length, hashlib.blake2b(window[:length], digest_size=16).digest()))
+                offset += length
+                position += length
+        return result
+
+    #文件是否参与分块：符号链接没有可以分块的内容，过大的文件切分太慢
+    def wants(self, node):
+        return node.size <= self.max_file_size and not os.path.islink(node.absolutePath)
+
+    #为旧版本的文件建立分块索引 {摘要: (相对路径, 偏移, 长度)}
+    def index(self, node_list):
+        chunk_index = {}
+        for node in node_list:
+            if not self.wants(node):
+                continue
+            for offset, length, digest in self.chunks(node.absolutePath):
+                chunk_index.setdefault(digest, (node.relativePath, offset, length))
+        return chunk_index
+
+    #把 FolderCompare 的新增和修改文件导出为分块包和 recipe，返回去重统计
+    #旧版本的分块索引由修改文件对应的旧文件和已删除的文件构建，这些是新文件最可能复用的内容
+    def export(self, folderCompare, diff_dest_path):
+        old_nodes = [node.previous for node in folderCompare.diff_dict.values() if node.previous is not None]
+        old_nodes.extend(folderCompare.deleted_dict.values())
+        old_index = self.index(old_nodes)
+        if not os.path.exists(diff_dest_path):
+            os.makedirs(diff_dest_path)
+        report = {"files": 0, "file_bytes": 0, "pack_bytes": 0, "reused_old_bytes": 0, "reused_pack_bytes": 0,
+                  "full_files": 0, "full_bytes": 0}
+        #分块包内已有的分块 {摘要: 偏移}，同一版本内重复的分块只写一次
+        pack_index = {}
+        recipes = {}
+        with open(os.path.join(diff_dest_path, ChunkStore.PACK_NAME), "wb") as pack:
+            for relativePath in sorted(folderCompare.diff_dict):
+                node = folderCompare.diff_dict[relativePath]
+                #move / copy 的文件不需要导出内容
+                if node.encoding in ("move", "copy"):
+                    continue
+                #不分块的文件按完整文件放进导出目录，符号链接按链接本身暂存
+                if not self.wants(node):
+                    folderCompare.stager.stage(node.absolutePath, os.path.join(diff_dest_path, relativePath))
+                    report["full_files"] += 1
+                    report["full_bytes"] += node.size
+                    continue
+                recipe = []
+                with open(node.absolutePath, "rb") as file:
+                    for offset, length, digest in self.chunks(node.absolutePath):
+                        if digest in old_index:
+                            source, source_offset = old_index[digest][:2]
+                            source = source.replace(os.sep, "/")
+                            report["reused_old_bytes"] += length
+                        elif digest in pack_index:
+                            source = ""
+                            source_offset = pack_index[digest]
+                            report["reused_pack_bytes"] += length
+                        else:
+                            file.seek(offset)
+                            source = ""
+                            source_offset = pack.tell()
+                            pack.write(file.read(length))
+                            pack_index[digest] = source_offset
+                            report["pack_bytes"] += length
+                        #与上一段来源相同且连续时合并
+                        if len(recipe) > 0 and recipe[-1][0] == source and recipe[-1][1] + recipe[-1][2] == source_offset:
+                            recipe[-1][2] += length
+                        else:
+                            recipe.append([source, source_offset, length])
+                node.encoding = "chunks"
+                recipes[relativePath.replace(os.sep, "/")] = recipe
+                report["files"] += 1
+                report["file_bytes"] += node.size
+        with open(os.path.join(diff_dest_path, ChunkStore.RECIPE_NAME), 'w', -1, "utf-8") as f:
+            json.dump({
+                "chunk": {"min": self.min_size, "avg": self.avg_size, "max": self.max_size},
+                "files": recipes
+            }, f, ensure_ascii=False, separators=(',', ':'))
+        report["saved_bytes"] = report["file_bytes"] - report["pack_bytes"]
+        report["saved_ratio"] = 0 if report["file_bytes"] == 0 else round(report["saved_bytes"] / report["file_bytes"], 4)
+        return report
+
+    #根据 recipe 还原文件：source 为空时从分块包读取，否则从旧版本的文件读取【静态函数】
+    @staticmethod
+    def restore(recipe, pack_path, old_root, dst_path):
+        with open(pack_path, "rb") as pack, open(dst_path, "wb") as dst:
+            for source, offset, length in recipe:
+                if source == "":
+                    pack.seek(offset)
+                    dst.write(pack.read(length))
+                else:
+                    with open(os.path.join(old_root, *source.split("/")), "rb") as old:
+                        old.seek(offset)
+                        dst.write(old.read(length))
+
+    #打印去重统计【静态函数】
+    @staticmethod
+    def print_report(report):
+        print("chunk dedup report: " + json.dumps(report))
+
+
+#main函数
+if __name__ == '__main__':
+    args = sys.argv
+    if len(args) != 3:
+        print('Usage: python ChunkStore.py file1 file2')
+        sys.exit(1)
+
+    #打印两个文件的分块复用情况
+    store = ChunkStore()
+    old_chunks = {digest: length for offset, length, digest in store.chunks(args[1])}
+    new_chunks = store.chunks(args[2])
+    reused = sum(length for offset, length, digest in new_chunks if digest in old_chunks)
+    total = sum(length for offset, length, digest in new_chunks)
+    print('chunks: %d reused bytes: %d / %d' % (len(new_chunks), reused, total))
@@ -1,6 +1,8 @@
 import os
 import sys
 import json
+from ManifestTable import ManifestTable
+from IgnoreRules import IgnoreRules
 
 #定义一个版本节点
 class VersionNode:
@@ -34,6 +36,10 @@ class VersionNode:
         
         return diff_package_name
     
+    def get_previous_manifest_url(self):
+        #返回上个版本的版本清单的url，与上个版本的差异包在同一个目录
+        return self.server_url + "/" + self.previous_version + "/" + ConfigParser.platform_key() + "/" + ManifestTable.MANIFEST_NAME
+
     def get_diff_dir_url(self):
         dir_url=self.server_url + "/" + self.current_version + "/" + ConfigParser.platform_key()
         #移除尾部的斜杠
@@ -50,11 +56,15 @@ class ConfigParser:
     def __init__(self, config_path):
         self.config_path = config_path
         self.version_dict = {}
+        self.compare_config = {}
+        self.ignore_rules = None
 
     def __init__(self):
         #获取当前文件路径
         self.config_path = os.path.dirname(os.path.realpath(__file__)) + "/config.json"
         self.version_dict = {}
+        self.compare_config = {}
+        self.ignore_rules = None
         
     @staticmethod
     def platform_key():
@@ -93,6 +103,53 @@ class ConfigParser:
             node = VersionNode(platform, previous_version, current_version, server_url, package_name)
             self.version_dict[platform] = node
 
+        #解析比较参数，缺省的字段使用默认值
+        self.compare_config = ConfigParser.default_compare_config()
+        if 'compare' in config_json:
+            self.compare_config.update(config_json["compare"])
+        self.ignore_rules = None
+
+    #比较参数的默认值
+    @staticmethod
+    def default_compare_config():
+        return {
+            "workers": 0,
+            #True 进程池，False 线程池，"auto" 根据算法和文件大小分布自动选择
+            "use_process": "auto",
+            "buffer_size": 1024 * 1024,
+            "algorithm": "md5",
+            "mmap_threshold": 64 * 1024 * 1024,
+            #读取顺序 none / inode / extent，以及是否使用 posix_fadvise 预读和丢弃页缓存
+            #丢弃的页缓存在导出和压缩时要重新读取，只在 NAS 或冷数据上打开
+            "io_order": "inode",
+            "io_hints": False,
+            "io_window": 256 * 1024 * 1024,
+            "hash_index": True,
+            "stream": False,
+            "mode": "hash",
+            "sample": False,
+            "manifest": True,
+            "delta": False,
+            "delta_ratio": 0.5,
+            #分块导出逐字节计算切分点，只适合文件总量不大的目录树，超过 ChunkStore.max_file_size 的文件按完整文件导出
+            "chunk_store": False,
+            "detect_moves": False,
+            "direct_archive": True,
+            "previous_manifest": True,
+            "version_manifest": True,
+            #压缩引擎 native（进程内并行压缩）/ system（ditto、zip.exe），以及压缩线程数，0 表示 CPU 核数
+            "zip_engine": "native",
+            "zip_workers": 0,
+            #已经压缩过的文件（图片、视频、压缩包等）直接存储
+            "zip_auto_store": True,
+            #两个版本包都是 zip 时直接比较中央目录的大小和 crc32，不整体解压；版本清单由中央目录生成
+            "zip_compare": False,
+            #直接比较 zip 时，完整写入差异包的条目原样拷贝新版本包中的压缩数据，不重新压缩
+            "zip_passthrough": True,
+            #遍历、暂存和上传时忽略的文件，语法与 .gitignore 相同
+            "ignore": list(IgnoreRules.DEFAULT_PATTERNS)
+        }
+
     #打印解析结果
     def print(self):
         for platform in self.version_dict:
@@ -104,5 +161,14 @@ class ConfigParser:
     
     def get_param(self):
         return self.version_dict[ConfigParser.platform_key()]
+
+    def get_compare_config(self):
+        return self.compare_config
+
+    #编译后的忽略规则，只编译一次
+    def get_ignore_rules(self):
+        if self.ignore_rules is None:
+            self.ignore_rules = IgnoreRules(self.compare_config.get("ignore", IgnoreRules.DEFAULT_PATTERNS))
+        return self.ignore_rules
     
 
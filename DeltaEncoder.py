@@ -0,0 +1,276 @@
+import os
+import sys
+import mmap
+import time
+import zlib
+import struct
+import hashlib
+import argparse
+from HashEngine import HashEngine
+
+#按偏移读取 delta 流的辅助类，从 zlib 解压流中按需读出指定长度的数据
+class _DeltaReader:
+    def __init__(self, file):
+        self.file = file
+        self.decompressor = zlib.decompressobj()
+        self.buffer = b""
+        #已读取的位置，避免每次读取都切片拷贝剩余数据
+        self.offset = 0
+
+    def read(self, size):
+        while len(self.buffer) - self.offset < size:
+            data = self.file.read(DeltaEncoder.IO_SIZE)
+            if data:
+                self.buffer = self.buffer[self.offset:] + self.decompressor.decompress(data)
+            else:
+                self.buffer = self.buffer[self.offset:] + self.decompressor.flush()
+            self.offset = 0
+            if not data:
+                break
+        result = self.buffer[self.offset:self.offset + size]
+        self.offset += len(result)
+        return result
+
+#定义一个二进制差分编码器
+#思路与 rsync 相同：旧文件按固定大小分块并以 Adler-32 为键建立索引，
+#新文件逐字节滚动计算 Adler-32 查找匹配块，匹配到的区间记为 COPY，其余字节记为 ADD
+#匹配成功后按块向后扩展，未修改的区域每次跳过一整块，只有修改过的区域需要逐字节滚动
+#指令流经过 zlib 压缩后写入 delta 文件，文件头记录旧文件的大小和 md5，还原前校验基准文件
+class DeltaEncoder:
+    MAGIC = b"UPDELTA2"
+    #文件头：MAGIC、旧文件大小、新文件大小、旧文件 md5
+    HEADER_SIZE = len(MAGIC) + 16 + 16
+    SUFFIX = ".delta"
+    DEFAULT_BLOCK_SIZE = 4096
+    #delta 文件大于新文件大小的 ratio 倍时放弃差分，直接使用完整文件
+    DEFAULT_RATIO = 0.5
+    #小于该大小的文件不做差分
+    DEFAULT_MIN_SIZE = 64 * 1024
+    #单条 ADD 指令的最大长度，保证解码时的内存占用有上限
+    MAX_ADD_SIZE = 1024 * 1024
+    IO_SIZE = 1024 * 1024
+    #逐字节滚动是 Python 层的循环，只适合少量修改的文件：
+    #连续这么多字节没有匹配块（包括文件开头）时认为这一段是新内容或两个文件无关，放弃差分
+    MAX_MISS_SIZE = 1024 * 1024
+    #逐字节滚动的总字节数上限，超过后放弃差分，单个文件的编码时间有上限
+    MAX_ROLL_SIZE = 8 * 1024 * 1024
+    OP_COPY = b"C"
+    OP_ADD = b"A"
+    ADLER_MOD = 65521
+
+    def __init__(self, ratio=DEFAULT_RATIO, block_size=DEFAULT_BLOCK_SIZE, min_size=DEFAULT_MIN_SIZE):
+        self.ratio = ratio
+        self.block_size = block_size
+        self.min_size = min_size
+
+    #为旧文件的每个对齐块建立 {Adler-32: 偏移} 索引
+    def _index(self, old):
+        block_size = self.block_size
+        index = {}
+        for offset in range(0, len(old) - block_size + 1, block_size):
+            index.setdefault(zlib.adler32(old[offset:offset + block_size]), offset)
+        return index
+
+    #生成差分指令，literal 字节数超过 limit、连续未匹配或滚动的字节数超过上限时提前返回 None
+    def _ops(self, old, new, limit):
+        block_size = self.block_size
+        index = self._index(old)
+        old_size = len(old)
+        new_size = len(new)
+        position = 0
+        literal_start = 0
+        literal_total = 0
+        roll_limit = min(limit, DeltaEncoder.MAX_ROLL_SIZE)
+        weak = None
+        while position + block_size <= new_size:
+            if weak is None:
+                weak = zlib.adler32(new[position:position + block_size])
+            offset = index.get(weak)
+            if offset is not None and old[offset:offset + block_size] == new[position:position + block_size]:
+                if literal_start < position:
+                    yield (DeltaEncoder.OP_ADD, literal_start, position - literal_start)
+                #按块向后扩展匹配区间
+                length = block_size
+                while (position + length + block_size <= new_size and offset + length + block_size <= old_size and
+                       old[offset + length:offset + length + block_size] == new[position + length:position + length + block_size]):
+                    length += block_size
+                yield (DeltaEncoder.OP_COPY, offset, length)
+                position += length
+                literal_start = position
+                weak = None
+                continue
+            if position + block_size >= new_size:
+                break
+            #滚动一个字节：移出 new[position]，移入 new[position + block_size]
+            out_byte = new[position]
+            in_byte = new[position + block_size]
+            a = ((weak & 0xffff) - out_byte + in_byte) % DeltaEncoder.ADLER_MOD
+            b = ((weak >> 16) - block_size * out_byte + a - 1) % DeltaEncoder.ADLER_MOD
+            weak = (b << 16) | a
+            position += 1
+            literal_total += 1
+            if literal_total > roll_limit or position - literal_start >= DeltaEncoder.MAX_MISS_SIZE:
+                yield None
+                return
+        if literal_start < new_size:
+            yield (DeltaEncoder.OP_ADD, literal_start, new_size - literal_start)
+
+    #两个文件都不小于 min_size 时才尝试差分
+    def wants(self, old_size, new_size):
+        return old_size >= self.min_size and new_size >= self.min_size
+
+    #对新文件做差分编码，delta 足够小时写入 delta_path 并返回 True，否则不产生文件并返回 False
+    def encode(self, old_path, new_path, delta_path):
+        old_size = os.path.getsize(old_path)
+        new_size = os.path.getsize(new_path)
+        if not self.wants(old_size, new_size):
+            return False
+        limit = int(new_size * self.ratio)
+        with open(old_path, "rb") as old_file, open(new_path, "rb") as new_file:
+            with mmap.mmap(old_file.fileno(), 0, access=mmap.ACCESS_READ) as old, \
+                 mmap.mmap(new_file.fileno(), 0, access=mmap.ACCESS_READ) as new:
+                delta_dir = os.path.dirname(delta_path)
+                if delta_dir != "" and not os.path.exists(delta_dir):
+                    os.makedirs(delta_dir)
+                kept = True
+                with open(delta_path, "wb") as delta_file:
+                    #旧文件的 md5 在确定保留 delta 后再计算和写入，放弃差分时不需要读取整个旧文件
+                    delta_file.write(DeltaEncoder.MAGIC + struct.pack("<QQ", old_size, new_size) + bytes(16))
+                    compressor = zlib.compressobj(6)
+                    for op in self._ops(old, new, limit):
+                        if op is None:
+                            kept = False
+                            break
+                        code, offset, length = op
+                        if code == DeltaEncoder.OP_COPY:
+                            delta_file.write(compressor.compress(code + struct.pack("<QQ", offset, length)))
+                            continue
+                        for begin in range(offset, offset + length, DeltaEncoder.MAX_ADD_SIZE):
+                            end = min(begin + DeltaEncoder.MAX_ADD_SIZE, offset + length)
+                            delta_file.write(compressor.compress(code + struct.pack("<Q", end - begin)))
+                            delta_file.write(compressor.compress(new[begin:end]))
+                        if delta_file.tell() > limit:
+                            kept = False
+                            break
+                    if kept:
+                        delta_file.write(compressor.flush())
+                        kept = delta_file.tell() <= limit
+                    if kept:
+                        delta_file.seek(DeltaEncoder.HEADER_SIZE - 16)
+                        delta_file.write(hashlib.md5(old).digest())
+        if not kept:
+            os.remove(delta_path)
+        return kept
+
+    #根据旧文件和 delta 文件还原新文件，旧文件的大小或 md5 与编码时不同时报错【静态函数】
+    @staticmethod
+    def decode(old_path, delta_path, new_path):
+        with open(delta_path, "rb") as delta_file:
+            header = delta_file.read(DeltaEncoder.HEADER_SIZE)
+            if len(header) != DeltaEncoder.HEADER_SIZE or header[:len(DeltaEncoder.MAGIC)] != DeltaEncoder.MAGIC:
+                raise ValueError("invalid delta file: " + delta_path)
+            old_size, new_size = struct.unpack_from("<QQ", header, len(DeltaEncoder.MAGIC))
+            if os.path.getsize(old_path) != old_size:
+                raise ValueError("base file size mismatch: " + old_path)
+            if HashEngine.calculate(old_path, algorithm="md5", raw=True) != header[-16:]:
+                raise ValueError("base file digest mismatch: " + old_path)
+            reader = _DeltaReader(delta_file)
+            with open(old_path, "rb") as old_file, open(new_path, "wb") as new_file:
+                while True:
+                    code = reader.read(1)
+                    if code == b"":
+                        break
+                    if code == DeltaEncoder.OP_COPY:
+                        offset, length = struct.unpack("<QQ", reader.read(16))
+                        old_file.seek(offset)
+                        while length > 0:
+                            data = old_file.read(min(length, DeltaEncoder.IO_SIZE))
+                            new_file.write(data)
+                            length -= len(data)
+                    elif code == DeltaEncoder.OP_ADD:
+                        length = struct.unpack("<Q", reader.read(8))[0]
+                        new_file.write(reader.read(length))
+                    else:
+                        raise ValueError("invalid delta op in " + delta_path)
+                if new_file.tell() != new_size:
+                    raise ValueError("decoded size mismatch: " + new_path)
+
+    #测试编码、解码耗时和体积收益，返回统计信息
+    def benchmark(self, old_path, new_path, work_dir):
+        delta_path = os.path.join(work_dir, os.path.basename(new_path) + DeltaEncoder.SUFFIX)
+        decoded_path = os.path.join(work_dir, os.path.basename(new_path) + ".decoded")
+        begin = time.perf_counter()
+        kept = self.encode(old_path, new_path, delta_path)
+        encode_time = time.perf_counter() - begin
+        result = {
+            "new_size": os.path.getsize(new_path),
+            "kept": kept,
+            "encode_seconds": round(encode_time, 3)
+        }
+        if kept:
+            begin = time.perf_counter()
+            DeltaEncoder.decode(old_path, delta_path, decoded_path)
+            result["decode_seconds"] = round(time.perf_counter() - begin, 3)
+            result["delta_size"] = os.path.getsize(delta_path)
+            result["saved_ratio"] = round(1 - result["delta_size"] / result["new_size"], 4)
+            with open(decoded_path, "rb") as decoded, open(new_path, "rb") as new:
+                result["verified"] = decoded.read() == new.read()
+            os.remove(delta_path)
+            os.remove(decoded_path)
+        return result
+
+    #生成一对测试文件：旧文件为随机数据，新文件在若干位置做少量修改、插入和删除【静态函数】
+    @staticmethod
+    def make_sample(old_path, new_path, size, edits=8):
+        data = bytearray(os.urandom(size))
+        with open(old_path, "wb") as f:
+            f.write(data)
+        step = size // (edits + 1)
+        for i in range(edits, 0, -1):
+            position = i * step
+            if i % 3 == 0:
+                data[position:position + 100] = os.urandom(1000)
+            elif i % 3 == 1:
+                del data[position:position + 500]
+            else:
+                data[position:position + 2000] = os.urandom(2000)
+        with open(new_path, "wb") as f:
+            f.write(data)
+
+
+#main函数
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='binary delta encoder')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    encode_parser = subparsers.add_parser('encode')
+    encode_parser.add_argument('oldPath')
+    encode_parser.add_argument('newPath')
+    encode_parser.add_argument('deltaPath')
+    encode_parser.add_argument('--ratio', type=float, default=DeltaEncoder.DEFAULT_RATIO)
+    decode_parser = subparsers.add_parser('decode')
+    decode_parser.add_argument('oldPath')
+    decode_parser.add_argument('deltaPath')
+    decode_parser.add_argument('newPath')
+    bench_parser = subparsers.add_parser('bench', help='measure encode/decode time and size savings')
+    bench_parser.add_argument('workDir')
+    bench_parser.add_argument('--old', default='', help='previous file, a synthetic pair is generated when empty')
+    bench_parser.add_argument('--new', default='')
+    bench_parser.add_argument('--size-mb', type=int, default=300, help='size of the synthetic pair')
+    args = parser.parse_args()
+
+    if args.command == 'encode':
+        if not DeltaEncoder(args.ratio).encode(args.oldPath, args.newPath, args.deltaPath):
+            print('delta is not smaller than the ratio, use the full file')
+            sys.exit(1)
+    elif args.command == 'decode':
+        DeltaEncoder.decode(args.oldPath, args.deltaPath, args.newPath)
+    else:
+        if not os.path.exists(args.workDir):
+            os.makedirs(args.workDir)
+        old_path = args.old
+        new_path = args.new
+        if old_path == '':
+            old_path = os.path.join(args.workDir, 'sample.old')
+            new_path = os.path.join(args.workDir, 'sample.new')
+            DeltaEncoder.make_sample(old_path, new_path, args.size_mb * 1024 * 1024)
+        print(DeltaEncoder().benchmark(old_path, new_path, args.workDir))
@@ -0,0 +1,132 @@
+import os
+import sys
+import json
+
+#定义一个差异包清单
+#记录新增、修改、删除的文件及其大小和摘要，以及未变化的文件数
+#客户端只需要对照清单检查文件大小就可以校验并应用升级，不用重新计算本地文件的摘要
+#路径统一使用 / 分隔，相对于版本包的根目录
+class DiffManifest:
+    MANIFEST_NAME = "upgrade_manifest.json"
+    VERSION = 1
+
+    def __init__(self, algorithm="md5"):
+        self.algorithm = algorithm
+        self.previous_version = ""
+        self.current_version = ""
+        #清单文件在差异包中所在的目录，相对于版本包的根目录
+        self.root = ""
+        #[路径, 大小, 摘要, 编码方式, 来源路径]
+        #编码方式为 move / copy 时差异包中没有文件内容，由旧版本的来源路径得到，客户端应先 copy 再 move
+        self.added = []
+        #[路径, 大小, 摘要, 旧文件大小, 旧文件摘要, 编码方式]
+        #编码方式：full 差异包中存放完整文件
+        #          delta 差异包中存放 路径 + .delta 的差分文件，需要基于旧文件还原
+        #          chunks 文件由 chunks.pack 和 chunk_recipes.json 拼装
+        self.modified = []
+        #[路径, 大小, 摘要]
+        self.deleted = []
+        self.unchanged = 0
+
+    @staticmethod
+    def _path(relativePath):
+        return relativePath.replace(os.sep, "/")
+
+    #根据 FolderCompare 的比较结果生成清单【静态函数】
+    @staticmethod
+    def from_compare(folderCompare):
+        #大小预筛选跳过的文件没有摘要，这里补齐
+        folderCompare.fillDigests()
+        manifest = DiffManifest(folderCompare.hash_engine.algorithm)
+        for node in folderCompare.diff_dict.values():
+            if node.status == 'modified':
+                manifest.modified.append([DiffManifest._path(node.relativePath), node.size, node.md5,
+                                          node.previous.size, node.previous.md5, node.encoding])
+            else:
+                manifest.added.append([DiffManifest._path(node.relativePath), node.size, node.md5, node.encoding,
+                                       DiffManifest._path(node.source)])
+        for node in folderCompare.deleted_dict.values():
+            manifest.deleted.append([DiffManifest._path(node.relativePath), node.size, node.md5])
+        manifest.added.sort()
+        manifest.modified.sort()
+        manifest.deleted.sort()
+        manifest.unchanged = folderCompare.stage_stats.get('unchanged', 0)
+        return manifest
+
+    def summary(self):
+        #按编码方式统计新增和修改的文件数
+        encoding = {}
+        for entry in self.added:
+            encoding[entry[3]] = encoding.get(entry[3], 0) + 1
+        for entry in self.modified:
+            encoding[entry[5]] = encoding.get(entry[5], 0) + 1
+        return {
+            "added": len(self.added),
+            "modified": len(self.modified),
+            "deleted": len(self.deleted),
+            "unchanged": self.unchanged,
+            "encoding": encoding
+        }
+
+    def to_dict(self):
+        return {
+            "version": DiffManifest.VERSION,
+            "algorithm": self.algorithm,
+            "previous_version": self.previous_version,
+            "current_version": self.current_version,
+            "root": self.root,
+            "summary": self.summary(),
+            "added": self.added,
+            "modified": self.modified,
+            "deleted": self.deleted
+        }
+
+    #紧凑的 JSON 内容，直接写入压缩包时使用
+    def to_bytes(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False, separators=(',', ':')).encode("utf-8")
+
+    #清单在压缩包中的路径
+    def arcname(self):
+        if self.root == "":
+            return DiffManifest.MANIFEST_NAME
+        return self.root.replace(os.sep, "/") + "/" + DiffManifest.MANIFEST_NAME
+
+    #写入紧凑的 JSON 文件
+    def write(self, manifest_path):
+        manifest_dir = os.path.dirname(manifest_path)
+        if manifest_dir != "" and not os.path.exists(manifest_dir):
+            os.makedirs(manifest_dir)
+        with open(manifest_path, 'wb') as f:
+            f.write(self.to_bytes())
+
+    #读取清单文件【静态函数】
+    @staticmethod
+    def load(manifest_path):
+        with open(manifest_path, 'r', -1, "utf-8") as f:
+            data = json.load(f)
+        manifest = DiffManifest(data["algorithm"])
+        manifest.previous_version = data.get("previous_version", "")
+        manifest.current_version = data.get("current_version", "")
+        manifest.root = data.get("root", "")
+        manifest.added = data["added"]
+        manifest.modified = data["modified"]
+        manifest.deleted = data["deleted"]
+        manifest.unchanged = data["summary"]["unchanged"]
+        return manifest
+
+    #打印清单统计
+    def print(self):
+        print("manifest algorithm: " + self.algorithm + " summary: " + json.dumps(self.summary()))
+
+
+#main函数
+if __name__ == '__main__':
+    args = sys.argv
+    if len(args) != 2:
+        print('Usage: python DiffManifest.py manifestPath')
+        sys.exit(1)
+
+    manifest = DiffManifest.load(args[1])
+    manifest.print()
+    for entry in manifest.deleted:
+        print('deleted: ', entry[0])
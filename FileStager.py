@@ -0,0 +1,120 @@
+import os
+import sys
+import errno
+import shutil
+
+#FICLONE 只在 Linux 上可用
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+#定义一个文件暂存器，把文件放到暂存目录时尽量不拷贝数据
+#依次尝试：硬链接、reflink（FICLONE）、copy_file_range / sendfile（内核态拷贝），最后回退到 shutil
+#某种方式因为跨设备、文件系统不支持等原因失败后，后续文件不再尝试
+class FileStager:
+    STRATEGY_HARDLINK = "hardlink"
+    STRATEGY_REFLINK = "reflink"
+    STRATEGY_COPY_FILE_RANGE = "copy_file_range"
+    STRATEGY_SENDFILE = "sendfile"
+    STRATEGY_COPY = "copy"
+    #符号链接不走上面的方式，直接按链接本身创建
+    STRATEGY_SYMLINK = "symlink"
+    #linux/fs.h: _IOW(0x94, 9, int)
+    FICLONE = 0x40049409
+    CHUNK_SIZE = 64 * 1024 * 1024
+    #这些错误说明当前方式在这对文件系统上不可用，后续不再尝试
+    UNSUPPORTED_ERRORS = (errno.EXDEV, errno.EPERM, errno.EACCES, errno.EINVAL, errno.ENOSYS,
+                          errno.EOPNOTSUPP, errno.ENOTTY, errno.EMLINK, errno.EBADF)
+
+    def __init__(self, hardlink=True):
+        self.strategies = []
+        if hardlink and hasattr(os, "link"):
+            self.strategies.append(FileStager.STRATEGY_HARDLINK)
+        if fcntl is not None and sys.platform.startswith("linux"):
+            self.strategies.append(FileStager.STRATEGY_REFLINK)
+        if hasattr(os, "copy_file_range"):
+            self.strategies.append(FileStager.STRATEGY_COPY_FILE_RANGE)
+        #macOS 的 sendfile 只支持 socket，只在 Linux 上使用
+        if hasattr(os, "sendfile") and sys.platform.startswith("linux"):
+            self.strategies.append(FileStager.STRATEGY_SENDFILE)
+        self.strategies.append(FileStager.STRATEGY_COPY)
+        #每种方式暂存的文件数
+        self.counters = {strategy: 0 for strategy in self.strategies + [FileStager.STRATEGY_SYMLINK]}
+        #已经确认存在的目录，每个目录只创建一次
+        self.created_dirs = set()
+
+    #确保目录存在，每个目录只检查一次
+    def ensure_dir(self, dir_path):
+        if dir_path in self.created_dirs:
+            return
+        os.makedirs(dir_path, exist_ok=True)
+        self.created_dirs.add(dir_path)
+
+    #把 src_path 暂存到 dst_path，返回使用的方式
+    def stage(self, src_path, dst_path):
+        self.ensure_dir(os.path.dirname(dst_path))
+        if os.path.lexists(dst_path):
+            os.remove(dst_path)
+        #符号链接按链接本身暂存，与直接写入压缩包时相同，不拷贝链接目标的内容
+        if os.path.islink(src_path):
+            os.symlink(os.readlink(src_path), dst_path)
+            self.counters[FileStager.STRATEGY_SYMLINK] += 1
+            return FileStager.STRATEGY_SYMLINK
+        for strategy in list(self.strategies):
+            try:
+                self._stage(strategy, src_path, dst_path)
+            except OSError as e:
+                if strategy == FileStager.STRATEGY_COPY:
+                    raise
+                #失败时清理可能残留的半成品文件
+                if os.path.lexists(dst_path):
+                    os.remove(dst_path)
+                if e.errno in FileStager.UNSUPPORTED_ERRORS:
+                    self.strategies.remove(strategy)
+                continue
+            self.counters[strategy] += 1
+            return strategy
+
+    def _stage(self, strategy, src_path, dst_path):
+        if strategy == FileStager.STRATEGY_HARDLINK:
+            os.link(src_path, dst_path)
+        elif strategy == FileStager.STRATEGY_COPY:
+            shutil.copy(src_path, dst_path)
+        else:
+            with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+                if strategy == FileStager.STRATEGY_REFLINK:
+                    fcntl.ioctl(dst.fileno(), FileStager.FICLONE, src.fileno())
+                else:
+                    FileStager._kernel_copy(strategy, src.fileno(), dst.fileno(), os.fstat(src.fileno()).st_size)
+            shutil.copymode(src_path, dst_path)
+
+    #在内核态拷贝文件内容，数据不经过用户态缓冲区【静态函数】
+    #没有拷贝完就返回 0（例如源文件在拷贝过程中被截断）时抛出 EIO，由 stage 删除半成品并尝试下一种方式
+    @staticmethod
+    def _kernel_copy(strategy, src_fd, dst_fd, size):
+        offset = 0
+        while offset < size:
+            count = min(FileStager.CHUNK_SIZE, size - offset)
+            if strategy == FileStager.STRATEGY_COPY_FILE_RANGE:
+                copied = os.copy_file_range(src_fd, dst_fd, count)
+            else:
+                copied = os.sendfile(dst_fd, src_fd, offset, count)
+            if copied == 0:
+                raise OSError(errno.EIO, "short %s copy: %d of %d bytes" % (strategy, offset, size))
+            offset += copied
+
+    #打印每种方式暂存的文件数
+    def print(self):
+        print("stage counters: ", self.counters)
+
+
+#main函数
+if __name__ == '__main__':
+    args = sys.argv
+    if len(args) != 3:
+        print('Usage: python FileStager.py srcFile dstFile')
+        sys.exit(1)
+
+    stager = FileStager()
+    print(stager.stage(args[1], args[2]))
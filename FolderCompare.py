@@ -1,95 +1,251 @@
 import os
 import sys
 import shutil
-import hashlib
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from HashEngine import HashEngine
+from HashIndex import HashIndex
+from DiffManifest import DiffManifest
+from DeltaEncoder import DeltaEncoder
+from ChunkStore import ChunkStore
+from FileStager import FileStager
+from ZipBuilder import ZipBuilder
+from ParallelZip import RawEntry
+from IgnoreRules import IgnoreRules
 
 #定义一个文件节点
 class FileNode:
-    def __init__(self, absolutePath, relativePath, md5):
+    def __init__(self, absolutePath, relativePath, md5, size=None, mtime=None, inode=None, ctime=None):
         self.absolutePath = absolutePath
         self.relativePath = relativePath
+        #文件摘要，算法由 HashEngine 决定，属性名沿用 md5
         self.md5 = md5
+        self.size = size
+        #修改时间、状态改变时间（纳秒）和 inode，用于哈希索引判断文件是否变化
+        self.mtime = mtime
+        self.inode = inode
+        self.ctime = ctime
+        #比较结果：added / modified / deleted
+        self.status = None
+        #修改的文件对应的旧文件节点
+        self.previous = None
+        #差异包中的编码方式：full 完整文件，delta 相对旧文件的差分，chunks 内容分块拼装，
+        #move / copy 内容与旧版本的 source 文件相同，差异包中不包含文件内容
+        self.encoding = "full"
+        #move / copy 的来源文件，旧版本中的相对路径
+        self.source = ""
+        #内容来自 zip 版本包时对应的 (压缩包路径, ZipInfo)，写入差异包时支持的条目可以原样拷贝压缩数据
+        self.archive_entry = None
 
 #定义一个比较类
 class FolderCompare:
+    #比较模式：hash 计算摘要后比较，bytes 逐块比较内容并在第一个不同的块处提前返回
+    MODE_HASH = "hash"
+    MODE_BYTES = "bytes"
+    #未指定忽略规则时使用的默认规则
+    DEFAULT_IGNORE_RULES = IgnoreRules()
+
     #初始化
-    def __init__(self, oldPath, newPath):
+    def __init__(self, oldPath, newPath, hashEngine=None, hashIndex=None, mode=MODE_HASH, sample=False, deltaEncoder=None,
+                 detectMoves=False, ignoreRules=None):
         self.old_path = oldPath
         self.new_path = newPath
-        self.diff_dict = []
+        #新增和修改的文件 {相对路径: 新文件节点}
+        self.diff_dict = {}
+        #删除的文件 {相对路径: 旧文件节点}
+        self.deleted_dict = {}
+        #各个比较阶段判定的文件数
+        self.stage_stats = {}
+        #未指定哈希引擎时使用默认配置（线程池 + 1MB 读缓冲）
+        if hashEngine is None:
+            hashEngine = HashEngine()
+        self.hash_engine = hashEngine
+        #可选的持久化哈希索引，为空时每次都完整计算
+        self.hash_index = hashIndex
+        #bytes 模式不产生摘要，也不使用哈希索引
+        self.mode = mode
+        #bytes 模式下是否先比较首尾两块
+        self.sample = sample
+        #可选的差分编码器，不为空时修改的文件优先以 delta 形式导出
+        self.delta_encoder = deltaEncoder
+        #是否按摘要检测重命名和移动的文件
+        self.detect_moves = detectMoves
+        #导出文件时优先使用硬链接、reflink 等零拷贝方式
+        self.stager = FileStager()
+        #遍历时忽略的文件和文件夹，为空时使用默认规则
+        if ignoreRules is None:
+            ignoreRules = FolderCompare.DEFAULT_IGNORE_RULES
+        self.ignore_rules = ignoreRules
 
     #比较两个文件夹
     def compare(self):
-        #获取两个文件夹的文件列表
-        list1 = self.getFileList(self.old_path)
-        list2 = self.getFileList(self.new_path)
-        #分别计算文件md5值
-        old_dict = self.getMD5(list1, self.old_path)
-        new_dict = self.getMD5(list2, self.new_path)
-        #通过md5值比较两个文件夹的文件
-        self.diff_dict = self.getDiff(old_dict, new_dict)
+        #并行遍历两个文件夹，只收集文件大小，不读取文件内容
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            old_future = executor.submit(self.getFileNodes, self.old_path)
+            new_future = executor.submit(self.getFileNodes, self.new_path)
+            old_dict = old_future.result()
+            new_dict = new_future.result()
+        #只有两边都存在且大小相同的文件才可能相同，只对这部分文件比较内容
+        same_size_list = [i for i in new_dict if i in old_dict and new_dict[i].size == old_dict[i].size]
+        content_equal = self.compareContent([(old_dict[i], new_dict[i]) for i in same_size_list])
+        #通过大小和内容比较两个文件夹的文件
+        self.stage_stats = {}
+        self.diff_dict = self.getDiff(old_dict, new_dict, self.stage_stats, content_equal)
+        self.deleted_dict = {}
+        for i in old_dict:
+            if i not in new_dict:
+                old_dict[i].status = 'deleted'
+                self.deleted_dict[i] = old_dict[i]
+        if self.detect_moves:
+            #已删除的文件可以作为 move 的来源，内容未变化且已有摘要的文件可以作为 copy 的来源
+            unchanged_nodes = [old_dict[i] for i in same_size_list if i not in self.diff_dict and old_dict[i].md5 is not None]
+            self.detectMoves(list(self.deleted_dict.values()) + unchanged_nodes)
+        print('compare stage stats: ', self.stage_stats)
+        if self.hash_index is not None and self.mode == FolderCompare.MODE_HASH:
+            #删除已经不存在的文件的记录
+            self.hash_index.compact([(node.relativePath, node.inode) for file_dict in (old_dict, new_dict) for node in file_dict.values()])
+            self.hash_index.print()
+
+    #遍历文件夹，返回 (绝对路径, 相对路径, 大小, 修改时间, inode, 状态改变时间) 记录
+    #使用 os.scandir 单次遍历，复用 DirEntry 缓存的文件类型和 stat 结果
+    #符号链接（包括指向文件夹的）不跟随，按链接本身记录，与 ditto 和 ParallelZip 写入压缩包的方式相同
+    @staticmethod
+    def walk(directory, ignoreRules=None):
+        if ignoreRules is None:
+            ignoreRules = FolderCompare.DEFAULT_IGNORE_RULES
+        #用栈代替递归，避免深层目录的递归开销
+        stack = [(directory, "")]
+        while stack:
+            current_dir, relative_dir = stack.pop()
+            with os.scandir(current_dir) as entries:
+                for entry in entries:
+                    relativePath = relative_dir + entry.name
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    #被忽略的文件夹直接剪掉，不再进入
+                    if ignoreRules.match(relativePath, is_dir, entry.name):
+                        continue
+                    if is_dir:
+                        stack.append((entry.path, relativePath + os.sep))
+                    elif entry.is_file(follow_symlinks=False) or entry.is_symlink():
+                        stat = entry.stat(follow_symlinks=False)
+                        yield (entry.path, relativePath, stat.st_size, stat.st_mtime_ns, stat.st_ino, stat.st_ctime_ns)
+
+    #读取一个文件夹下的条目并排序，返回 (DirEntry, 相对路径, 是否文件夹) 列表
+    #文件夹的排序键带上路径分隔符，这样深度优先遍历的输出顺序就等于相对路径的字符串顺序
+    @staticmethod
+    def _sortedEntries(directory, relative_dir, ignoreRules):
+        items = []
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if ignoreRules.match(relative_dir + entry.name, is_dir, entry.name):
+                    continue
+                if is_dir:
+                    items.append((entry.name + os.sep, entry, relative_dir + entry.name, True))
+                elif entry.is_file(follow_symlinks=False) or entry.is_symlink():
+                    items.append((entry.name, entry, relative_dir + entry.name, False))
+        items.sort(key=lambda item: item[0])
+        return [item[1:] for item in items]
+
+    #按相对路径的字符串顺序遍历文件夹，返回 (DirEntry, 相对路径)，只包含文件和符号链接
+    #每次只保存当前路径上各层文件夹的条目，内存占用与目录深度相关，与文件总数无关
+    @staticmethod
+    def walkSortedEntries(directory, ignoreRules=None):
+        if ignoreRules is None:
+            ignoreRules = FolderCompare.DEFAULT_IGNORE_RULES
+        stack = [iter(FolderCompare._sortedEntries(directory, "", ignoreRules))]
+        while stack:
+            item = next(stack[-1], None)
+            if item is None:
+                stack.pop()
+                continue
+            entry, relativePath, is_dir = item
+            if is_dir:
+                stack.append(iter(FolderCompare._sortedEntries(entry.path, relativePath + os.sep, ignoreRules)))
+            else:
+                yield entry, relativePath
+
+    #按相对路径的字符串顺序遍历文件夹，返回记录格式与 walk 相同
+    @staticmethod
+    def walkSorted(directory, ignoreRules=None):
+        for entry, relativePath in FolderCompare.walkSortedEntries(directory, ignoreRules):
+            stat = entry.stat(follow_symlinks=False)
+            yield (entry.path, relativePath, stat.st_size, stat.st_mtime_ns, stat.st_ino, stat.st_ctime_ns)
 
     #获取文件列表
     def getFileList(self, directory):
-        # 获取指定目录中的所有文件和文件夹
-        file_names = os.listdir(directory)
-
-        #去除隐藏文件
-        #过滤掉/Applications 文件夹
-        filter_names = [item for item in file_names if not (item.startswith('.') or item == 'Applications')]
-        
-        #递归遍历所有文件夹
-        for i in range(len(filter_names)):
-            filter_names[i] = os.path.join(directory, filter_names[i])
-            if os.path.isdir(filter_names[i]):
-                filter_names.extend(self.getFileList(filter_names[i]))
-
-        # 使用 os.path.join 获取文件的绝对路径
-        absolute_paths = [os.path.join(directory, file_name) for file_name in filter_names]
-
-        # 过滤出只是文件而不是文件夹的路径
-        absolute_file_paths = [path for path in absolute_paths if os.path.isfile(path)]
-
-        return absolute_file_paths
+        return [record[0] for record in FolderCompare.walk(directory, self.ignore_rules)]
     
+    #获取文件节点，只记录大小，md5值留空
+    def getFileNodes(self, directory):
+        file_dict = {}
+        for absolutePath, relativePath, size, mtime, inode, ctime in FolderCompare.walk(directory, self.ignore_rules):
+            file_dict[relativePath] = FileNode(absolutePath, relativePath, None, size, mtime, inode, ctime)
+        return file_dict
+
+    #比较大小相同的文件对，返回 {相对路径: 内容是否相同}
+    #hash 模式下同时为节点补充md5值，bytes 模式下逐块比较，不计算摘要
+    def compareContent(self, pair_list):
+        if self.mode == FolderCompare.MODE_BYTES:
+            equal_list = self.hash_engine.compare_pairs([(old_node.absolutePath, new_node.absolutePath) for old_node, new_node in pair_list], self.sample)
+        else:
+            self.fillMD5([(self.old_path, [old_node for old_node, new_node in pair_list]),
+                          (self.new_path, [new_node for old_node, new_node in pair_list])])
+            equal_list = [old_node.md5 == new_node.md5 for old_node, new_node in pair_list]
+        return {new_node.relativePath: equal for (old_node, new_node), equal in zip(pair_list, equal_list)}
+
+    #为文件节点补充md5值，groups 为 (根目录, 节点列表) 的列表
+    #哈希索引命中的文件直接复用索引中的md5值，其余文件交给哈希引擎并行计算
+    def fillMD5(self, groups):
+        hash_list = []
+        for root, node_list in groups:
+            for node in node_list:
+                if self.hash_index is not None:
+                    node.md5 = self.hash_index.lookup(node.relativePath, node.size, node.mtime, node.inode, node.ctime)
+                if node.md5 is None:
+                    hash_list.append((root, node))
+        md5_list = self.hash_engine.hash_files([node.absolutePath for root, node in hash_list], [node.size for root, node in hash_list],
+                                               [node.inode for root, node in hash_list])
+        for (root, node), md5 in zip(hash_list, md5_list):
+            node.md5 = md5
+            if self.hash_index is not None:
+                self.hash_index.store(node.relativePath, node.size, node.mtime, node.inode, node.ctime, md5)
+        if self.hash_index is not None:
+            self.hash_index.flush()
+
     #获取文件md5值
     def getMD5(self, list, base_path):
         file_dict = {}
-        #遍历文件列表
-        for i in list:
-            #获取文件路径
-            filePath = i
-            #判断是否是文件
-            if os.path.isfile(filePath):
-                #获取文件md5值
-                md5 = self.calculate_md5(filePath)
-                #根据绝对路径获取相对路径
-                relativePath = filePath[len(base_path):].strip(os.sep)
-                #把md5值放入文件列表中
-                file_dict[relativePath] = FileNode(filePath, relativePath, md5)
-            #判断是否是文件夹
-            elif os.path.isdir(filePath):
-                #递归调用
-                self.getMD5(self.getFileList(filePath), filePath)
+        #getFileList 返回的都是文件，直接交给哈希引擎并行计算，结果顺序与 list 一致
+        md5_list = self.hash_engine.hash_files(list)
+        for filePath, md5 in zip(list, md5_list):
+            #根据绝对路径获取相对路径
+            relativePath = filePath[len(base_path):].strip(os.sep)
+            #把md5值放入文件列表中
+            file_dict[relativePath] = FileNode(filePath, relativePath, md5, os.lstat(filePath).st_size)
         return file_dict
     
     #获取文件md5值【静态函数】
     @staticmethod
-    def calculate_md5(file_path, buffer_size=8192):
-        md5_hash = hashlib.md5()
-        
-        
-        with open(file_path, "rb") as file:
-            buffer = file.read(buffer_size)
-            while buffer:
-                md5_hash.update(buffer)
-                buffer = file.read(buffer_size)
-
-        return md5_hash.hexdigest()
+    def calculate_md5(file_path, buffer_size=HashEngine.DEFAULT_BUFFER_SIZE):
+        return HashEngine.calculate(file_path, buffer_size, "md5")
     
-    #通过md5值比较两个文件夹的文件
+    #通过大小和md5值比较两个文件夹的文件
+    #stats 不为空时记录每个阶段判定的文件数：
+    #  added        只在新文件夹中存在，无需计算md5
+    #  removed      只在旧文件夹中存在，无需计算md5
+    #  size_changed 大小不同，直接判定为修改
+    #  hashed       大小相同，通过md5值（或逐块比较）判定
+    #  md5_changed  大小相同但内容不同
+    #  unchanged    内容相同
+    #返回的文件节点会标记 status，修改的文件节点通过 previous 关联旧文件节点
+    #contentEqual 不为空时使用其中的比较结果，不再比较md5值
     @staticmethod
-    def getDiff(oldDict, newDict):
+    def getDiff(oldDict, newDict, stats=None, contentEqual=None):
+        if stats is None:
+            stats = {}
+        FolderCompare._resetStats(stats)
         #定义一个列表用于存放不同的文件
         diff = {}
         #遍历文件列表2
@@ -97,61 +253,298 @@ class FolderCompare:
             #判断列表2中的文件是否在列表1中
             if i not in oldDict:
                 #把不同的文件放入列表中
+                newDict[i].status = 'added'
                 diff[i] = newDict[i]
+                stats['added'] += 1
+            elif newDict[i].size is not None and oldDict[i].size is not None and newDict[i].size != oldDict[i].size:
+                #大小不同，文件一定被修改过
+                newDict[i].status = 'modified'
+                newDict[i].previous = oldDict[i]
+                diff[i] = newDict[i]
+                stats['size_changed'] += 1
             else:
+                stats['hashed'] += 1
                 #判断文件是否被修改
-                if newDict[i].md5 != oldDict[i].md5:
+                if contentEqual is not None and i in contentEqual:
+                    changed = not contentEqual[i]
+                else:
+                    changed = newDict[i].md5 != oldDict[i].md5
+                if changed:
                     #把不同的文件放入列表中
+                    newDict[i].status = 'modified'
+                    newDict[i].previous = oldDict[i]
                     diff[i] = newDict[i]
+                    stats['md5_changed'] += 1
+                else:
+                    stats['unchanged'] += 1
+        stats['removed'] = len([i for i in oldDict if i not in newDict])
 
         return diff
+
+    @staticmethod
+    def _resetStats(stats):
+        for key in ('added', 'removed', 'size_changed', 'hashed', 'md5_changed', 'unchanged'):
+            stats[key] = 0
+
+    #流式比较两个文件夹，按相对路径顺序归并两个有序遍历结果，逐个返回新增或修改的 FileNode
+    #大小相同的文件攒够 batch_size 个后批量计算md5，保证内存占用有上限
+    #只有变更集（diff_dict / deleted_dict）会被保存，用于生成清单
+    #流式模式不保存完整的文件列表，因此不会压缩哈希索引；文件边比较边导出，也不检测重命名
+    def compareStream(self, batch_size=256):
+        self.diff_dict = {}
+        self.deleted_dict = {}
+        self.stage_stats = {}
+        FolderCompare._resetStats(self.stage_stats)
+        stats = self.stage_stats
+        old_iter = FolderCompare.walkSorted(self.old_path, self.ignore_rules)
+        new_iter = FolderCompare.walkSorted(self.new_path, self.ignore_rules)
+        old_record = next(old_iter, None)
+        new_record = next(new_iter, None)
+        pending = []
+        while old_record is not None or new_record is not None:
+            if new_record is None or (old_record is not None and old_record[1] < new_record[1]):
+                #只在旧文件夹中存在
+                stats['removed'] += 1
+                old_node = FileNode(*old_record[:2], None, *old_record[2:])
+                old_node.status = 'deleted'
+                self.deleted_dict[old_node.relativePath] = old_node
+                old_record = next(old_iter, None)
+                continue
+            new_node = FileNode(*new_record[:2], None, *new_record[2:])
+            if old_record is None or new_record[1] < old_record[1]:
+                #只在新文件夹中存在
+                stats['added'] += 1
+                new_node.status = 'added'
+                self.diff_dict[new_node.relativePath] = new_node
+                yield new_node
+            elif new_record[2] != old_record[2]:
+                #大小不同，文件一定被修改过
+                stats['size_changed'] += 1
+                new_node.status = 'modified'
+                new_node.previous = FileNode(*old_record[:2], None, *old_record[2:])
+                self.diff_dict[new_node.relativePath] = new_node
+                yield new_node
+                old_record = next(old_iter, None)
+            else:
+                pending.append((FileNode(*old_record[:2], None, *old_record[2:]), new_node))
+                old_record = next(old_iter, None)
+                if len(pending) >= batch_size:
+                    yield from self._flushPending(pending)
+                    pending = []
+            new_record = next(new_iter, None)
+        yield from self._flushPending(pending)
+        print('compare stage stats: ', self.stage_stats)
+        if self.hash_index is not None:
+            self.hash_index.print()
+
+    #批量比较大小相同的文件对，返回内容不同的新文件节点
+    def _flushPending(self, pending):
+        content_equal = self.compareContent(pending)
+        for old_node, new_node in pending:
+            self.stage_stats['hashed'] += 1
+            if not content_equal[new_node.relativePath]:
+                self.stage_stats['md5_changed'] += 1
+                new_node.status = 'modified'
+                new_node.previous = old_node
+                self.diff_dict[new_node.relativePath] = new_node
+                yield new_node
+            else:
+                self.stage_stats['unchanged'] += 1
+
+    #按摘要检测重命名和移动：新增文件的内容与旧版本某个文件相同时，标记为 move / copy，不再导出文件内容
+    #只有大小与某个来源文件相同的新增文件才需要计算摘要，摘要到路径的索引一次构建，整体为 O(n)
+    #同一个已删除文件只作为一个新文件的 move 来源，其余相同内容的新文件标记为 copy
+    #客户端应先执行 copy，再执行 move 和删除
+    def detectMoves(self, source_nodes):
+        self.stage_stats['moved'] = 0
+        self.stage_stats['copied'] = 0
+        added_nodes = [node for node in self.diff_dict.values() if node.status == 'added']
+        source_sizes = set(node.size for node in source_nodes)
+        candidate_nodes = [node for node in added_nodes if node.size in source_sizes]
+        if len(candidate_nodes) == 0:
+            return
+        candidate_sizes = set(node.size for node in candidate_nodes)
+        source_nodes = [node for node in source_nodes if node.size in candidate_sizes]
+        self.fillMD5([(self.old_path, [node for node in source_nodes if node.md5 is None]),
+                      (self.new_path, [node for node in candidate_nodes if node.md5 is None])])
+        #摘要到来源文件的索引，已删除的文件排在前面，优先作为 move 的来源
+        digest_index = {}
+        for node in source_nodes:
+            digest_index.setdefault((node.size, node.md5), []).append(node)
+        moved = set()
+        for node in sorted(candidate_nodes, key=lambda node: node.relativePath):
+            sources = digest_index.get((node.size, node.md5))
+            if sources is None:
+                continue
+            source = next((item for item in sources if item.status == 'deleted' and item.relativePath not in moved), None)
+            if source is not None:
+                moved.add(source.relativePath)
+                node.encoding = "move"
+                self.stage_stats['moved'] += 1
+            else:
+                source = sources[0]
+                node.encoding = "copy"
+                self.stage_stats['copied'] += 1
+            node.source = source.relativePath
+
+    #按类型统计变更集：move / copy 的文件不导出内容，单独统计；作为 move 来源的删除文件不计入 deleted
+    #exported 为需要导出内容的文件数
+    def diffCounts(self):
+        counts = {"added": 0, "modified": 0, "moved": 0, "copied": 0, "deleted": 0, "exported": 0}
+        move_sources = set()
+        for node in self.diff_dict.values():
+            if node.encoding == "move":
+                counts["moved"] += 1
+                move_sources.add(node.source)
+            elif node.encoding == "copy":
+                counts["copied"] += 1
+            else:
+                counts[node.status] += 1
+                counts["exported"] += 1
+        counts["deleted"] = len([relativePath for relativePath in self.deleted_dict if relativePath not in move_sources])
+        return counts
+
+    #为变更集补充摘要：新增和修改文件的新摘要、修改文件的旧摘要、删除文件的摘要
+    #大小预筛选和 bytes 模式下这些文件没有计算过摘要
+    def fillDigests(self):
+        new_nodes = [node for node in self.diff_dict.values() if node.md5 is None]
+        old_nodes = [node.previous for node in self.diff_dict.values() if node.previous is not None and node.previous.md5 is None]
+        old_nodes.extend([node for node in self.deleted_dict.values() if node.md5 is None])
+        self.fillMD5([(self.old_path, old_nodes), (self.new_path, new_nodes)])
     
 
-    def copyDiff(self, diff_dest_path):
-        self._copyDiff(self.diff_dict, diff_dest_path)
+    #拷贝不同的文件，diff 为空时拷贝 compare 的结果，也可以直接传入 compareStream 的生成器
+    def copyDiff(self, diff_dest_path, diff=None):
+        if diff is None:
+            diff = self.diff_dict
+        return self._copyDiff(diff, diff_dest_path)
 
-    #拷贝不同的文件
+    #生成差异文件的 (源文件路径, 压缩包内路径) 序列，供 ZipBuilder 直接写入压缩包，不需要暂存目录
+    #压缩包内路径与 copyDiff 导出的相对路径一致，使用 / 分隔
+    #delta 文件临时写在 delta_dir 下，压缩包的写入是并行的，生成下一个条目时这个条目可能还没有读取，
+    #所以 delta 文件由调用方在压缩包写完后统一删除
+    def diffEntries(self, diff=None, delta_dir="", passthrough=False):
+        if diff is None:
+            diff = self.diff_dict.values()
+        for node in diff:
+            #move / copy 的文件由客户端从旧版本文件得到，不需要导出
+            if node.encoding in ("move", "copy"):
+                continue
+            arcname = node.relativePath.replace(os.sep, "/")
+            if self.delta_encoder is not None and node.previous is not None and self.delta_encoder.wants(node.previous.size, node.size):
+                delta_path = os.path.join(delta_dir, node.relativePath + DeltaEncoder.SUFFIX)
+                if self.delta_encoder.encode(node.previous.absolutePath, node.absolutePath, delta_path):
+                    node.encoding = "delta"
+                    yield (delta_path, arcname + DeltaEncoder.SUFFIX)
+                    continue
+            #完整文件来自 zip 版本包时直接拷贝压缩数据，不重新压缩
+            if passthrough and node.archive_entry is not None and RawEntry.supported(node.archive_entry[1]):
+                yield (RawEntry(*node.archive_entry), arcname)
+                continue
+            yield (node.absolutePath, arcname)
+
+    #拷贝不同的文件，返回拷贝的文件数
     def _copyDiff(self, diff_dict, diff_dest_path):
+        count = 0
         #遍历文件列表
         for i in diff_dict:
+            #流式比较返回的是 FileNode，字典返回的是相对路径
+            node = None
+            if isinstance(i, FileNode):
+                node = i
+                i = i.relativePath
+            elif isinstance(diff_dict, dict):
+                node = diff_dict[i]
+            #move / copy 的文件由客户端从旧版本文件得到，不需要导出
+            if node is not None and node.encoding in ("move", "copy"):
+                continue
+            count += 1
             #获取文件路径
             src_path = os.path.join(self.new_path, i)
             dst_path = os.path.join(diff_dest_path, i)
-            #判断是否是文件
-            if os.path.isfile(src_path):
-                #判断文件夹是否存在
-                if not os.path.exists(os.path.dirname(dst_path)):
-                    #创建文件夹
-                    os.makedirs(os.path.dirname(dst_path))
-                #拷贝文件
-                shutil.copy(src_path, dst_path)
+            #修改的文件先尝试差分编码，delta 足够小时不再拷贝完整文件
+            if (self.delta_encoder is not None and node is not None and node.previous is not None and
+                    self.delta_encoder.wants(node.previous.size, node.size)):
+                if self.delta_encoder.encode(node.previous.absolutePath, src_path, dst_path + DeltaEncoder.SUFFIX):
+                    node.encoding = "delta"
+                    continue
+            #比较结果中的节点一定是文件或符号链接，只有传入相对路径时才需要判断
+            if node is not None or os.path.islink(src_path) or os.path.isfile(src_path):
+                #暂存文件，每个目录只创建一次
+                self.stager.stage(src_path, dst_path)
             #判断是否是文件夹
             elif os.path.isdir(src_path):
                 #创建文件夹
                 os.mkdir(dst_path)
                 #拷贝文件夹
-                shutil.copytree(src_path, dst_path)
+                shutil.copytree(src_path, dst_path, symlinks=True)
+        self.stager.print()
+        return count
 
 
 #main函数
 if __name__ == '__main__':
-    args = sys.argv
-    if len(args) != 4:
-        print('Usage: python FolderCompare.py oldPath newPath exportPath')
-        sys.exit(1)
-    
-    previous_path = args[1]
-    current_path = args[2]
-    export_path = args[3]
+    parser = argparse.ArgumentParser(description='compare two folders and export the diff files')
+    parser.add_argument('oldPath')
+    parser.add_argument('newPath')
+    parser.add_argument('exportPath')
+    parser.add_argument('--workers', type=int, default=0, help='hash worker count, 0 means cpu count')
+    parser.add_argument('--process', action='store_true', help='hash with a process pool instead of threads')
+    parser.add_argument('--auto-process', action='store_true', help='choose threads or processes from the algorithm and file sizes')
+    parser.add_argument('--buffer-size', type=int, default=HashEngine.DEFAULT_BUFFER_SIZE, help='read buffer size in bytes')
+    parser.add_argument('--mmap-threshold', type=int, default=HashEngine.DEFAULT_MMAP_THRESHOLD, help='files at least this large are hashed through mmap, 0 disables mmap')
+    parser.add_argument('--io-order', default=HashEngine.ORDER_INODE, choices=[HashEngine.ORDER_NONE, HashEngine.ORDER_INODE, HashEngine.ORDER_EXTENT], help='order in which files are read for hashing')
+    parser.add_argument('--io-hints', action='store_true', help='issue posix_fadvise readahead and drop-behind hints, for NAS or cold trees')
+    parser.add_argument('--algorithm', default=HashEngine.DEFAULT_ALGORITHM, choices=HashEngine.available_algorithms(), help='digest algorithm')
+    parser.add_argument('--index', default='', help='persistent hash index file, empty means no index')
+    parser.add_argument('--mode', default=FolderCompare.MODE_HASH, choices=[FolderCompare.MODE_HASH, FolderCompare.MODE_BYTES], help='compare same-size files by digest or block by block')
+    parser.add_argument('--sample', action='store_true', help='in bytes mode compare the head and tail blocks first')
+    parser.add_argument('--delta', action='store_true', help='export modified files as binary deltas when small enough')
+    parser.add_argument('--delta-ratio', type=float, default=DeltaEncoder.DEFAULT_RATIO, help='keep a delta only when it is smaller than this ratio of the full file')
+    parser.add_argument('--detect-moves', action='store_true', help='emit renamed or copied files as move/copy entries instead of payload')
+    parser.add_argument('--chunks', action='store_true', help='export added and modified files as a content-defined chunk pack')
+    parser.add_argument('--manifest', default='', help='write the change set manifest to this file')
+    parser.add_argument('--stream', action='store_true', help='merge-join sorted walks and copy diff files as they are found')
+    parser.add_argument('--zip', action='store_true', help='write the diff files straight into exportPath as a zip archive')
+    parser.add_argument('--ignore', action='append', default=None, help='gitignore-style pattern to skip while walking, may be repeated; replaces the default rules')
+    args = parser.parse_args()
 
     #创建一个比较类
-    compare = FolderCompare(previous_path, current_path)
-    #调用比较方法
-    compare.compare()
-    #调用拷贝方法
-    compare.copyDiff(export_path)
-    #打印结果
-    print('diff file count: ', len(compare.diff_dict))
-    #打印差异文件列表
-    for i in compare.diff_dict:
-        print(i)
\ No newline at end of file
+    engine = HashEngine(args.workers, HashEngine.POOL_AUTO if args.auto_process else args.process, args.buffer_size, args.algorithm, args.mmap_threshold,
+                        args.io_order, args.io_hints)
+    index = HashIndex(args.index, args.algorithm) if args.index != '' else None
+    encoder = DeltaEncoder(args.delta_ratio) if args.delta else None
+    rules = IgnoreRules(args.ignore) if args.ignore is not None else None
+    compare = FolderCompare(args.oldPath, args.newPath, engine, index, args.mode, args.sample, encoder, args.detect_moves, rules)
+    if args.chunks:
+        #分块导出需要完整的比较结果
+        compare.compare()
+        ChunkStore.print_report(ChunkStore().export(compare, args.exportPath))
+    elif args.zip:
+        #直接写入压缩包，不经过暂存目录
+        diff = compare.compareStream() if args.stream else None
+        if not args.stream:
+            compare.compare()
+        with tempfile.TemporaryDirectory() as delta_dir:
+            count = ZipBuilder.compress_files(compare.diffEntries(diff, delta_dir), args.exportPath)["entries"]
+        print('diff file count: ', compare.diffCounts(), 'archive entries: ', count)
+    elif args.stream:
+        #流式比较，边比较边拷贝
+        count = compare.copyDiff(args.exportPath, compare.compareStream())
+        print('diff file count: ', compare.diffCounts(), 'copied files: ', count)
+    else:
+        #调用比较方法
+        compare.compare()
+        #调用拷贝方法
+        compare.copyDiff(args.exportPath)
+        #打印结果
+        print('diff file count: ', compare.diffCounts())
+        #打印差异文件列表
+        for i, node in compare.diff_dict.items():
+            print(node.status if node.encoding == "full" else node.encoding, i)
+    if args.manifest != '':
+        manifest = DiffManifest.from_compare(compare)
+        manifest.write(args.manifest)
+        manifest.print()
+    if index is not None:
+        index.close()
@@ -0,0 +1,486 @@
+import os
+import sys
+import time
+import mmap
+import stat
+import errno
+import struct
+import hashlib
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+#FIEMAP 只在 Linux 上可用，其他系统按 inode 排序
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+#xxhash 是可选依赖，未安装时不提供 xxh 系列算法
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+#线程池的工作函数，返回原始摘要
+def _hash_file(args):
+    file_path, buffer_size, algorithm, mmap_threshold, hints = args
+    return HashEngine.calculate(file_path, buffer_size, algorithm, mmap_threshold, True, hints)
+
+#进程池的工作函数，必须定义在模块顶层才能被 pickle
+#一次计算一批文件，摘要按顺序拼接成一个 bytes 返回，进程间只传递一个紧凑的对象
+def _hash_batch(args):
+    file_list, buffer_size, algorithm, mmap_threshold, hints = args
+    return b"".join(HashEngine.calculate(file_path, buffer_size, algorithm, mmap_threshold, True, hints) for file_path in file_list)
+
+#逐块比较的工作函数
+def _compare_pair(args):
+    path1, path2, block_size, sample, reader = args
+    return HashEngine.files_equal(path1, path2, block_size, sample, reader)
+
+#定义一个并行哈希引擎
+class HashEngine:
+    #默认读缓冲 1MB，大缓冲可以减少系统调用和 Python 层循环次数
+    DEFAULT_BUFFER_SIZE = 1024 * 1024
+    DEFAULT_ALGORITHM = "md5"
+    #大于该阈值的文件使用 mmap 计算哈希值，0 表示不使用 mmap
+    DEFAULT_MMAP_THRESHOLD = 64 * 1024 * 1024
+    #mmap 模式下每次送入哈希对象的数据量，hashlib 处理大块数据时会释放 GIL
+    MMAP_SLICE_SIZE = 64 * 1024 * 1024
+    #hashlib 内置的算法
+    HASHLIB_ALGORITHMS = ("md5", "sha1", "sha256", "blake2b")
+    #xxhash 提供的算法
+    XXHASH_ALGORITHMS = ("xxh64", "xxh3_64", "xxh3_128")
+    #逐块比较时每次读取的大小，按页大小对齐
+    COMPARE_BLOCK_SIZE = 1024 * 1024
+    #use_process 取该值时根据算法和文件大小分布自动选择线程池或进程池
+    POOL_AUTO = "auto"
+    #进程池每个批次的目标大小，大于该大小的文件单独成批
+    BATCH_BYTES = 64 * 1024 * 1024
+    #每个批次最多包含的文件数
+    BATCH_FILES = 1024
+    #文件数少于 workers 的该倍数或总大小小于 PROCESS_MIN_BYTES 时，进程启动的开销不值得
+    PROCESS_MIN_FILES_PER_WORKER = 64
+    PROCESS_MIN_BYTES = 256 * 1024 * 1024
+    #文件大小的中位数小于该值时认为以小文件为主，按算法速度区分：慢速算法每个文件的计算时间更长，线程池更容易并行
+    SMALL_FILE_SIZE = {"sha256": 64 * 1024}
+    DEFAULT_SMALL_FILE_SIZE = 1024 * 1024
+    #读取顺序：none 按传入顺序（目录遍历顺序），inode 按 inode 排序，extent 按文件第一个数据块的物理位置排序
+    ORDER_NONE = "none"
+    ORDER_INODE = "inode"
+    ORDER_EXTENT = "extent"
+    #已提交但未完成的文件总大小上限，预读提示只发给窗口内的文件，避免预读的数据在使用前被挤出页缓存
+    DEFAULT_WINDOW_BYTES = 256 * 1024 * 1024
+    #读取过程中每读完这么多数据，就提示内核丢弃已读部分的页缓存
+    DROP_BEHIND_SIZE = 8 * 1024 * 1024
+    #linux/fs.h: _IOWR('f', 11, struct fiemap)
+    FS_IOC_FIEMAP = 0xC020660B
+
+    #use_process 为 True 使用进程池，False 使用线程池，POOL_AUTO 每次调用时自动选择
+    #io_order 为读取顺序，io_hints 为 True 时通过 posix_fadvise 提示内核预读和丢弃页缓存
+    #丢弃页缓存后，后面的差分编码、压缩等步骤需要重新从磁盘读取这些文件，只适合 NAS 或冷数据等页缓存放不下的目录树，默认关闭
+    def __init__(self, workers=0, use_process=False, buffer_size=DEFAULT_BUFFER_SIZE, algorithm=DEFAULT_ALGORITHM,
+                 mmap_threshold=DEFAULT_MMAP_THRESHOLD, io_order=ORDER_INODE, io_hints=False, window_bytes=DEFAULT_WINDOW_BYTES):
+        #workers <= 0 时按 cpu 核数创建工作线程/进程
+        if workers <= 0:
+            workers = os.cpu_count() or 1
+        #提前创建一次，算法不可用时尽早报错
+        HashEngine.new_hasher(algorithm)
+        self.workers = workers
+        self.use_process = use_process
+        self.buffer_size = buffer_size
+        self.algorithm = algorithm
+        self.mmap_threshold = mmap_threshold
+        self.io_order = io_order
+        #posix_fadvise 只在 Linux 等系统上可用
+        self.io_hints = io_hints and hasattr(os, "posix_fadvise")
+        self.window_bytes = window_bytes
+        #进程池在第一次使用时创建，之后的调用复用同一批工作进程，由 close 关闭
+        self.process_pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    #关闭进程池，之后再使用时重新创建
+    def close(self):
+        if self.process_pool is not None:
+            self.process_pool.shutdown()
+            self.process_pool = None
+
+    #复用的进程池，进程启动和模块导入的开销只付出一次
+    def _pool(self):
+        if self.process_pool is None:
+            self.process_pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self.process_pool
+
+    #当前环境可用的算法列表【静态函数】
+    @staticmethod
+    def available_algorithms():
+        algorithms = list(HashEngine.HASHLIB_ALGORITHMS)
+        if xxhash is not None:
+            algorithms.extend(HashEngine.XXHASH_ALGORITHMS)
+        return algorithms
+
+    #根据算法名创建哈希对象【静态函数】
+    @staticmethod
+    def new_hasher(algorithm=DEFAULT_ALGORITHM):
+        if algorithm in HashEngine.HASHLIB_ALGORITHMS:
+            return hashlib.new(algorithm)
+        if algorithm in HashEngine.XXHASH_ALGORITHMS:
+            if xxhash is None:
+                raise ValueError("hash algorithm " + algorithm + " requires the xxhash module")
+            return getattr(xxhash, algorithm)()
+        raise ValueError("unsupported hash algorithm: " + algorithm)
+
+    #计算单个文件的哈希值，raw 为 True 时返回原始摘要字节，否则返回十六进制字符串【静态函数】
+    #文件大小超过 mmap_threshold 时走 mmap 路径，无法映射的文件回退到普通读取
+    #hints 为 True 时提示内核顺序读取，并在读取后丢弃这个文件的页缓存，不挤占其他数据的页缓存
+    #符号链接不跟随，计算链接目标字符串的哈希值，与压缩包中链接条目的内容一致
+    @staticmethod
+    def calculate(file_path, buffer_size=DEFAULT_BUFFER_SIZE, algorithm=DEFAULT_ALGORITHM, mmap_threshold=0, raw=False,
+                  hints=False):
+        if mmap_threshold > 0:
+            try:
+                if os.lstat(file_path).st_size >= mmap_threshold:
+                    return HashEngine.calculate_mmap(file_path, algorithm, raw, hints)
+            except (OSError, ValueError):
+                #网络文件系统、特殊文件等可能不支持 mmap
+                pass
+        try:
+            return HashEngine.calculate_read(file_path, buffer_size, algorithm, raw, hints)
+        except OSError as e:
+            #O_NOFOLLOW 打开符号链接时返回 ELOOP，普通文件不需要额外的 lstat
+            if e.errno != errno.ELOOP:
+                raise
+            return HashEngine.calculate_link(file_path, algorithm, raw)
+
+    #计算符号链接目标字符串的哈希值【静态函数】
+    @staticmethod
+    def calculate_link(file_path, algorithm=DEFAULT_ALGORITHM, raw=False):
+        hasher = HashEngine.new_hasher(algorithm)
+        hasher.update(os.readlink(os.fsencode(file_path)))
+        return hasher.digest() if raw else hasher.hexdigest()
+
+    #打开文件时不跟随符号链接，不支持 O_NOFOLLOW 的系统按普通方式打开【静态函数】
+    @staticmethod
+    def _opener(file_path, flags):
+        return os.open(file_path, flags | getattr(os, "O_NOFOLLOW", 0))
+
+    #posix_fadvise 只是提示，不支持的文件系统直接忽略【静态函数】
+    @staticmethod
+    def _advise(fd, offset, length, advice):
+        try:
+            os.posix_fadvise(fd, offset, length, advice)
+        except OSError:
+            pass
+
+    #通过 readinto 循环读取文件计算哈希值【静态函数】
+    #复用同一个 bytearray 配合 readinto 读取，每个数据块不再分配新的 bytes 对象
+    @staticmethod
+    def calculate_read(file_path, buffer_size=DEFAULT_BUFFER_SIZE, algorithm=DEFAULT_ALGORITHM, raw=False, hints=False):
+        hasher = HashEngine.new_hasher(algorithm)
+        buffer = bytearray(buffer_size)
+        view = memoryview(buffer)
+        #buffering=0 直接读入缓冲区，避免经过 BufferedReader 再拷贝一次
+        with open(file_path, "rb", buffering=0, opener=HashEngine._opener) as file:
+            if hints:
+                HashEngine._advise(file.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            offset = 0
+            dropped = 0
+            size = file.readinto(buffer)
+            while size:
+                hasher.update(view[:size])
+                offset += size
+                if hints and offset - dropped >= HashEngine.DROP_BEHIND_SIZE:
+                    #丢弃已经读过的部分
+                    HashEngine._advise(file.fileno(), dropped, offset - dropped, os.POSIX_FADV_DONTNEED)
+                    dropped = offset
+                size = file.readinto(buffer)
+            if hints:
+                HashEngine._advise(file.fileno(), dropped, 0, os.POSIX_FADV_DONTNEED)
+
+        return hasher.digest() if raw else hasher.hexdigest()
+
+    #通过 mmap 映射文件计算哈希值，大文件只需要几次 update 调用【静态函数】
+    @staticmethod
+    def calculate_mmap(file_path, algorithm=DEFAULT_ALGORITHM, raw=False, hints=False):
+        hasher = HashEngine.new_hasher(algorithm)
+        with open(file_path, "rb", opener=HashEngine._opener) as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if hasattr(mapped, "madvise"):
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
+                #切片必须及时释放，否则关闭 mmap 时会报 BufferError
+                with memoryview(mapped) as view:
+                    for offset in range(0, len(view), HashEngine.MMAP_SLICE_SIZE):
+                        with view[offset:offset + HashEngine.MMAP_SLICE_SIZE] as chunk:
+                            hasher.update(chunk)
+            if hints:
+                HashEngine._advise(file.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+        return hasher.digest() if raw else hasher.hexdigest()
+
+    #并行计算文件列表的哈希值，返回十六进制字符串列表，顺序与输入顺序一致
+    #sizes / inodes 为对应的文件大小和 inode，为空时按需读取
+    def hash_files(self, file_list, sizes=None, inodes=None):
+        return [digest.hex() for digest in self.hash_files_raw(file_list, sizes, inodes)]
+
+    #并行计算文件列表的哈希值，返回原始摘要字节列表，顺序与输入顺序一致
+    def hash_files_raw(self, file_list, sizes=None, inodes=None):
+        if len(file_list) == 0:
+            return []
+        if sizes is None:
+            sizes = [os.lstat(file_path).st_size for file_path in file_list]
+        order = self.read_order(file_list, inodes)
+        use_process = self.use_process
+        if use_process == HashEngine.POOL_AUTO:
+            use_process = HashEngine.prefer_process(self.algorithm, sizes, self.workers)
+        if use_process and self.workers > 1 and len(file_list) > 1:
+            return self._hash_batches(file_list, sizes, order)
+        return self._hash_window(file_list, sizes, order)
+
+    #按磁盘顺序排列的下标列表，机械硬盘和 NAS 上可以减少寻道
+    def read_order(self, file_list, inodes=None):
+        order = list(range(len(file_list)))
+        if self.io_order == HashEngine.ORDER_EXTENT:
+            keys = [HashEngine.physical_offset(file_path) for file_path in file_list]
+            if all(key is not None for key in keys):
+                order.sort(key=lambda i: keys[i])
+                return order
+        if self.io_order in (HashEngine.ORDER_INODE, HashEngine.ORDER_EXTENT):
+            if inodes is None or any(inode is None for inode in inodes):
+                inodes = [os.lstat(file_path).st_ino for file_path in file_list]
+            order.sort(key=lambda i: inodes[i])
+        return order
+
+    #文件第一个数据块的物理偏移，通过 FIEMAP 获取，不支持时返回 None【静态函数】
+    @staticmethod
+    def physical_offset(file_path):
+        if fcntl is None or not sys.platform.startswith("linux"):
+            return None
+        #struct fiemap: fm_start, fm_length, fm_flags, fm_mapped_extents, fm_extent_count, fm_reserved，后接一个 56 字节的 fiemap_extent
+        request = struct.pack("=QQIIII", 0, 0xFFFFFFFFFFFFFFFF, 0, 0, 1, 0) + bytes(56)
+        try:
+            with open(file_path, "rb") as file:
+                reply = fcntl.ioctl(file.fileno(), HashEngine.FS_IOC_FIEMAP, request)
+        except OSError:
+            return None
+        if struct.unpack_from("=I", reply, 20)[0] == 0:
+            #空文件或数据还在内存中没有分配物理块
+            return None
+        #fiemap_extent: fe_logical, fe_physical, ...
+        return struct.unpack_from("=Q", reply, 32 + 8)[0]
+
+    #按 order 的顺序计算哈希值，已提交未完成的文件总大小不超过 window_bytes
+    #文件提交给线程池时提示内核预读，读取时丢弃已读部分，页缓存的占用与窗口大小相当
+    def _hash_window(self, file_list, sizes, order):
+        result = [None] * len(file_list)
+        workers = self.workers if len(file_list) > 1 else 1
+        window = deque()
+        in_flight = 0
+        #hashlib 在处理大块数据时会释放 GIL，线程池即可占满多个核
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for i in order:
+                while len(window) > 0 and (in_flight + sizes[i] > self.window_bytes or len(window) >= workers * 4):
+                    j, future = window.popleft()
+                    result[j] = future.result()
+                    in_flight -= sizes[j]
+                if self.io_hints:
+                    self.prefetch(file_list[i], sizes[i])
+                task = (file_list[i], self.buffer_size, self.algorithm, self.mmap_threshold, self.io_hints)
+                window.append((i, executor.submit(_hash_file, task)))
+                in_flight += sizes[i]
+            for j, future in window:
+                result[j] = future.result()
+        return result
+
+    #提示内核预读文件开头不超过窗口大小的部分
+    def prefetch(self, file_path, size):
+        try:
+            fd = os.open(file_path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            HashEngine._advise(fd, 0, min(size, self.window_bytes), os.POSIX_FADV_WILLNEED)
+        finally:
+            os.close(fd)
+
+    #进程池按大小均衡的批次分发任务，避免每个小文件都付出一次进程间通信的开销
+    #单个文件的摘要只能顺序计算，无法拆分到多个进程；大文件单独成批并最先提交，与小文件批次并行
+    #批次内的文件按 order 的磁盘顺序读取
+    def _hash_batches(self, file_list, sizes, order):
+        digest_size = HashEngine.new_hasher(self.algorithm).digest_size
+        rank = [0] * len(file_list)
+        for position, i in enumerate(order):
+            rank[i] = position
+        result = [None] * len(file_list)
+        executor = self._pool()
+        futures = []
+        for batch in HashEngine.make_batches(sizes, self.workers):
+            batch.sort(key=lambda i: rank[i])
+            task = ([file_list[i] for i in batch], self.buffer_size, self.algorithm, self.mmap_threshold, self.io_hints)
+            futures.append((batch, executor.submit(_hash_batch, task)))
+        for batch, future in futures:
+            digests = future.result()
+            for position, i in enumerate(batch):
+                result[i] = digests[position * digest_size:(position + 1) * digest_size]
+        return result
+
+    #把文件分成大小均衡的批次，返回下标列表的列表，总大小大的批次排在前面【静态函数】
+    #按大小从大到小排列后依次装箱，批次的目标大小为总大小的 1/(workers*4)，不超过 BATCH_BYTES，
+    #这样每个工作进程能分到多个批次，先完成的进程继续领取剩余的批次
+    @staticmethod
+    def make_batches(sizes, workers, batch_bytes=BATCH_BYTES, batch_files=BATCH_FILES):
+        order = sorted(range(len(sizes)), key=lambda i: sizes[i], reverse=True)
+        target = min(batch_bytes, max(sum(sizes) // (max(workers, 1) * 4), 1))
+        batches = []
+        batch = []
+        batch_size = 0
+        for i in order:
+            batch.append(i)
+            batch_size += sizes[i]
+            if batch_size >= target or len(batch) >= batch_files:
+                batches.append(batch)
+                batch = []
+                batch_size = 0
+        if len(batch) > 0:
+            batches.append(batch)
+        return batches
+
+    #根据算法和文件大小分布选择进程池（True）或线程池（False）【静态函数】
+    #hashlib 处理大块数据时释放 GIL，大文件为主时线程池就能并行，而且没有进程启动和通信的开销；
+    #小文件为主时打开文件、读取循环等持有 GIL 的 Python 代码占比高，进程池更快
+    @staticmethod
+    def prefer_process(algorithm, sizes, workers):
+        if workers <= 1 or len(sizes) < workers * HashEngine.PROCESS_MIN_FILES_PER_WORKER:
+            return False
+        if sum(sizes) < HashEngine.PROCESS_MIN_BYTES:
+            return False
+        median = sorted(sizes)[len(sizes) // 2]
+        return median < HashEngine.SMALL_FILE_SIZE.get(algorithm, HashEngine.DEFAULT_SMALL_FILE_SIZE)
+
+    #读取文件指定偏移处的一块数据到缓冲区，返回读取的字节数【静态函数】
+    @staticmethod
+    def _read_block(file, offset, buffer):
+        file.seek(offset)
+        return file.readinto(buffer)
+
+    #逐块比较两个文件的内容，遇到第一个不同的块立即返回 False【静态函数】
+    #sample 为 True 时先比较首尾两块，大多数修改过的文件在这一步就能判定
+    #reader 为线程池时第二个文件的读取交给 reader，两个文件同时读取
+    #符号链接比较链接目标字符串，链接和普通文件总是不同
+    @staticmethod
+    def files_equal(path1, path2, block_size=COMPARE_BLOCK_SIZE, sample=False, reader=None):
+        st1 = os.lstat(path1)
+        st2 = os.lstat(path2)
+        size = st1.st_size
+        if size != st2.st_size:
+            return False
+        if stat.S_ISLNK(st1.st_mode) or stat.S_ISLNK(st2.st_mode):
+            return stat.S_ISLNK(st1.st_mode) and stat.S_ISLNK(st2.st_mode) and os.readlink(path1) == os.readlink(path2)
+        buffer1 = bytearray(block_size)
+        buffer2 = bytearray(block_size)
+        with open(path1, "rb", buffering=0) as file1, open(path2, "rb", buffering=0) as file2:
+            def blocks_equal(offset):
+                if reader is not None:
+                    future = reader.submit(HashEngine._read_block, file2, offset, buffer2)
+                    size1 = HashEngine._read_block(file1, offset, buffer1)
+                    size2 = future.result()
+                else:
+                    size1 = HashEngine._read_block(file1, offset, buffer1)
+                    size2 = HashEngine._read_block(file2, offset, buffer2)
+                if size1 != size2:
+                    return False
+                if size1 == block_size:
+                    return buffer1 == buffer2
+                return buffer1[:size1] == buffer2[:size2]
+
+            begin = 0
+            end = size
+            if sample and size > block_size:
+                #首块和最后一个对齐的块
+                tail = (size - 1) // block_size * block_size
+                if not blocks_equal(0) or not blocks_equal(tail):
+                    return False
+                begin = block_size
+                end = tail
+            for offset in range(begin, end, block_size):
+                if not blocks_equal(offset):
+                    return False
+        return True
+
+    #并行逐块比较文件对列表，返回是否相同的列表，顺序与输入一致
+    def compare_pairs(self, pair_list, sample=False, block_size=COMPARE_BLOCK_SIZE):
+        if len(pair_list) == 0:
+            return []
+        #reader 线程池专门读取第二个文件，两个文件的读取同时进行
+        with ThreadPoolExecutor(max_workers=self.workers) as reader:
+            tasks = [(path1, path2, block_size, sample, reader) for path1, path2 in pair_list]
+            if self.workers <= 1 or len(tasks) <= 1:
+                return [_compare_pair(task) for task in tasks]
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                return list(executor.map(_compare_pair, tasks))
+
+    #测试各个算法在本地磁盘上的吞吐量，返回 {算法: MB/s}【静态函数】
+    #先完整读一遍文件预热页缓存，测到的主要是算法本身的开销
+    @staticmethod
+    def benchmark(file_list, algorithms=None, buffer_size=DEFAULT_BUFFER_SIZE):
+        if algorithms is None:
+            algorithms = HashEngine.available_algorithms()
+        total_size = sum(os.path.getsize(file_path) for file_path in file_list)
+        for file_path in file_list:
+            HashEngine.calculate(file_path, buffer_size)
+        result = {}
+        for algorithm in algorithms:
+            begin = time.perf_counter()
+            for file_path in file_list:
+                HashEngine.calculate(file_path, buffer_size, algorithm)
+            elapsed = max(time.perf_counter() - begin, 1e-9)
+            result[algorithm] = total_size / elapsed / (1024 * 1024)
+        return result
+
+    #对比普通读取和 mmap 两种路径的吞吐量，返回 {路径: MB/s}【静态函数】
+    @staticmethod
+    def benchmark_mmap(file_list, algorithm=DEFAULT_ALGORITHM, buffer_size=DEFAULT_BUFFER_SIZE):
+        total_size = sum(os.path.getsize(file_path) for file_path in file_list)
+        for file_path in file_list:
+            HashEngine.calculate_read(file_path, buffer_size, algorithm)
+        result = {}
+        for name, calculate in (("read", lambda file_path: HashEngine.calculate_read(file_path, buffer_size, algorithm)),
+                                ("mmap", lambda file_path: HashEngine.calculate_mmap(file_path, algorithm))):
+            begin = time.perf_counter()
+            for file_path in file_list:
+                calculate(file_path)
+            elapsed = max(time.perf_counter() - begin, 1e-9)
+            result[name] = total_size / elapsed / (1024 * 1024)
+        return result
+
+
+#main函数
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='hash files in parallel')
+    parser.add_argument('files', nargs='+')
+    parser.add_argument('--algorithm', default=HashEngine.DEFAULT_ALGORITHM, choices=HashEngine.available_algorithms())
+    parser.add_argument('--buffer-size', type=int, default=HashEngine.DEFAULT_BUFFER_SIZE, help='read buffer size in bytes')
+    parser.add_argument('--mmap-threshold', type=int, default=HashEngine.DEFAULT_MMAP_THRESHOLD, help='files at least this large are hashed through mmap, 0 disables mmap')
+    parser.add_argument('--process', action='store_true', help='hash with a process pool instead of threads')
+    parser.add_argument('--auto-process', action='store_true', help='choose threads or processes from the algorithm and file sizes')
+    parser.add_argument('--bench', action='store_true', help='report MB/s of every available algorithm on the given files')
+    parser.add_argument('--bench-mmap', action='store_true', help='report MB/s of the read loop and the mmap path on the given files')
+    args = parser.parse_args()
+
+    if args.bench:
+        for algorithm, speed in HashEngine.benchmark(args.files, buffer_size=args.buffer_size).items():
+            print('%-10s %10.1f MB/s' % (algorithm, speed))
+        sys.exit(0)
+    if args.bench_mmap:
+        for name, speed in HashEngine.benchmark_mmap(args.files, args.algorithm, args.buffer_size).items():
+            print('%-10s %10.1f MB/s' % (name, speed))
+        sys.exit(0)
+
+    use_process = HashEngine.POOL_AUTO if args.auto_process else args.process
+    with HashEngine(0, use_process, args.buffer_size, args.algorithm, args.mmap_threshold) as engine:
+        for file_path, digest in zip(args.files, engine.hash_files(args.files)):
+            print(digest, file_path)
@@ -0,0 +1,137 @@
+import os
+import sys
+import sqlite3
+
+#定义一个持久化的哈希索引
+#以 (相对路径, inode) 为键，记录文件的大小、修改时间、状态改变时间、哈希算法和哈希值
+#文件的 (大小, 修改时间, inode, 状态改变时间) 未变化且算法相同时直接复用上次的哈希值，不再读取文件内容
+#键中不包含根目录：同一个版本先作为 current 后作为 previous 挂载时，挂载点不同也能命中
+#解压会恢复压缩包中的修改时间，同一个文件夹清空后重新解压时 inode 也可能被复用，
+#只有状态改变时间（ctime）在写入文件时一定会更新，所以必须参与判断，重新解压的文件不会命中旧记录
+class HashIndex:
+    #表结构版本，结构变化时旧索引直接丢弃重建
+    SCHEMA_VERSION = 2
+    #空闲页超过总页数的这个比例时，compact 才执行 VACUUM 回收空间
+    VACUUM_RATIO = 0.25
+
+    def __init__(self, index_path, algorithm="md5"):
+        self.index_path = index_path
+        self.algorithm = algorithm
+        index_dir = os.path.dirname(index_path)
+        if index_dir != "" and not os.path.exists(index_dir):
+            os.makedirs(index_dir)
+        self.connection = sqlite3.connect(index_path)
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != HashIndex.SCHEMA_VERSION:
+            self.connection.execute("DROP TABLE IF EXISTS hash_index")
+            self.connection.execute("PRAGMA user_version=%d" % HashIndex.SCHEMA_VERSION)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS hash_index ("
+            "path TEXT NOT NULL, "
+            "inode INTEGER NOT NULL, "
+            "size INTEGER NOT NULL, "
+            "mtime_ns INTEGER NOT NULL, "
+            "ctime_ns INTEGER NOT NULL, "
+            "algorithm TEXT NOT NULL, "
+            "digest TEXT NOT NULL, "
+            "PRIMARY KEY (path, inode)) WITHOUT ROWID")
+        self.connection.commit()
+        #全部记录在第一次查询时一次性加载，{(相对路径, inode): (大小, 修改时间, 状态改变时间, 算法, 哈希值)}
+        self.cache = None
+        #待写入的记录
+        self.pending = []
+        self.hits = 0
+        self.misses = 0
+
+    #加载全部记录
+    def _load(self):
+        if self.cache is None:
+            rows = self.connection.execute("SELECT path, inode, size, mtime_ns, ctime_ns, algorithm, digest FROM hash_index")
+            self.cache = {row[:2]: row[2:] for row in rows}
+        return self.cache
+
+    #查询哈希值，文件状态未变化时返回缓存的哈希值，否则返回 None
+    #ctime_ns 为 None 时无法确认文件没有被重新写入，不使用索引
+    def lookup(self, relativePath, size, mtime_ns, inode, ctime_ns):
+        record = None if ctime_ns is None else self._load().get((relativePath, inode))
+        if record is not None and record[:4] == (size, mtime_ns, ctime_ns, self.algorithm):
+            self.hits += 1
+            return record[4]
+        self.misses += 1
+        return None
+
+    #记录新计算的哈希值，调用 flush 后写入数据库
+    def store(self, relativePath, size, mtime_ns, inode, ctime_ns, digest):
+        if ctime_ns is None:
+            return
+        self._load()[(relativePath, inode)] = (size, mtime_ns, ctime_ns, self.algorithm, digest)
+        self.pending.append((relativePath, inode, size, mtime_ns, ctime_ns, self.algorithm, digest))
+
+    def flush(self):
+        if len(self.pending) == 0:
+            return
+        self.connection.executemany("INSERT OR REPLACE INTO hash_index VALUES (?, ?, ?, ?, ?, ?, ?)", self.pending)
+        self.connection.commit()
+        self.pending = []
+
+    #清空全部记录
+    def invalidate(self):
+        self.pending = []
+        self.connection.execute("DELETE FROM hash_index")
+        self.cache = {}
+        self.connection.commit()
+
+    #压缩索引：删除已经不存在的文件的记录
+    #live_keys 为本次遍历到的 (相对路径, inode) 序列
+    #VACUUM 会重写整个数据库，每次比较都执行的开销与索引大小相关，只在 vacuum 为 True 或空闲页比例超过 VACUUM_RATIO 时执行
+    def compact(self, live_keys=None, vacuum=False):
+        self.flush()
+        removed = 0
+        if live_keys is not None:
+            live = set(live_keys)
+            records = self._load()
+            dead = [key for key in records if key not in live]
+            for key in dead:
+                del records[key]
+            self.connection.executemany("DELETE FROM hash_index WHERE path=? AND inode=?", dead)
+            removed = len(dead)
+            self.connection.commit()
+        if vacuum or self.free_ratio() > HashIndex.VACUUM_RATIO:
+            self.connection.execute("VACUUM")
+        return removed
+
+    #空闲页占数据库总页数的比例
+    def free_ratio(self):
+        page_count = self.connection.execute("PRAGMA page_count").fetchone()[0]
+        if page_count == 0:
+            return 0
+        return self.connection.execute("PRAGMA freelist_count").fetchone()[0] / page_count
+
+    def count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM hash_index").fetchone()[0]
+
+    #打印命中统计
+    def print(self):
+        total = self.hits + self.misses
+        rate = 0 if total == 0 else self.hits * 100.0 / total
+        print("hash index hit: %d miss: %d (%.1f%%)" % (self.hits, self.misses, rate))
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+
+#main函数
+if __name__ == '__main__':
+    args = sys.argv
+    if len(args) != 3 or args[2] not in ('stats', 'compact', 'clear'):
+        print('Usage: python HashIndex.py indexPath stats|compact|clear')
+        sys.exit(1)
+
+    index = HashIndex(args[1])
+    if args[2] == 'compact':
+        index.compact(vacuum=True)
+    elif args[2] == 'clear':
+        index.invalidate()
+    print('hash index records: ', index.count())
+    index.close()
@@ -0,0 +1,164 @@
+import os
+import re
+import sys
+
+#定义一组忽略规则，语法与 .gitignore 相同，所有规则只在创建时编译一次
+#  name       任意层级中名称为 name 的文件或文件夹
+#  /name      只匹配根目录下的 name；中间带 / 的规则同样相对根目录
+#  name/      只匹配文件夹
+#  !name      重新包含之前被忽略的条目，最后一条匹配的规则生效
+#  * ? [..]   不跨越 / 的通配符；** 匹配任意层级的文件夹
+#文件夹被忽略后，遍历时整个子树都不会进入，其中的条目也无法再被 ! 规则重新包含
+class IgnoreRules:
+    #与原来遍历时的过滤规则一致：隐藏文件和任意层级中名为 Applications 的条目（dmg 中指向 /Applications 的链接）
+    #Thumbs.db 等其他系统文件在 config.json 的 ignore 中配置
+    DEFAULT_PATTERNS = [".*", "Applications"]
+
+    def __init__(self, patterns=None):
+        if patterns is None:
+            patterns = IgnoreRules.DEFAULT_PATTERNS
+        self.patterns = list(patterns)
+        #按顺序编译后的规则 (正则, 是否取反, 是否只匹配文件夹, 是否匹配完整路径)
+        self.rules = []
+        for pattern in self.patterns:
+            rule = IgnoreRules._compile(pattern)
+            if rule is not None:
+                self.rules.append(rule)
+        self.has_negation = any(rule[1] for rule in self.rules)
+        #没有取反规则时，同类规则合并成一个正则，名称完全相同的规则直接查集合
+        self.names = set()
+        self.dir_names = set()
+        name_patterns = []
+        dir_name_patterns = []
+        path_patterns = []
+        dir_path_patterns = []
+        for regex, negate, dir_only, full_path in self.rules:
+            pattern = regex.pattern[:-2]
+            if not full_path and re.fullmatch(r"[^*?\[\\]+", IgnoreRules._literal(pattern)):
+                (self.dir_names if dir_only else self.names).add(IgnoreRules._literal(pattern))
+            elif full_path:
+                (dir_path_patterns if dir_only else path_patterns).append(pattern)
+            else:
+                (dir_name_patterns if dir_only else name_patterns).append(pattern)
+        self.name_regex = IgnoreRules._join(name_patterns)
+        self.dir_name_regex = IgnoreRules._join(dir_name_patterns)
+        self.path_regex = IgnoreRules._join(path_patterns)
+        self.dir_path_regex = IgnoreRules._join(dir_path_patterns)
+
+    #把一条规则编译成正则，空行和注释返回 None【静态函数】
+    @staticmethod
+    def _compile(pattern):
+        pattern = pattern.strip()
+        if pattern == "" or pattern.startswith("#"):
+            return None
+        negate = pattern.startswith("!")
+        if negate:
+            pattern = pattern[1:]
+        dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        #中间或开头带 / 的规则相对根目录匹配完整路径，否则只匹配名称
+        full_path = "/" in pattern
+        pattern = pattern.lstrip("/")
+        if pattern == "":
+            return None
+        return (re.compile(IgnoreRules._translate(pattern) + r"\Z", re.DOTALL), negate, dir_only, full_path)
+
+    #把 glob 转换成正则【静态函数】
+    @staticmethod
+    def _translate(pattern):
+        result = []
+        i = 0
+        n = len(pattern)
+        while i < n:
+            c = pattern[i]
+            if pattern.startswith("**", i):
+                if pattern.startswith("**/", i):
+                    #**/ 匹配零个或多个文件夹
+                    result.append("(?:.*/)?")
+                    i += 3
+                else:
+                    #结尾的 ** 匹配其中的所有内容
+                    result.append(".*")
+                    i += 2
+                continue
+            if c == "*":
+                result.append("[^/]*")
+            elif c == "?":
+                result.append("[^/]")
+            elif c == "[":
+                end = pattern.find("]", i + 2)
+                if end < 0:
+                    result.append(re.escape(c))
+                else:
+                    content = pattern[i + 1:end]
+                    if content.startswith("!"):
+                        content = "^" + content[1:]
+                    result.append("[" + content.replace("\\", "\\\\") + "]")
+                    i = end
+            elif c == "\\" and i + 1 < n:
+                i += 1
+                result.append(re.escape(pattern[i]))
+            else:
+                result.append(re.escape(c))
+            i += 1
+        return "".join(result)
+
+    #正则转义过的纯文本规则还原成名称【静态函数】
+    @staticmethod
+    def _literal(pattern):
+        return re.sub(r"\\(.)", r"\1", pattern)
+
+    #合并多个正则，没有规则时返回 None【静态函数】
+    @staticmethod
+    def _join(patterns):
+        if len(patterns) == 0:
+            return None
+        return re.compile("(?:" + "|".join(patterns) + r")\Z", re.DOTALL)
+
+    #判断条目是否被忽略，relativePath 为相对根目录的路径，name 为条目名称（缺省时从路径中取）
+    def match(self, relativePath, is_dir=False, name=None):
+        if os.sep != "/":
+            relativePath = relativePath.replace(os.sep, "/")
+        if name is None:
+            name = relativePath.rsplit("/", 1)[-1]
+        if self.has_negation:
+            #最后一条匹配的规则生效
+            for regex, negate, dir_only, full_path in reversed(self.rules):
+                if dir_only and not is_dir:
+                    continue
+                if regex.match(relativePath if full_path else name):
+                    return not negate
+            return False
+        if name in self.names:
+            return True
+        if self.name_regex is not None and self.name_regex.match(name):
+            return True
+        if self.path_regex is not None and self.path_regex.match(relativePath):
+            return True
+        if is_dir:
+            if name in self.dir_names:
+                return True
+            if self.dir_name_regex is not None and self.dir_name_regex.match(name):
+                return True
+            if self.dir_path_regex is not None and self.dir_path_regex.match(relativePath):
+                return True
+        return False
+
+    #过滤文件名列表，返回没有被忽略的条目
+    def filter(self, names, is_dir=False):
+        return [name for name in names if not self.match(name, is_dir)]
+
+    #打印规则
+    def print(self):
+        print("ignore rules: ", self.patterns)
+
+
+#main函数
+if __name__ == '__main__':
+    args = sys.argv
+    if len(args) < 3:
+        print('Usage: python IgnoreRules.py pattern [pattern ...] relativePath')
+        sys.exit(1)
+
+    rules = IgnoreRules(args[1:-1])
+    print(rules.match(args[-1].rstrip("/"), args[-1].endswith("/")))
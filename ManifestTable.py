@@ -0,0 +1,417 @@
+import os
+import sys
+import json
+import time
+import array
+import argparse
+import tracemalloc
+from HashEngine import HashEngine
+from FolderCompare import FolderCompare, FileNode
+
+#定义一个路径表，两个版本的清单共用，每个目录前缀只保存一次
+class PathTable:
+    def __init__(self):
+        #目录前缀列表，包含末尾的路径分隔符，根目录为空字符串
+        self.dirs = []
+        self.index = {}
+
+    def dir_id(self, directory):
+        dir_id = self.index.get(directory)
+        if dir_id is None:
+            dir_id = len(self.dirs)
+            self.dirs.append(directory)
+            self.index[directory] = dir_id
+        return dir_id
+
+#定义一个列式存储的文件清单，用于百万级文件的目录树
+#每个文件不再是一个 FileNode 对象，而是各列中的一行：
+#  dir_ids / names  目录前缀在 PathTable 中的编号，文件名以 \0 结尾连续存放在一个 bytearray 中，name_offsets 记录每行的起始位置
+#  sizes / mtimes / inodes / ctimes  array('q') 连续存储
+#  digests 原始摘要字节（不是十六进制字符串）连续存放在一个 bytearray 中，hashed 标记哪些行已有摘要
+#  links 符号链接的行号到链接目标的字典，符号链接按链接本身记录（lstat 的大小，摘要为链接目标的摘要）
+#行按相对路径的字符串顺序排列，绝对路径不保存，需要时由 root 和相对路径拼出
+class ManifestTable:
+    #比较时一次比较的最大行数
+    MAX_BLOCK = 4096
+    #对齐的区间小于该行数时逐行比较，不再二分
+    SCALAR_ROWS = 16
+    #随版本包发布的版本清单文件名
+    MANIFEST_NAME = "version_manifest.json"
+    #2 为符号链接的行增加链接目标，仍然可以读取 1
+    FORMAT_VERSION = 2
+    SUPPORTED_VERSIONS = (1, 2)
+
+    def __init__(self, root, digest_size=16, path_table=None):
+        self.root = root
+        self.digest_size = digest_size
+        #比较的两个清单必须共用同一个路径表
+        if path_table is None:
+            path_table = PathTable()
+        self.path_table = path_table
+        self.dir_ids = array.array('I')
+        self.names = bytearray()
+        self.name_offsets = array.array('q', [0])
+        self.sizes = array.array('q')
+        self.mtimes = array.array('q')
+        self.inodes = array.array('q')
+        self.ctimes = array.array('q')
+        self.digests = bytearray()
+        self.hashed = bytearray()
+        self.links = {}
+
+    def __len__(self):
+        return len(self.dir_ids)
+
+    #追加一行，调用方保证按相对路径顺序追加
+    #ctime 未知时记为 -1，不使用哈希索引；link 为符号链接的目标，普通文件为 None
+    def append(self, relativePath, size, mtime, inode, ctime=-1, digest=None, link=None):
+        if link is not None:
+            self.links[len(self)] = link
+        directory, separator, name = relativePath.rpartition(os.sep)
+        self.dir_ids.append(self.path_table.dir_id(directory + separator))
+        self.names += name.encode("utf-8")
+        self.names.append(0)
+        self.name_offsets.append(len(self.names))
+        self.sizes.append(size)
+        self.mtimes.append(mtime)
+        self.inodes.append(inode)
+        self.ctimes.append(ctime)
+        if digest is None:
+            self.digests.extend(bytes(self.digest_size))
+            self.hashed.append(0)
+        else:
+            self.digests.extend(digest)
+            self.hashed.append(1)
+
+    #由 (绝对路径, 相对路径, 大小, 修改时间, inode, 状态改变时间) 记录构建，记录需要按相对路径排序【静态函数】
+    @staticmethod
+    def from_records(root, records, digest_size=16, path_table=None):
+        table = ManifestTable(root, digest_size, path_table)
+        for absolutePath, relativePath, size, mtime, inode, ctime in records:
+            table.append(relativePath, size, mtime, inode, ctime)
+        return table
+
+    #按相对路径顺序遍历文件夹构建清单，不计算摘要【静态函数】
+    #符号链接不跟随，记录链接目标；DirEntry 缓存了文件类型，普通文件不需要额外的系统调用
+    @staticmethod
+    def from_walk(root, digest_size=16, path_table=None, ignoreRules=None):
+        table = ManifestTable(root, digest_size, path_table)
+        for entry, relativePath in FolderCompare.walkSortedEntries(root, ignoreRules):
+            stat = entry.stat(follow_symlinks=False)
+            link = os.readlink(entry.path) if entry.is_symlink() else None
+            table.append(relativePath, stat.st_size, stat.st_mtime_ns, stat.st_ino, stat.st_ctime_ns, link=link)
+        return table
+
+    def path(self, row):
+        name = self.names[self.name_offsets[row]:self.name_offsets[row + 1] - 1].decode("utf-8")
+        return self.path_table.dirs[self.dir_ids[row]] + name
+
+    def absolute_path(self, row):
+        return os.path.join(self.root, self.path(row))
+
+    def digest(self, row):
+        if not self.hashed[row]:
+            return None
+        return bytes(self.digests[row * self.digest_size:(row + 1) * self.digest_size])
+
+    def hexdigest(self, row):
+        digest = self.digest(row)
+        return None if digest is None else digest.hex()
+
+    #写入十六进制摘要，HashIndex 中保存的是十六进制字符串
+    def set_hexdigest(self, row, hexdigest):
+        self.set_digest(row, bytes.fromhex(hexdigest))
+
+    def set_digest(self, row, digest):
+        if len(digest) != self.digest_size:
+            raise ValueError("digest size mismatch: %d != %d" % (len(digest), self.digest_size))
+        self.digests[row * self.digest_size:(row + 1) * self.digest_size] = digest
+        self.hashed[row] = 1
+
+    #为指定行补充摘要，哈希索引命中的直接复用，其余交给哈希引擎并行计算
+    def fill_digests(self, rows, hash_engine, hash_index=None):
+        hash_rows = []
+        for row in rows:
+            if self.hashed[row]:
+                continue
+            if hash_index is not None:
+                digest = hash_index.lookup(self.path(row), self.sizes[row], self.mtimes[row], self.inodes[row], self.ctime(row))
+                if digest is not None:
+                    self.set_hexdigest(row, digest)
+                    continue
+            hash_rows.append(row)
+        digest_list = hash_engine.hash_files_raw([self.absolute_path(row) for row in hash_rows], [self.sizes[row] for row in hash_rows],
+                                                 [self.inodes[row] for row in hash_rows])
+        for row, digest in zip(hash_rows, digest_list):
+            self.set_digest(row, digest)
+            if hash_index is not None:
+                hash_index.store(self.path(row), self.sizes[row], self.mtimes[row], self.inodes[row], self.ctime(row), digest.hex())
+        if hash_index is not None:
+            hash_index.flush()
+
+    def ctime(self, row):
+        return None if self.ctimes[row] < 0 else self.ctimes[row]
+
+    #符号链接的目标，普通文件返回 None
+    def link(self, row):
+        return self.links.get(row)
+
+    #转换为 FileNode，只对变更集中的行调用
+    def to_node(self, row):
+        relativePath = self.path(row)
+        return FileNode(os.path.join(self.root, relativePath), relativePath, self.hexdigest(row), self.sizes[row],
+                        self.mtimes[row], self.inodes[row], self.ctime(row))
+
+    #保存为版本清单，每个文件一行 [相对路径, 大小, 摘要]，符号链接在末尾加上链接目标，路径使用 / 分隔，所有行都必须已有摘要
+    def save(self, manifest_path, algorithm):
+        files = []
+        for row in range(len(self)):
+            if not self.hashed[row]:
+                raise ValueError("missing digest: " + self.path(row))
+            files.append([self.path(row).replace(os.sep, "/"), self.sizes[row], self.hexdigest(row)])
+            if row in self.links:
+                files[-1].append(self.links[row])
+        manifest_dir = os.path.dirname(manifest_path)
+        if manifest_dir != "" and not os.path.exists(manifest_dir):
+            os.makedirs(manifest_dir)
+        with open(manifest_path, 'w', -1, "utf-8") as f:
+            json.dump({"version": ManifestTable.FORMAT_VERSION, "algorithm": algorithm, "files": files}, f,
+                      ensure_ascii=False, separators=(',', ':'))
+
+    #读取版本清单，返回 (清单, 摘要算法)，root 为这个版本的文件所在的目录（文件可以不存在）【静态函数】
+    #不同系统的路径分隔符排序位置不同，读取后按本机的相对路径重新排序
+    @staticmethod
+    def load(manifest_path, root="", path_table=None):
+        with open(manifest_path, 'r', -1, "utf-8") as f:
+            data = json.load(f)
+        if data.get("version") not in ManifestTable.SUPPORTED_VERSIONS:
+            raise ValueError("unsupported version manifest: " + manifest_path)
+        algorithm = data["algorithm"]
+        table = ManifestTable(root, HashEngine.new_hasher(algorithm).digest_size, path_table)
+        files = [(row[0].replace("/", os.sep), row[1], row[2], row[3] if len(row) > 3 else None) for row in data["files"]]
+        files.sort(key=lambda row: row[0])
+        for relativePath, size, digest, link in files:
+            table.append(relativePath, size, 0, 0, digest=bytes.fromhex(digest), link=link)
+        return table, algorithm
+
+    #比较区间内的路径是否相同：目录编号相同且文件名区间的字节相同，文件名以 \0 分隔，拼接后相同即逐行相同
+    def _paths_equal(self, row, other, other_row, count):
+        return (self.dir_ids[row:row + count] == other.dir_ids[other_row:other_row + count] and
+                self.names[self.name_offsets[row]:self.name_offsets[row + count]] ==
+                other.names[other.name_offsets[other_row]:other.name_offsets[other_row + count]])
+
+    #比较两个清单，两个清单必须共用同一个 PathTable【静态函数】
+    #两个清单都按路径排序，用归并连接对齐；路径相同的连续区间整段比较各列，
+    #相同则一次跳过，不同则二分缩小到不同的行，大部分文件未变化时几乎不需要逐行的 Python 循环
+    #返回 {"added": 新清单行号, "removed": 旧清单行号, "modified": [(旧行号, 新行号)],
+    #      "pending": 大小相同但缺少摘要的 [(旧行号, 新行号)], "unchanged": 未变化的文件数, "size_changed": 大小不同的文件数}
+    @staticmethod
+    def diff(old, new):
+        if old.path_table is not new.path_table:
+            raise ValueError("manifest tables must share the same PathTable")
+        result = {"added": [], "removed": [], "modified": [], "pending": [], "unchanged": 0, "size_changed": 0}
+        old_count = len(old)
+        new_count = len(new)
+        old_row = 0
+        new_row = 0
+        block = ManifestTable.MAX_BLOCK
+        while old_row < old_count and new_row < new_count:
+            count = min(block, old_count - old_row, new_count - new_row)
+            if old._paths_equal(old_row, new, new_row, count):
+                ManifestTable._diff_aligned(old, new, old_row, new_row, count, result)
+                old_row += count
+                new_row += count
+                block = min(block * 2, ManifestTable.MAX_BLOCK)
+            elif count > 1:
+                #区间内有新增或删除的文件，缩小区间
+                block = count // 2
+            elif old.path(old_row) < new.path(new_row):
+                result["removed"].append(old_row)
+                old_row += 1
+            else:
+                result["added"].append(new_row)
+                new_row += 1
+        result["removed"].extend(range(old_row, old_count))
+        result["added"].extend(range(new_row, new_count))
+        return result
+
+    #比较路径已经对齐的区间
+    @staticmethod
+    def _diff_aligned(old, new, old_row, new_row, count, result):
+        size = old.digest_size
+        if (old.sizes[old_row:old_row + count] == new.sizes[new_row:new_row + count] and
+                old.digests[old_row * size:(old_row + count) * size] == new.digests[new_row * size:(new_row + count) * size] and
+                old.hashed.find(0, old_row, old_row + count) < 0 and new.hashed.find(0, new_row, new_row + count) < 0):
+            result["unchanged"] += count
+            return
+        if count > ManifestTable.SCALAR_ROWS:
+            half = count // 2
+            ManifestTable._diff_aligned(old, new, old_row, new_row, half, result)
+            ManifestTable._diff_aligned(old, new, old_row + half, new_row + half, count - half, result)
+            return
+        for offset in range(count):
+            ManifestTable._diff_row(old, new, old_row + offset, new_row + offset, result)
+
+    @staticmethod
+    def _diff_row(old, new, old_row, new_row, result):
+        if old.sizes[old_row] != new.sizes[new_row]:
+            #大小不同，文件一定被修改过
+            result["modified"].append((old_row, new_row))
+            result["size_changed"] += 1
+        elif not old.hashed[old_row] or not new.hashed[new_row]:
+            result["pending"].append((old_row, new_row))
+        elif old.digest(old_row) != new.digest(new_row):
+            result["modified"].append((old_row, new_row))
+        else:
+            result["unchanged"] += 1
+
+    #补充摘要后比较 pending 中的文件对【静态函数】
+    @staticmethod
+    def resolve(old, new, result):
+        pending = result["pending"]
+        result["pending"] = []
+        for old_row, new_row in pending:
+            ManifestTable._diff_row(old, new, old_row, new_row, result)
+        return result
+
+    #用上一个版本的清单代替上一个版本的文件，与 folderCompare.new_path 比较，结果写入 folderCompare【静态函数】
+    #只计算新版本文件的摘要，旧文件节点的摘要来自清单；旧文件节点的绝对路径指向 old_table.root，
+    #只有差分编码等需要旧文件内容的步骤才要求这些文件存在
+    #新版本的所有行都会补充摘要，返回的新清单可以直接保存为这个版本的版本清单
+    @staticmethod
+    def compare_manifest(folderCompare, old_table):
+        new_table = ManifestTable.from_walk(folderCompare.new_path, old_table.digest_size, old_table.path_table,
+                                            folderCompare.ignore_rules)
+        result = ManifestTable.diff(old_table, new_table)
+        new_table.fill_digests(range(len(new_table)), folderCompare.hash_engine, folderCompare.hash_index)
+        ManifestTable.resolve(old_table, new_table, result)
+        folderCompare.diff_dict = {}
+        folderCompare.deleted_dict = {}
+        for new_row in result["added"]:
+            node = new_table.to_node(new_row)
+            node.status = 'added'
+            folderCompare.diff_dict[node.relativePath] = node
+        for old_row, new_row in result["modified"]:
+            node = new_table.to_node(new_row)
+            node.status = 'modified'
+            node.previous = old_table.to_node(old_row)
+            folderCompare.diff_dict[node.relativePath] = node
+        for old_row in result["removed"]:
+            node = old_table.to_node(old_row)
+            node.status = 'deleted'
+            folderCompare.deleted_dict[node.relativePath] = node
+        folderCompare.stage_stats = ManifestTable.stats(result)
+        if folderCompare.detect_moves:
+            #清单中的摘要都是现成的，已删除和未变化的旧文件都可以作为来源，只为大小与新增文件相同的行创建节点
+            added_sizes = set(new_table.sizes[new_row] for new_row in result["added"])
+            excluded_rows = set(result["removed"])
+            excluded_rows.update(old_row for old_row, new_row in result["modified"])
+            unchanged_nodes = [old_table.to_node(old_row) for old_row in range(len(old_table))
+                               if old_table.sizes[old_row] in added_sizes and old_row not in excluded_rows]
+            folderCompare.detectMoves(list(folderCompare.deleted_dict.values()) + unchanged_nodes)
+        print('compare stage stats: ', folderCompare.stage_stats)
+        if folderCompare.hash_index is not None:
+            folderCompare.hash_index.print()
+        return new_table
+
+    #转换为与 FolderCompare.getDiff 相同格式的阶段统计【静态函数】
+    @staticmethod
+    def stats(result):
+        md5_changed = len(result["modified"]) - result["size_changed"]
+        return {
+            "added": len(result["added"]),
+            "removed": len(result["removed"]),
+            "size_changed": result["size_changed"],
+            "hashed": md5_changed + result["unchanged"] + len(result["pending"]),
+            "md5_changed": md5_changed,
+            "unchanged": result["unchanged"]
+        }
+
+
+#生成 count 个有序的模拟文件记录，返回 (相对路径, 大小, 修改时间, inode, 摘要) 列表
+def _sample_records(count, digest_size):
+    records = []
+    for i in range(count):
+        relativePath = os.path.join("dir%04d" % (i // 10000), "sub%03d" % (i // 100 % 100), "file%08d.bin" % i)
+        records.append((relativePath, 4096 + i % 65536, 1700000000000000000 + i, i + 1, i.to_bytes(digest_size, "little")))
+    return records
+
+#对比 FileNode 字典和 ManifestTable 在 count 个文件上的内存占用和比较耗时
+def benchmark(count, changes=1000, digest_size=16):
+    root = os.sep + "mnt"
+    old_records = _sample_records(count, digest_size)
+    #新版本：修改 changes 个文件的内容和大小，删除和新增各 changes 个文件
+    new_records = list(old_records)
+    step = max(count // changes, 1)
+    for i in range(0, count, step):
+        relativePath, size, mtime, inode, digest = new_records[i]
+        new_records[i] = (relativePath, size + (i // step) % 2, mtime + 1, inode, os.urandom(digest_size))
+    for i in range(step // 2, count, step):
+        new_records[i] = None
+    new_records = [record for record in new_records if record is not None]
+    new_records.extend((os.path.join("zz_added", "file%08d.bin" % i), 1, 1, count + i + 1, os.urandom(digest_size))
+                       for i in range(changes))
+
+    result = {"entries": count}
+    tracemalloc.start()
+    begin = tracemalloc.get_traced_memory()[0]
+    old_dict = {}
+    new_dict = {}
+    for records, file_dict in ((old_records, old_dict), (new_records, new_dict)):
+        for relativePath, size, mtime, inode, digest in records:
+            #每次遍历得到的都是新的字符串对象
+            relativePath = relativePath.encode().decode()
+            file_dict[relativePath] = FileNode(os.path.join(root, relativePath), relativePath, digest.hex(), size, mtime, inode)
+    result["filenode_bytes"] = tracemalloc.get_traced_memory()[0] - begin
+    tracemalloc.stop()
+    begin_time = time.perf_counter()
+    FolderCompare.getDiff(old_dict, new_dict)
+    result["getdiff_seconds"] = round(time.perf_counter() - begin_time, 3)
+    del old_dict, new_dict
+
+    tracemalloc.start()
+    begin = tracemalloc.get_traced_memory()[0]
+    tables = []
+    path_table = PathTable()
+    for records in (old_records, new_records):
+        table = ManifestTable(root, digest_size, path_table)
+        for relativePath, size, mtime, inode, digest in records:
+            table.append(relativePath.encode().decode(), size, mtime, inode, digest=digest)
+        tables.append(table)
+    result["table_bytes"] = tracemalloc.get_traced_memory()[0] - begin
+    tracemalloc.stop()
+    begin_time = time.perf_counter()
+    stats = ManifestTable.stats(ManifestTable.diff(tables[0], tables[1]))
+    result["table_diff_seconds"] = round(time.perf_counter() - begin_time, 3)
+    result["memory_ratio"] = round(result["filenode_bytes"] / max(result["table_bytes"], 1), 2)
+    result["speedup"] = round(result["getdiff_seconds"] / max(result["table_diff_seconds"], 1e-6), 2)
+    result["stats"] = stats
+    return result
+
+
+#main函数
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='columnar file manifest')
+    parser.add_argument('oldPath', nargs='?', default='')
+    parser.add_argument('newPath', nargs='?', default='')
+    parser.add_argument('--bench', type=int, default=0, help='compare memory and diff time against FileNode dicts with this many synthetic entries')
+    args = parser.parse_args()
+
+    if args.bench > 0:
+        print(benchmark(args.bench))
+        sys.exit(0)
+    if args.oldPath == '' or args.newPath == '':
+        parser.print_usage()
+        sys.exit(1)
+
+    #比较两个文件夹，只为大小相同的文件计算摘要，打印各阶段统计
+    old_table = ManifestTable.from_walk(args.oldPath)
+    new_table = ManifestTable.from_walk(args.newPath, path_table=old_table.path_table)
+    diff_result = ManifestTable.diff(old_table, new_table)
+    engine = HashEngine()
+    old_table.fill_digests([old_row for old_row, new_row in diff_result["pending"]], engine)
+    new_table.fill_digests([new_row for old_row, new_row in diff_result["pending"]], engine)
+    ManifestTable.resolve(old_table, new_table, diff_result)
+    print(ManifestTable.stats(diff_result))
+    for old_row, new_row in diff_result["modified"]:
+        print('modified: ', new_table.path(new_row))
@@ -0,0 +1,219 @@
+import os
+import sys
+import stat
+import time
+import zlib
+import struct
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+#定义一个并行 zip 解压器，不依赖外部的 ditto / unzip.exe
+#每个压缩包只读取一次中央目录，多个压缩包的条目放进同一个线程池并行解压，zlib 解压时会释放 GIL
+#每个条目按固定大小的缓冲区流式读取和解压，内存占用只与线程数和缓冲区大小有关，与条目大小无关
+class ParallelUnzip:
+    DEFAULT_BUFFER_SIZE = 1024 * 1024
+    LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+    #ditto --sequesterRsrc 生成的资源分支，ditto 解压时还原为扩展属性，这里不解压
+    RESOURCE_DIR = "__MACOSX/"
+
+    def __init__(self, workers=0, buffer_size=DEFAULT_BUFFER_SIZE):
+        if workers <= 0:
+            workers = os.cpu_count() or 1
+        self.workers = workers
+        self.buffer_size = buffer_size
+        #最近一次解压的统计
+        self.stats = {}
+
+    #解压一个或多个压缩包，jobs 为 (压缩包路径, 目标文件夹, 只解压的条目名列表或 None) 序列
+    #返回解压的条目数
+    def extract(self, jobs):
+        begin = time.perf_counter()
+        tasks = []
+        dirs = set()
+        for job in jobs:
+            zip_path, dst_path = job[0], job[1]
+            names = None if len(job) < 3 or job[2] is None else set(job[2])
+            with zipfile.ZipFile(zip_path) as archive:
+                infos = archive.infolist()
+            if names is not None:
+                infos = [info for info in infos if info.filename in names]
+                missing = names.difference(info.filename for info in infos)
+                if len(missing) > 0:
+                    raise KeyError("There is no item named %r in the archive %s" % (sorted(missing)[0], zip_path))
+            root = os.path.realpath(dst_path)
+            dirs.add(root)
+            for info in infos:
+                if info.filename.startswith(ParallelUnzip.RESOURCE_DIR):
+                    continue
+                target = ParallelUnzip._target(root, info.filename)
+                if info.is_dir():
+                    dirs.add(target)
+                    continue
+                dirs.add(os.path.dirname(target))
+                tasks.append((zip_path, info, target, root))
+        #文件夹统一在主线程创建，每个文件夹只创建一次
+        for dir_path in sorted(dirs):
+            os.makedirs(dir_path, exist_ok=True)
+        #先解压大的条目，避免最后只剩一个大文件在单线程解压
+        tasks.sort(key=lambda task: task[1].compress_size, reverse=True)
+        input_bytes = 0
+        output_bytes = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for size in executor.map(self._extract_entry, tasks):
+                output_bytes += size
+        for zip_path, info, target, root in tasks:
+            input_bytes += info.compress_size
+        self.stats = {"entries": len(tasks), "dirs": len(dirs), "input_bytes": input_bytes, "output_bytes": output_bytes,
+                      "seconds": round(time.perf_counter() - begin, 4)}
+        return len(tasks)
+
+    #不解压到磁盘，直接计算条目内容的摘要，new_hasher 为创建哈希对象的函数，返回 {条目名: 十六进制摘要}
+    def hash_entries(self, zip_path, names, new_hasher):
+        with zipfile.ZipFile(zip_path) as archive:
+            infos = [archive.getinfo(name) for name in names]
+        #先计算大的条目，与解压的调度方式相同
+        infos.sort(key=lambda info: info.compress_size, reverse=True)
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            digests = list(executor.map(lambda info: self._hash_entry(zip_path, info, new_hasher), infos))
+        return {info.filename: digest for info, digest in zip(infos, digests)}
+
+    def _hash_entry(self, zip_path, info, new_hasher):
+        hasher = new_hasher()
+        with open(zip_path, "rb") as archive:
+            if info.compress_type in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+                archive.seek(ParallelUnzip._data_offset(archive, info))
+                chunks = self._inflate(archive, info)
+            else:
+                chunks = ParallelUnzip._zipfile_chunks(zip_path, info, self.buffer_size)
+            for data in chunks:
+                hasher.update(data)
+        return hasher.hexdigest()
+
+    #条目在目标文件夹下的路径，拒绝绝对路径和跳出目标文件夹的路径【静态函数】
+    @staticmethod
+    def _target(root, name):
+        parts = [part for part in name.replace("\\", "/").split("/") if part not in ("", ".")]
+        if ".." in parts or (len(parts) > 0 and os.path.splitdrive(parts[0])[0] != ""):
+            raise zipfile.BadZipFile("unsafe entry name: " + name)
+        return os.path.join(root, *parts)
+
+    #符号链接的目标必须在目标文件夹内，否则之后的写入、比较和计算摘要会沿着链接访问目标文件夹之外的文件【静态函数】
+    #与条目名的检查相同，只按路径本身判断，不访问文件系统
+    @staticmethod
+    def _check_link(root, target, link):
+        if os.path.isabs(link) or os.path.splitdrive(link)[0] != "":
+            raise zipfile.BadZipFile("unsafe symlink target: %s -> %s" % (target, link))
+        resolved = os.path.normpath(os.path.join(os.path.dirname(target), link))
+        if resolved != root and not resolved.startswith(os.path.join(root, "")):
+            raise zipfile.BadZipFile("unsafe symlink target: %s -> %s" % (target, link))
+
+    #解压一个条目，返回解压后的大小
+    def _extract_entry(self, task):
+        zip_path, info, target, root = task
+        mode = info.external_attr >> 16
+        with open(zip_path, "rb") as archive:
+            if info.compress_type in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+                archive.seek(ParallelUnzip._data_offset(archive, info))
+                chunks = self._inflate(archive, info)
+            else:
+                #其他压缩方式交给 zipfile
+                chunks = ParallelUnzip._zipfile_chunks(zip_path, info, self.buffer_size)
+            if stat.S_ISLNK(mode):
+                #符号链接的内容是链接目标，macOS 的 framework 中很常见
+                link = b"".join(chunks).decode("utf-8")
+                ParallelUnzip._check_link(root, target, link)
+                if os.path.lexists(target):
+                    os.remove(target)
+                os.symlink(link, target)
+                return info.file_size
+            size = ParallelUnzip._write(target, chunks, info)
+        if mode & 0o7777:
+            os.chmod(target, mode & 0o7777)
+        #保留压缩包中的修改时间，哈希索引可以跨构建命中
+        mtime = time.mktime(info.date_time + (0, 0, -1))
+        os.utime(target, (mtime, mtime))
+        return size
+
+    #根据本地文件头计算数据的偏移【静态函数】
+    @staticmethod
+    def _data_offset(archive, info):
+        archive.seek(info.header_offset)
+        header = archive.read(ParallelUnzip.LOCAL_HEADER.size)
+        fields = ParallelUnzip.LOCAL_HEADER.unpack(header)
+        if fields[0] != b"PK\x03\x04":
+            raise zipfile.BadZipFile("bad local file header: " + info.filename)
+        return info.header_offset + ParallelUnzip.LOCAL_HEADER.size + fields[9] + fields[10]
+
+    #按缓冲区大小流式读取和解压，每次产出不超过 buffer_size 的数据，最后校验大小和 crc
+    def _inflate(self, archive, info):
+        remaining = info.compress_size
+        decompressor = zlib.decompressobj(-zlib.MAX_WBITS) if info.compress_type == zipfile.ZIP_DEFLATED else None
+        crc = 0
+        size = 0
+        while remaining > 0 or (decompressor is not None and decompressor.unconsumed_tail):
+            if decompressor is not None and decompressor.unconsumed_tail:
+                data = decompressor.decompress(decompressor.unconsumed_tail, self.buffer_size)
+            else:
+                data = archive.read(min(remaining, self.buffer_size))
+                if len(data) == 0:
+                    raise zipfile.BadZipFile("truncated entry: " + info.filename)
+                remaining -= len(data)
+                if decompressor is not None:
+                    data = decompressor.decompress(data, self.buffer_size)
+            if len(data) > 0:
+                crc = zlib.crc32(data, crc)
+                size += len(data)
+                yield data
+        if decompressor is not None:
+            data = decompressor.flush()
+            if len(data) > 0:
+                crc = zlib.crc32(data, crc)
+                size += len(data)
+                yield data
+        if size != info.file_size or crc != info.CRC:
+            raise zipfile.BadZipFile("bad CRC or size of entry: " + info.filename)
+
+    #使用 zipfile 解压其他压缩方式的条目【静态函数】
+    @staticmethod
+    def _zipfile_chunks(zip_path, info, buffer_size):
+        with zipfile.ZipFile(zip_path) as archive, archive.open(info) as source:
+            while True:
+                data = source.read(buffer_size)
+                if len(data) == 0:
+                    break
+                yield data
+
+    #写入文件，预先分配空间减少文件系统的碎片和元数据更新，返回写入的大小【静态函数】
+    @staticmethod
+    def _write(target, chunks, info):
+        #已有的符号链接不能直接覆盖写入，否则会写到链接目标
+        if os.path.islink(target):
+            os.remove(target)
+        size = 0
+        with open(target, "wb") as file:
+            if info.file_size > 0 and hasattr(os, "posix_fallocate"):
+                try:
+                    os.posix_fallocate(file.fileno(), 0, info.file_size)
+                except OSError:
+                    pass
+            for data in chunks:
+                file.write(data)
+                size += len(data)
+        return size
+
+    #打印最近一次解压的统计
+    def print(self):
+        seconds = max(self.stats.get("seconds", 0), 1e-9)
+        print("parallel unzip: ", self.stats, "throughput: %.1f MB/s" % (self.stats.get("output_bytes", 0) / seconds / 1024 / 1024))
+
+
+#main函数
+if __name__ == '__main__':
+    args = sys.argv
+    if len(args) < 3 or len(args) % 2 != 1:
+        print('Usage: python ParallelUnzip.py zipPath dstPath [zipPath dstPath ...]')
+        sys.exit(1)
+
+    unzip = ParallelUnzip()
+    unzip.extract([(args[i], args[i + 1]) for i in range(1, len(args), 2)])
+    unzip.print()
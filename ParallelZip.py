@@ -0,0 +1,434 @@
+import os
+import sys
+import stat
+import time
+import zlib
+import struct
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+#另一个 zip 中的条目，原样拷贝压缩后的数据，压缩方式、crc 和大小都与原条目相同
+class RawEntry:
+    LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+
+    def __init__(self, zip_path, info):
+        self.zip_path = zip_path
+        self.info = info
+        #压缩数据在源压缩包中的偏移，第一次使用时读取本地文件头得到
+        self.data_offset = None
+
+    #只支持存储和 deflate，并且没有加密的条目【静态函数】
+    @staticmethod
+    def supported(info):
+        return info.compress_type in (zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED) and not info.flag_bits & 0x1
+
+    def resolve(self):
+        if self.data_offset is None:
+            with open(self.zip_path, "rb") as archive:
+                archive.seek(self.info.header_offset)
+                fields = RawEntry.LOCAL_HEADER.unpack(archive.read(RawEntry.LOCAL_HEADER.size))
+            if fields[0] != b"PK\x03\x04":
+                raise zipfile.BadZipFile("bad local file header: " + self.info.filename)
+            self.data_offset = self.info.header_offset + RawEntry.LOCAL_HEADER.size + fields[9] + fields[10]
+        return self.data_offset
+
+
+#按块压缩：每块以前一块末尾 32KB 作为预置字典，非最后一块以 Z_SYNC_FLUSH 结束（字节对齐、不设置结束标记）
+#各块的输出直接拼接就是一个完整的 deflate 流，与 pigz 相同；大文件也能拆分到多个线程并行压缩
+#method 为 ZIP_STORED 时原样返回；single 为 True 表示条目只有这一块，压缩后没有变小时改为存储
+#method 为 METHOD_RAW 时从源压缩包原样读取压缩数据，crc 为 None
+#返回 (crc, 原始长度, 数据, 压缩方式, 压缩耗时)
+def _deflate_block(args):
+    source, offset, length, last, level, method, single = args
+    if method == ParallelZip.METHOD_RAW:
+        with open(source.zip_path, "rb") as archive:
+            archive.seek(source.data_offset + offset)
+            data = archive.read(length)
+        if len(data) != length:
+            raise zipfile.BadZipFile("truncated entry: " + source.info.filename)
+        return None, length, data, method, 0.0
+    dict_begin = max(0, offset - ParallelZip.DICT_SIZE)
+    if isinstance(source, bytes):
+        data = source[dict_begin:offset + length]
+    else:
+        with open(source, "rb") as file:
+            file.seek(dict_begin)
+            data = file.read(offset + length - dict_begin)
+    if len(data) != offset + length - dict_begin:
+        raise IOError("file changed while compressing: " + str(source))
+    block = memoryview(data)[offset - dict_begin:]
+    if method == zipfile.ZIP_STORED:
+        return zlib.crc32(block), len(block), bytes(block), method, 0.0
+    begin = time.perf_counter()
+    if offset > dict_begin:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, zdict=data[:offset - dict_begin])
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+    compressed = compressor.compress(block) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+    seconds = time.perf_counter() - begin
+    if single and len(compressed) >= len(block):
+        return zlib.crc32(block), len(block), bytes(block), zipfile.ZIP_STORED, seconds
+    return zlib.crc32(block), len(block), compressed, method, seconds
+
+
+#定义一个并行 zip 写入器，不依赖外部的 ditto / zip.exe
+#条目按块并行压缩，按顺序写入压缩包；本地文件头、中央目录和 Zip64 记录都按标准格式生成，可以用任意 unzip 解压
+#未写出的原始数据不超过 window_bytes，内存占用与压缩包大小无关
+#每个条目按扩展名和开头数据的试压缩结果选择存储或压缩，已经压缩过的图片、视频、压缩包不再浪费 CPU
+class ParallelZip:
+    DEFAULT_BLOCK_SIZE = 1024 * 1024
+    DEFAULT_WINDOW_BYTES = 64 * 1024 * 1024
+    DICT_SIZE = 32 * 1024
+    ZIP64_LIMIT = (1 << 31) - 1
+    MAX_UINT32 = 0xFFFFFFFF
+    MAX_UINT16 = 0xFFFF
+    VERSION_DEFAULT = 20
+    VERSION_ZIP64 = 45
+    FLAG_UTF8 = 0x800
+    #与 zipfile 相同：Windows 上记录为 MS-DOS 创建，其余为 Unix
+    CREATE_SYSTEM = 0 if sys.platform == "win32" else 3
+    LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")
+    CENTRAL_HEADER = struct.Struct("<4sBBHHHHHIIIHHHHHII")
+    END_RECORD = struct.Struct("<4sHHHHIIH")
+    END_RECORD64 = struct.Struct("<4sQHHIIQQQQ")
+    END_LOCATOR64 = struct.Struct("<4sIQI")
+    #计算 crc32_combine 使用的零字节缓冲区，按需扩大
+    _zeros = b""
+    #已经压缩过的格式直接存储，不再尝试压缩
+    STORE_EXTENSIONS = frozenset([
+        ".png", ".jpg", ".jpeg", ".gif", ".webp", ".heic", ".avif",
+        ".mp4", ".mov", ".m4v", ".mkv", ".webm", ".avi", ".mp3", ".m4a", ".aac", ".ogg", ".opus", ".flac",
+        ".zip", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".rar", ".zst", ".lz4", ".br",
+        ".dmg", ".jar", ".apk", ".ipa", ".woff", ".woff2"
+    ])
+    #压缩效果稳定的格式直接压缩，不做采样
+    DEFLATE_EXTENSIONS = frozenset([
+        ".txt", ".json", ".xml", ".plist", ".strings", ".html", ".htm", ".js", ".css", ".svg", ".py", ".qml",
+        ".ini", ".cfg", ".log", ".csv", ".dylib", ".so", ".dll", ".exe", ".a", ".lib", ".pdb", ".nib"
+    ])
+    #未知格式的大文件采样开头的数据，用最快的压缩级别试压缩，压缩率高于这个比例时存储
+    SAMPLE_SIZE = 64 * 1024
+    STORE_RATIO = 0.95
+    #压缩方式的判定依据：扩展名、采样、整块试压缩（只有一块的条目直接看压缩结果）、内存数据
+    REASON_EXTENSION = "extension"
+    REASON_SAMPLE = "sample"
+    REASON_BLOCK = "block"
+    REASON_DATA = "data"
+    REASON_RAW = "raw"
+    #原样拷贝其他压缩包中压缩数据的任务
+    METHOD_RAW = -1
+
+    def __init__(self, workers=0, compresslevel=6, block_size=DEFAULT_BLOCK_SIZE, window_bytes=DEFAULT_WINDOW_BYTES,
+                 auto_store=True):
+        if workers <= 0:
+            workers = os.cpu_count() or 1
+        self.workers = workers
+        self.compresslevel = compresslevel
+        self.block_size = block_size
+        self.window_bytes = window_bytes
+        #是否按条目自动选择存储或压缩，False 时全部压缩
+        self.auto_store = auto_store
+        #最近一次写入的统计
+        self.stats = ParallelZip._new_stats()
+
+    @staticmethod
+    def _new_stats():
+        return {"entries": 0, "input_bytes": 0, "output_bytes": 0, "seconds": 0.0,
+                "stored": 0, "stored_bytes": 0, "deflated": 0, "deflated_bytes": 0, "raw": 0, "raw_bytes": 0, "decisions": {},
+                #试压缩过的数据量和耗时，以及没有尝试压缩、直接存储的数据量
+                "attempted_bytes": 0, "deflate_seconds": 0.0, "skipped_bytes": 0, "saved_cpu_seconds": 0.0}
+
+    #选择条目的压缩方式，返回 (压缩方式, 判定依据)
+    def _choose(self, source, arcname, size):
+        if not self.auto_store or isinstance(source, bytes):
+            return zipfile.ZIP_DEFLATED, ParallelZip.REASON_DATA
+        extension = os.path.splitext(arcname)[1].lower()
+        if extension in ParallelZip.STORE_EXTENSIONS:
+            return zipfile.ZIP_STORED, ParallelZip.REASON_EXTENSION
+        if extension in ParallelZip.DEFLATE_EXTENSIONS:
+            return zipfile.ZIP_DEFLATED, ParallelZip.REASON_EXTENSION
+        if size <= self.block_size:
+            #只有一块时压缩任务本身就是试压缩
+            return zipfile.ZIP_DEFLATED, ParallelZip.REASON_BLOCK
+        with open(source, "rb") as file:
+            sample = file.read(ParallelZip.SAMPLE_SIZE)
+        if len(zlib.compress(sample, 1)) > len(sample) * ParallelZip.STORE_RATIO:
+            return zipfile.ZIP_STORED, ParallelZip.REASON_SAMPLE
+        return zipfile.ZIP_DEFLATED, ParallelZip.REASON_SAMPLE
+
+    #合并两段数据的 crc32，结果等于 zlib.crc32(data1 + data2)，length2 为第二段的长度【静态函数】
+    #crc32(data2, crc1) 对 crc1 是仿射的，差值等于 length2 个零字节分别以 crc1 和 0 为初值的 crc 之差
+    @staticmethod
+    def crc32_combine(crc1, crc2, length2):
+        if crc1 == 0 or length2 == 0:
+            return crc2 if length2 > 0 else crc1
+        zeros = ParallelZip._zeros
+        if len(zeros) < length2:
+            zeros = ParallelZip._zeros = bytes(length2)
+        zeros = memoryview(zeros)[:length2]
+        return zlib.crc32(zeros, crc1) ^ zlib.crc32(zeros) ^ crc2
+
+    #把 time.localtime 的结果转换为 MS-DOS 的日期和时间，超出范围的按边界写入【静态函数】
+    @staticmethod
+    def dos_time(timestamp):
+        return ParallelZip.dos_date_time(time.localtime(timestamp)[:6])
+
+    #把 (年, 月, 日, 时, 分, 秒) 转换为 MS-DOS 的日期和时间【静态函数】
+    @staticmethod
+    def dos_date_time(date_time):
+        if date_time[0] < 1980:
+            date_time = (1980, 1, 1, 0, 0, 0)
+        elif date_time[0] > 2107:
+            date_time = (2107, 12, 31, 23, 59, 59)
+        year, month, day, hour, minute, second = date_time
+        return (year - 1980) << 9 | month << 5 | day, hour << 11 | minute << 5 | second // 2
+
+    #生成条目信息，源为 bytes 时直接写入内容，为文件夹时写入文件夹条目，为 RawEntry 时原样拷贝【静态函数】
+    @staticmethod
+    def _entry(source, arcname):
+        arcname = arcname.replace(os.sep, "/").lstrip("/")
+        if isinstance(source, RawEntry):
+            return ParallelZip._raw_entry(source, arcname)
+        if isinstance(source, bytes):
+            is_dir = False
+            size = len(source)
+            mode = stat.S_IFREG | 0o644
+            mtime = time.time()
+        else:
+            #符号链接按链接本身写入，内容为链接目标，与 ditto 和 zip -y 相同
+            st = os.lstat(source)
+            is_dir = stat.S_ISDIR(st.st_mode)
+            size = 0 if is_dir else st.st_size
+            mode = st.st_mode
+            mtime = st.st_mtime
+        if is_dir and not arcname.endswith("/"):
+            arcname += "/"
+        external_attr = (mode & 0xFFFF) << 16
+        if is_dir:
+            external_attr |= 0x10
+        entry = ParallelZip._name(arcname)
+        entry.update({
+            "is_dir": is_dir, "size": size,
+            "external_attr": external_attr, "dos_time": ParallelZip.dos_time(mtime),
+            "method": zipfile.ZIP_STORED if is_dir else zipfile.ZIP_DEFLATED,
+            #预估的大小超过 Zip64 限制时本地文件头直接使用 Zip64 格式，与 zipfile 的判断相同
+            "zip64": size * 1.05 > ParallelZip.ZIP64_LIMIT,
+            "crc": 0, "compress_size": 0, "header_offset": 0, "reason": ParallelZip.REASON_DATA
+        })
+        return entry
+
+    #原样拷贝的条目，crc、大小和压缩方式来自源条目，只保留 deflate 的压缩级别标记【静态函数】
+    @staticmethod
+    def _raw_entry(source, arcname):
+        info = source.info
+        entry = ParallelZip._name(arcname)
+        entry.update({
+            "is_dir": False, "size": info.file_size, "external_attr": info.external_attr,
+            "dos_time": ParallelZip.dos_date_time(info.date_time), "method": info.compress_type,
+            "zip64": max(info.file_size, info.compress_size) * 1.05 > ParallelZip.ZIP64_LIMIT,
+            "crc": info.CRC, "compress_size": 0, "header_offset": 0, "reason": ParallelZip.REASON_RAW,
+            "raw_size": info.compress_size
+        })
+        entry["flags"] |= info.flag_bits & 0x6
+        #Windows 生成的压缩包没有 unix 权限，按普通文件写入
+        if info.external_attr >> 16 == 0:
+            entry["external_attr"] |= (stat.S_IFREG | 0o644) << 16
+        return entry
+
+    #编码条目名，非 ASCII 的名称使用 UTF-8 并设置标记【静态函数】
+    @staticmethod
+    def _name(arcname):
+        try:
+            return {"name": arcname.encode("ascii"), "flags": 0}
+        except UnicodeEncodeError:
+            return {"name": arcname.encode("utf-8"), "flags": ParallelZip.FLAG_UTF8}
+
+    #生成条目的压缩任务，空文件也有一个任务（压缩后没有变小，按存储写入）
+    def _tasks(self, entries):
+        for source, arcname in entries:
+            entry = ParallelZip._entry(source, arcname)
+            if entry["is_dir"]:
+                yield entry, None
+                continue
+            if isinstance(source, str) and stat.S_ISLNK(entry["external_attr"] >> 16):
+                source = os.fsencode(os.readlink(source))
+            if entry["reason"] == ParallelZip.REASON_RAW:
+                #压缩数据按块读取，没有压缩的开销
+                source.resolve()
+                offset = 0
+                while True:
+                    length = min(self.block_size, entry["raw_size"] - offset)
+                    last = offset + length >= entry["raw_size"]
+                    yield entry, (source, offset, length, last, self.compresslevel, ParallelZip.METHOD_RAW, False)
+                    offset += length
+                    if last:
+                        break
+                continue
+            entry["method"], entry["reason"] = self._choose(source, arcname, entry["size"])
+            single = entry["size"] <= self.block_size
+            offset = 0
+            while True:
+                length = min(self.block_size, entry["size"] - offset)
+                last = offset + length >= entry["size"]
+                yield entry, (source, offset, length, last, self.compresslevel, entry["method"], single)
+                offset += length
+                if last:
+                    break
+
+    #本地文件头，Zip64 格式的大小写在扩展字段中
+    @staticmethod
+    def _local_header(entry):
+        version = ParallelZip.VERSION_DEFAULT
+        extra = b""
+        compress_size, size = entry["compress_size"], entry["size"]
+        if entry["zip64"]:
+            version = ParallelZip.VERSION_ZIP64
+            extra = struct.pack("<HHQQ", 1, 16, size, compress_size)
+            compress_size = size = ParallelZip.MAX_UINT32
+        dos_date, dos_time = entry["dos_time"]
+        header = ParallelZip.LOCAL_HEADER.pack(b"PK\x03\x04", version, entry["flags"], entry["method"], dos_time, dos_date,
+                                               entry["crc"], compress_size, size, len(entry["name"]), len(extra))
+        return header + entry["name"] + extra
+
+    #中央目录条目，超出 32 位的字段放到 Zip64 扩展字段中
+    @staticmethod
+    def _central_header(entry):
+        fields = []
+        size, compress_size, header_offset = entry["size"], entry["compress_size"], entry["header_offset"]
+        if size > ParallelZip.ZIP64_LIMIT:
+            fields.append(size)
+            size = ParallelZip.MAX_UINT32
+        if compress_size > ParallelZip.ZIP64_LIMIT:
+            fields.append(compress_size)
+            compress_size = ParallelZip.MAX_UINT32
+        if header_offset > ParallelZip.ZIP64_LIMIT:
+            fields.append(header_offset)
+            header_offset = ParallelZip.MAX_UINT32
+        extra = b""
+        version = ParallelZip.VERSION_DEFAULT
+        if len(fields) > 0 or entry["zip64"]:
+            version = ParallelZip.VERSION_ZIP64
+        if len(fields) > 0:
+            extra = struct.pack("<HH" + "Q" * len(fields), 1, 8 * len(fields), *fields)
+        dos_date, dos_time = entry["dos_time"]
+        header = ParallelZip.CENTRAL_HEADER.pack(b"PK\x01\x02", version, ParallelZip.CREATE_SYSTEM, version, entry["flags"],
+                                                 entry["method"], dos_time, dos_date, entry["crc"], compress_size, size,
+                                                 len(entry["name"]), len(extra), 0, 0, 0, entry["external_attr"], header_offset)
+        return header + entry["name"] + extra
+
+    #写入压缩包，entries 为 (源, 压缩包内路径) 序列，可以是生成器
+    #返回本次写入的统计，其中 entries 为写入的条目数，input_bytes / output_bytes 为读取的数据量和压缩包大小
+    def write(self, entries, dst_zip_path):
+        begin = time.perf_counter()
+        self.stats = ParallelZip._new_stats()
+        written = []
+        input_bytes = 0
+        window = deque()
+        in_flight = 0
+        with open(dst_zip_path, "wb") as archive, ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for entry, task in self._tasks(entries):
+                length = 0 if task is None else task[2]
+                while len(window) > 0 and (in_flight + length > self.window_bytes or len(window) >= self.workers * 4):
+                    in_flight -= self._write_block(archive, window.popleft(), written)
+                future = None if task is None else executor.submit(_deflate_block, task)
+                window.append((entry, task, future))
+                in_flight += length
+                input_bytes += length
+            while len(window) > 0:
+                self._write_block(archive, window.popleft(), written)
+            ParallelZip._write_central_directory(archive, written)
+            output_bytes = archive.tell()
+        self.stats.update({"entries": len(written), "input_bytes": input_bytes, "output_bytes": output_bytes,
+                           "seconds": round(time.perf_counter() - begin, 4)})
+        #按试压缩的平均速度估算直接存储节省的压缩时间
+        if self.stats["attempted_bytes"] > 0:
+            self.stats["saved_cpu_seconds"] = round(self.stats["skipped_bytes"] * self.stats["deflate_seconds"] /
+                                                    self.stats["attempted_bytes"], 4)
+        self.stats["deflate_seconds"] = round(self.stats["deflate_seconds"], 4)
+        return self.stats
+
+    #写出一个压缩完成的块，条目的第一块之前写本地文件头，最后一块之后回填 crc 和大小；返回块的原始长度
+    def _write_block(self, archive, item, written):
+        entry, task, future = item
+        if task is None or task[1] == 0:
+            entry["header_offset"] = archive.tell()
+            archive.write(ParallelZip._local_header(entry))
+        if task is None:
+            written.append(entry)
+            return 0
+        crc, length, compressed, method, seconds = future.result()
+        if method != ParallelZip.METHOD_RAW:
+            entry["method"] = method
+            entry["crc"] = ParallelZip.crc32_combine(entry["crc"], crc, length)
+        if task[5] == zipfile.ZIP_DEFLATED:
+            self.stats["deflate_seconds"] += seconds
+            self.stats["attempted_bytes"] += length
+        entry["compress_size"] += len(compressed)
+        archive.write(compressed)
+        if task[3]:
+            if not entry["zip64"] and entry["compress_size"] > ParallelZip.ZIP64_LIMIT:
+                raise zipfile.LargeZipFile("compressed size of %s exceeds the zip64 limit" % entry["name"].decode("utf-8"))
+            end = archive.tell()
+            archive.seek(entry["header_offset"])
+            archive.write(ParallelZip._local_header(entry))
+            archive.seek(end)
+            written.append(entry)
+            self._count(entry)
+        return length
+
+    #统计条目的压缩方式和判定依据
+    def _count(self, entry):
+        if entry["reason"] == ParallelZip.REASON_RAW:
+            kind = "raw"
+        else:
+            kind = "stored" if entry["method"] == zipfile.ZIP_STORED else "deflated"
+        self.stats[kind] += 1
+        self.stats[kind + "_bytes"] += entry["size"]
+        decision = entry["reason"] + "_" + kind
+        self.stats["decisions"][decision] = self.stats["decisions"].get(decision, 0) + 1
+        if kind == "stored" and entry["reason"] in (ParallelZip.REASON_EXTENSION, ParallelZip.REASON_SAMPLE):
+            self.stats["skipped_bytes"] += entry["size"]
+
+    #写入中央目录和目录结束记录，条目数、目录大小或偏移超出限制时加上 Zip64 结束记录【静态函数】
+    @staticmethod
+    def _write_central_directory(archive, written):
+        start = archive.tell()
+        for entry in written:
+            archive.write(ParallelZip._central_header(entry))
+        end = archive.tell()
+        count = len(written)
+        size = end - start
+        if count > ParallelZip.MAX_UINT16 or size > ParallelZip.ZIP64_LIMIT or start > ParallelZip.ZIP64_LIMIT:
+            archive.write(ParallelZip.END_RECORD64.pack(b"PK\x06\x06", 44, ParallelZip.VERSION_ZIP64, ParallelZip.VERSION_ZIP64,
+                                                        0, 0, count, count, size, start))
+            archive.write(ParallelZip.END_LOCATOR64.pack(b"PK\x06\x07", 0, end, 1))
+            count = min(count, ParallelZip.MAX_UINT16)
+            size = min(size, ParallelZip.MAX_UINT32)
+            start = min(start, ParallelZip.MAX_UINT32)
+        archive.write(ParallelZip.END_RECORD.pack(b"PK\x05\x06", 0, 0, count, count, size, start, 0))
+
+    #打印最近一次写入的统计和吞吐量
+    def print(self):
+        seconds = max(self.stats["seconds"], 1e-9)
+        print("parallel zip: ", self.stats, "throughput: %.1f MB/s" % (self.stats["input_bytes"] / seconds / 1024 / 1024))
+
+
+#main函数
+if __name__ == '__main__':
+    args = sys.argv
+    if len(args) != 3:
+        print('Usage: python ParallelZip.py srcDir dstZipPath')
+        sys.exit(1)
+
+    entries = []
+    for root, dirs, files in os.walk(args[1]):
+        dirs.sort()
+        relative_dir = os.path.relpath(root, args[1])
+        if relative_dir != ".":
+            entries.append((root, relative_dir))
+        for name in sorted(files):
+            entries.append((os.path.join(root, name), os.path.join(relative_dir, name) if relative_dir != "." else name))
+    writer = ParallelZip()
+    writer.write(entries, args[2])
+    writer.print()
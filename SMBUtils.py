@@ -5,6 +5,7 @@ import tempfile
 import time
 
 from smb.SMBConnection import SMBConnection
+from IgnoreRules import IgnoreRules
 import logging
 import os
 
@@ -16,7 +17,8 @@ class SMBUtils:
     SERVER_TO_LOCAL = 2  # 操作对象是服务端到本地
     SERVER_TO_SERVER = 3  # 操作对象是服务端到服务端
 
-    def __init__(self, service_name, sub_working, host, port=139, username="", password="", log_target='SMBUtils'):
+    def __init__(self, service_name, sub_working, host, port=139, username="", password="", log_target='SMBUtils',
+                 ignore_rules=None):
         """
         创建一个SMBUtils对象
 
@@ -28,6 +30,7 @@ class SMBUtils:
         :param username:        共享目录账户名（服务端无限制下 允许匿名访问）
         :param password:        共享目录账户密码（服务端无限制下允许匿名访问）
         :param log_target:      日志target
+        :param ignore_rules:    忽略规则（IgnoreRules），为空时只排除常见的系统文件/文件夹
         """
         # 日志对象
         self.logger = logging.getLogger(log_target)
@@ -45,6 +48,10 @@ class SMBUtils:
             '._.DS_Store',
             'desktop.ini'
         ]
+        # 编译后的忽略规则，与本地遍历共用同一套规则
+        if ignore_rules is None:
+            ignore_rules = IgnoreRules(self.exclude_array)
+        self.ignore_rules = ignore_rules
         # 搜索文件属性筛选
         self.search_bits = 0x10031
         # 状态
@@ -650,7 +657,7 @@ class SMBUtils:
         :param parent_dir:  指定目录
         :return:            是否存在
         """
-        if sub_dir in self.exclude_array or sub_dir in self.special_array:
+        if sub_dir in self.special_array or self.ignore_rules.match(sub_dir):
             return False
         flag = False
         if self.connect_status and self.service_status:
@@ -786,7 +793,7 @@ class SMBUtils:
         ls_list = []
         shared_files = self.connection.listPath(self.service_name, dir_path, search=self.search_bits)
         for shared_file in shared_files:
-            if shared_file.filename not in self.exclude_array and shared_file.filename not in self.special_array:
+            if shared_file.filename not in self.special_array and not self.ignore_rules.match(shared_file.filename, shared_file.isDirectory):
                 ls_list.append(shared_file.filename)
         return ls_list
 
@@ -898,9 +905,12 @@ class SMBUtils:
         """
         dir_or_files = os.listdir(src_any_path)
         for dir_or_file in dir_or_files:
-            if dir_or_file in self.special_array or dir_or_file in self.exclude_array:
+            if dir_or_file in self.special_array:
                 continue
             dir_file_path = os.path.join(src_any_path, dir_or_file)
+            # 被忽略的文件夹整个跳过，不再遍历其中的内容
+            if self.ignore_rules.match(dir_or_file, SMBUtils.__local_is_dir(dir_file_path)):
+                continue
             if SMBUtils.__local_is_dir(dir_file_path):
                 src_dir_path = dir_file_path
                 dst_dir_path = os.path.join(dst_any_path, dir_or_file)
@@ -1,12 +1,27 @@
 import os
+import time
 import zipfile
 import shutil
 import sys
+import argparse
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from ParallelZip import ParallelZip
+from ParallelUnzip import ParallelUnzip
 
 class ZipBuilder:
-    def __init__(self, input_path):
+    #native 进程内并行压缩；system 调用系统工具（macOS ditto、Windows zip.exe、Linux zip）
+    ENGINE_NATIVE = "native"
+    ENGINE_SYSTEM = "system"
+
+    def __init__(self, input_path, engine=ENGINE_NATIVE, workers=0, auto_store=True):
         self.src_path = input_path
+        self.engine = engine
+        self.workers = workers
+        #native 压缩时按条目自动选择存储或压缩
+        self.auto_store = auto_store
+        #最近一次压缩的统计
+        self.stats = {}
     
     def compress(self, dst_zip_path):
         if not os.path.exists(self.src_path):
@@ -23,6 +38,64 @@ class ZipBuilder:
             self._compress_dir(self.src_path, dst_zip_path)
         return True
     
+    #把文件直接写入 zip，不需要先拷贝到暂存目录，每个文件只读取一次【静态函数】
+    #entries 为 (源, 压缩包内路径) 序列，可以是生成器；源为 bytes 时直接写入内容（例如清单）
+    #返回 ParallelZip 的写入统计，entries 为写入的条目数
+    #源为文件夹时写入文件夹条目；条目在线程池中按块并行压缩，按顺序写入
+    #auto_store 为 True 时已经压缩过的条目直接存储，统计中记录每个条目的判定依据和节省的压缩时间
+    @staticmethod
+    def compress_files(entries, dst_zip_path, compresslevel=6, workers=0, auto_store=True):
+        dst_dir = os.path.dirname(dst_zip_path)
+        if dst_dir != "" and not os.path.exists(dst_dir):
+            os.makedirs(dst_dir)
+        if os.path.exists(dst_zip_path):
+            # 已存在先删除目标文件
+            os.remove(dst_zip_path)
+        writer = ParallelZip(workers, compresslevel, auto_store=auto_store)
+        stats = writer.write(entries, dst_zip_path)
+        writer.print()
+        return stats
+
+    #列出文件夹下的所有文件夹和文件，返回 (源, 压缩包内路径) 列表，prefix 为压缩包内的根目录【静态函数】
+    #指向文件夹的符号链接不展开，与文件的符号链接一样按链接本身写入（例如 .framework 中的 Versions/Current）
+    @staticmethod
+    def list_entries(src_dir, prefix=""):
+        entries = []
+        if prefix != "":
+            entries.append((src_dir, prefix))
+        for root, dirs, files in os.walk(src_dir):
+            dirs.sort()
+            relative_dir = os.path.relpath(root, src_dir).replace(os.sep, "/")
+            relative_dir = prefix if relative_dir == "." else (relative_dir if prefix == "" else prefix + "/" + relative_dir)
+            if root != src_dir:
+                entries.append((root, relative_dir))
+            links = [name for name in dirs if os.path.islink(os.path.join(root, name))]
+            for name in sorted(files + links):
+                entries.append((os.path.join(root, name), name if relative_dir == "" else relative_dir + "/" + name))
+        return entries
+
+    #只解压 zip 中指定的文件，names 为压缩包内的路径【静态函数】
+    @staticmethod
+    def extract_files(zip_path, names, dst_path, workers=0):
+        ParallelUnzip(workers).extract([(zip_path, dst_path, names)])
+
+    #同时解压多个压缩包，jobs 为 (压缩包路径, 目标文件夹) 列表【静态函数】
+    #native 引擎把所有压缩包的条目放进同一个线程池；system 引擎为每个压缩包启动一个解压进程
+    @staticmethod
+    def decompress_all(jobs, engine=ENGINE_NATIVE, workers=0):
+        for zip_path, dst_path in jobs:
+            if not os.path.exists(zip_path):
+                print("Source path does not exist!")
+                return False
+        if engine == ZipBuilder.ENGINE_NATIVE:
+            unzip = ParallelUnzip(workers)
+            unzip.extract(jobs)
+            unzip.print()
+            return True
+        with ThreadPoolExecutor(max_workers=max(len(jobs), 1)) as executor:
+            results = list(executor.map(lambda job: ZipBuilder(job[0], engine).decompress(job[1]), jobs))
+        return all(results)
+
     def _compress_file(self, src_file, dst_file):
         # 获取目录的上级目录
         base_path = os.path.dirname(src_file)
@@ -34,7 +107,6 @@ class ZipBuilder:
         self._compress(base_path, dst_file, os.path.basename(src_file))
 
     def _compress(self, src_dir, dst_dir, special_file="."):
-        # 使用 subprocess.run 执行系统命令
         #判断源文件夹是否存在
         if not os.path.exists(src_dir):
             print("Source path does not exist!")
@@ -48,27 +120,73 @@ class ZipBuilder:
         if not os.path.exists(os.path.dirname(dst_dir)):
             os.makedirs(os.path.dirname(dst_dir))
             
+        begin = time.perf_counter()
+        src_dir_path = src_dir if special_file == "." else src_dir + "/" + special_file
+        if self.engine == ZipBuilder.ENGINE_NATIVE:
+            #与 ditto --keepParent 相同，压缩包内以被压缩的文件夹名作为根目录
+            if os.path.isdir(src_dir_path):
+                entries = ZipBuilder.list_entries(src_dir_path, "" if special_file == "." else special_file)
+            else:
+                entries = [(src_dir_path, special_file)]
+            #写入时已经遍历过所有条目，直接使用写入统计中的数据量
+            input_bytes = ZipBuilder.compress_files(entries, dst_dir, workers=self.workers, auto_store=self.auto_store)["input_bytes"]
+            success = True
+        else:
+            success = self._compress_system(src_dir, dst_dir, special_file, src_dir_path)
+            input_bytes = ZipBuilder._input_bytes(src_dir_path)
+        self.stats = ZipBuilder._stats(self.engine, input_bytes, dst_dir, time.perf_counter() - begin)
+        print("zip stats: ", self.stats)
+        return success
+
+    def _compress_system(self, src_dir, dst_dir, special_file, src_dir_path):
+        # 使用 subprocess.run 执行系统命令
         platform=sys.platform
         if platform == "darwin":
-            src_dir_path=src_dir + "/" + special_file
             command = "ditto -c -k --sequesterRsrc --keepParent '" + src_dir_path + "' '" + dst_dir + "'"
         elif platform == "win32":
             #获取zip.exe文件路径
             zip_path=os.path.dirname(os.path.realpath(__file__)) + "/zip-win/bin/zip.exe"
             #若要压缩文件夹后保持相对路径，需要cd到待压缩文件夹所在目录
             command = zip_path + ' -r "' + dst_dir + '" .'   
+        else:
+            #Linux 使用 Info-ZIP，与 ditto --keepParent 一样保留被压缩的文件夹名，-y 按链接本身写入符号链接
+            command = "zip -r -q -y '" + dst_dir + "' '" + special_file + "'"
         
         print(command)
         result = subprocess.run(command, cwd=src_dir, shell=True, check=True, stdout=subprocess.PIPE, text=True)
         
         return result.returncode == 0
 
+    #系统工具压缩时没有写入统计，遍历源文件夹得到数据量，符号链接按链接本身计算【静态函数】
+    @staticmethod
+    def _input_bytes(src_path):
+        if os.path.isfile(src_path):
+            return os.path.getsize(src_path)
+        input_bytes = 0
+        for root, dirs, files in os.walk(src_path):
+            for name in files + [name for name in dirs if os.path.islink(os.path.join(root, name))]:
+                input_bytes += os.lstat(os.path.join(root, name)).st_size
+        return input_bytes
+
+    #统计压缩前后的大小和吞吐量【静态函数】
+    @staticmethod
+    def _stats(engine, input_bytes, dst_zip_path, seconds):
+        return {
+            "engine": engine,
+            "input_bytes": input_bytes,
+            "output_bytes": os.path.getsize(dst_zip_path) if os.path.exists(dst_zip_path) else 0,
+            "seconds": round(seconds, 4),
+            "mb_per_second": round(input_bytes / max(seconds, 1e-9) / 1024 / 1024, 1)
+        }
+
     def decompress(self, dst_path):
         if not os.path.exists(self.src_path):
             print("Source path does not exist!")
             return False
         if not os.path.exists(dst_path):
             os.makedirs(dst_path)
+        if self.engine == ZipBuilder.ENGINE_NATIVE:
+            return ZipBuilder.decompress_all([(self.src_path, dst_path)], self.engine, self.workers)
         # 使用 subprocess.run 执行系统命令
         platform=sys.platform
         if platform == "darwin":
@@ -77,22 +195,32 @@ class ZipBuilder:
             #获取unzip.exe文件路径
             unzip_path=os.path.dirname(os.path.realpath(__file__)) + "/zip-win/bin/unzip.exe"
             command = unzip_path + ' "' + self.src_path + '" -d "' + dst_path + '"'
+        else:
+            command = "unzip -q -o '" + self.src_path + "' -d '" + dst_path + "'"
         result = subprocess.run(command, shell=True, check=True, stdout=subprocess.PIPE, text=True)
         return result.returncode == 0
 
 
 if __name__ == '__main__':
-    args = sys.argv
-    if len(args) < 3:
-        print("Usage: python/python3 ZipBuilder.py input_path dst_zip_path")
-        exit(1)
+    parser = argparse.ArgumentParser(description='compress a file or folder into a zip and extract it again')
+    parser.add_argument('input_path')
+    parser.add_argument('dst_zip_path')
+    parser.add_argument('--engine', default=ZipBuilder.ENGINE_NATIVE, choices=[ZipBuilder.ENGINE_NATIVE, ZipBuilder.ENGINE_SYSTEM])
+    parser.add_argument('--workers', type=int, default=0, help='native compression threads, 0 means cpu count')
+    parser.add_argument('--deflate-all', action='store_true', help='deflate every entry instead of storing already-compressed ones')
+    parser.add_argument('--compare', action='store_true', help='compress with both engines and report their throughput')
+    args = parser.parse_args()
 
-    input_path = args[1]
-    dst_zip_path = args[2]
-    builder = ZipBuilder(input_path)
+    #系统工具在源文件夹的上级目录中执行，路径统一转换为绝对路径
+    input_path = os.path.abspath(args.input_path)
+    dst_zip_path = os.path.abspath(args.dst_zip_path)
+    if args.compare:
+        for engine in (ZipBuilder.ENGINE_SYSTEM, ZipBuilder.ENGINE_NATIVE):
+            builder = ZipBuilder(input_path, engine, args.workers, not args.deflate_all)
+            builder.compress(dst_zip_path + "." + engine + ".zip")
+        sys.exit(0)
+    builder = ZipBuilder(input_path, args.engine, args.workers, not args.deflate_all)
     builder.compress(dst_zip_path)
     print("ZipBuilder done!")
     builder = ZipBuilder(dst_zip_path)
     builder.decompress(os.path.dirname(input_path) + '/decompress')
-                
-
@@ -0,0 +1,188 @@
+import os
+import sys
+import stat
+import zipfile
+import argparse
+from HashEngine import HashEngine
+from ManifestTable import ManifestTable
+from ParallelUnzip import ParallelUnzip
+from FolderCompare import FolderCompare, FileNode
+
+#定义一个压缩包比较器，直接比较两个 zip 的中央目录，不解压整个版本包
+#zip 的中央目录中记录了每个条目的原始大小和 crc32，(大小, crc32) 相同的条目视为未变化，不需要解压和计算摘要
+#新旧两边变化的条目都直接从压缩包中流式计算摘要，比较时不写入磁盘；
+#差分编码、分块导出等需要新文件内容的步骤由调用方通过 extract_new 按需解压
+#比较的开销从与文件总大小相关变为与条目数和变化的数据量相关
+class ZipCompare:
+    #ditto --sequesterRsrc 生成的资源分支，不参与比较
+    RESOURCE_DIR = "__MACOSX/"
+
+    #读取中央目录，返回 {相对路径: ZipInfo}，跳过文件夹、资源分支和被忽略规则匹配的条目【静态函数】
+    #被忽略的文件夹下的所有条目都跳过，与遍历文件夹时剪掉整个子树的结果一致
+    @staticmethod
+    def read_entries(zip_path, ignore_rules=None):
+        if ignore_rules is None:
+            ignore_rules = FolderCompare.DEFAULT_IGNORE_RULES
+        entries = {}
+        #文件夹是否被忽略的缓存，每个文件夹只判断一次
+        ignored_dirs = {}
+        with zipfile.ZipFile(zip_path) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or info.filename.startswith(ZipCompare.RESOURCE_DIR):
+                    continue
+                parts = [part for part in info.filename.split("/") if part not in ("", ".")]
+                if ZipCompare._ignored(ignore_rules, parts, ignored_dirs):
+                    continue
+                entries[os.path.join(*parts)] = info
+        return entries
+
+    #依次判断条目所在的各级文件夹和条目本身是否被忽略【静态函数】
+    @staticmethod
+    def _ignored(ignore_rules, parts, ignored_dirs):
+        for i in range(1, len(parts)):
+            prefix = "/".join(parts[:i])
+            ignored = ignored_dirs.get(prefix)
+            if ignored is None:
+                ignored = ignore_rules.match(prefix, True, parts[i - 1])
+                ignored_dirs[prefix] = ignored
+            if ignored:
+                return True
+        return ignore_rules.match("/".join(parts), False, parts[-1])
+
+    #比较两个压缩包，结果写入 folderCompare，与 FolderCompare.compare 的结果格式相同【静态函数】
+    #新文件节点指向 folderCompare.new_path，archive_entry 记录条目在新版本压缩包中的位置；旧文件节点指向 folderCompare.old_path
+    #比较时两边的文件都不解压，只有差分编码等需要文件内容的步骤才要求这些文件存在（由调用方按需解压）
+    @staticmethod
+    def compare_zip(folderCompare, old_zip, new_zip, workers=0):
+        old_entries = ZipCompare.read_entries(old_zip, folderCompare.ignore_rules)
+        new_entries = ZipCompare.read_entries(new_zip, folderCompare.ignore_rules)
+        stats = {"added": 0, "removed": 0, "size_changed": 0, "crc_changed": 0, "unchanged": 0}
+        changed = []
+        for relativePath, info in new_entries.items():
+            old_info = old_entries.get(relativePath)
+            if old_info is None:
+                stats["added"] += 1
+            elif old_info.file_size != info.file_size:
+                stats["size_changed"] += 1
+            elif old_info.CRC != info.CRC:
+                stats["crc_changed"] += 1
+            else:
+                stats["unchanged"] += 1
+                continue
+            changed.append(relativePath)
+        removed = [relativePath for relativePath in old_entries if relativePath not in new_entries]
+        stats["removed"] = len(removed)
+
+        unzip = ParallelUnzip(workers)
+        folderCompare.diff_dict = {}
+        folderCompare.deleted_dict = {}
+        for relativePath in changed:
+            node = ZipCompare._node(folderCompare.new_path, relativePath, new_entries[relativePath])
+            node.archive_entry = (new_zip, new_entries[relativePath])
+            old_info = old_entries.get(relativePath)
+            if old_info is None:
+                node.status = 'added'
+            else:
+                node.status = 'modified'
+                node.previous = ZipCompare._node(folderCompare.old_path, relativePath, old_info)
+            folderCompare.diff_dict[relativePath] = node
+        for relativePath in removed:
+            node = ZipCompare._node(folderCompare.old_path, relativePath, old_entries[relativePath])
+            node.status = 'deleted'
+            folderCompare.deleted_dict[relativePath] = node
+        #新文件与旧文件一样从压缩包中计算摘要，符号链接两边都按链接目标的文本计算
+        ZipCompare._fill_digests(unzip, new_zip, new_entries, list(folderCompare.diff_dict.values()), folderCompare.hash_engine.algorithm)
+        old_nodes = [node.previous for node in folderCompare.diff_dict.values() if node.previous is not None]
+        old_nodes.extend(folderCompare.deleted_dict.values())
+        source_nodes = []
+        if folderCompare.detect_moves:
+            #(大小, crc32) 与新增条目相同的旧条目才可能是移动或复制的来源，只为这些条目计算摘要
+            added_keys = set((new_entries[node.relativePath].file_size, new_entries[node.relativePath].CRC)
+                             for node in folderCompare.diff_dict.values() if node.status == 'added')
+            source_nodes = [node for node in folderCompare.deleted_dict.values()
+                            if (node.size, old_entries[node.relativePath].CRC) in added_keys]
+            source_nodes.extend(ZipCompare._node(folderCompare.old_path, relativePath, info)
+                                for relativePath, info in old_entries.items()
+                                if relativePath in new_entries and relativePath not in folderCompare.diff_dict
+                                and (info.file_size, info.CRC) in added_keys)
+            old_nodes.extend(node for node in source_nodes if node.status is None)
+        ZipCompare._fill_digests(unzip, old_zip, old_entries, old_nodes, folderCompare.hash_engine.algorithm)
+        stats["hashed"] = len(changed)
+        folderCompare.stage_stats = stats
+        if folderCompare.detect_moves:
+            folderCompare.detectMoves(source_nodes)
+        print('compare stage stats: ', folderCompare.stage_stats)
+
+    #把新版本中指定的变化条目解压到 folderCompare.new_path，relative_paths 为空时解压所有需要导出内容的条目【静态函数】
+    #返回解压的条目数
+    @staticmethod
+    def extract_new(folderCompare, relative_paths=None, workers=0):
+        if relative_paths is None:
+            relative_paths = [node.relativePath for node in folderCompare.diff_dict.values() if node.encoding not in ("move", "copy")]
+        nodes = [folderCompare.diff_dict[relativePath] for relativePath in relative_paths]
+        if len(nodes) == 0:
+            return 0
+        unzip = ParallelUnzip(workers)
+        count = unzip.extract([(nodes[0].archive_entry[0], folderCompare.new_path, [node.archive_entry[1].filename for node in nodes])])
+        unzip.print()
+        return count
+
+    #由新版本压缩包的中央目录生成这个版本的版本清单【静态函数】
+    #比较时已经计算过的摘要直接复用，其余未变化的条目从压缩包中流式计算，不解压到磁盘
+    #符号链接条目的大小和摘要都是链接目标的，与 ManifestTable.from_walk 按 lstat 记录的结果相同，另外记录链接目标
+    @staticmethod
+    def manifest_table(folderCompare, new_zip, workers=0):
+        entries = ZipCompare.read_entries(new_zip, folderCompare.ignore_rules)
+        algorithm = folderCompare.hash_engine.algorithm
+        digests = {relativePath: node.md5 for relativePath, node in folderCompare.diff_dict.items()
+                   if node.md5 is not None and relativePath in entries}
+        names = [entries[relativePath].filename for relativePath in entries if relativePath not in digests]
+        if len(names) > 0:
+            hashed = ParallelUnzip(workers).hash_entries(new_zip, names, lambda: HashEngine.new_hasher(algorithm))
+            for relativePath, info in entries.items():
+                if relativePath not in digests:
+                    digests[relativePath] = hashed[info.filename]
+        links = {}
+        with zipfile.ZipFile(new_zip) as archive:
+            for relativePath, info in entries.items():
+                if stat.S_ISLNK(info.external_attr >> 16):
+                    links[relativePath] = os.fsdecode(archive.read(info))
+        table = ManifestTable(folderCompare.new_path, HashEngine.new_hasher(algorithm).digest_size)
+        for relativePath in sorted(entries):
+            table.append(relativePath, entries[relativePath].file_size, 0, 0, digest=bytes.fromhex(digests[relativePath]),
+                         link=links.get(relativePath))
+        return table
+
+    #压缩包条目对应的文件节点，文件不一定存在，大小来自中央目录【静态函数】
+    @staticmethod
+    def _node(root, relativePath, info):
+        return FileNode(os.path.join(root, relativePath), relativePath, None, info.file_size)
+
+    #从压缩包中流式计算文件节点的摘要，同一个条目只计算一次【静态函数】
+    @staticmethod
+    def _fill_digests(unzip, zip_path, entries, nodes, algorithm):
+        names = sorted(set(entries[node.relativePath].filename for node in nodes))
+        if len(names) == 0:
+            return
+        digests = unzip.hash_entries(zip_path, names, lambda: HashEngine.new_hasher(algorithm))
+        for node in nodes:
+            node.md5 = digests[entries[node.relativePath].filename]
+
+
+#main函数
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='compare two zip packages by their central directories')
+    parser.add_argument('oldZip')
+    parser.add_argument('newZip')
+    parser.add_argument('extractPath', help='folder that receives the added and modified entries of newZip')
+    parser.add_argument('--algorithm', default=HashEngine.DEFAULT_ALGORITHM, choices=HashEngine.available_algorithms(), help='digest algorithm')
+    parser.add_argument('--detect-moves', action='store_true', help='emit renamed or copied files as move/copy entries instead of payload')
+    args = parser.parse_args()
+
+    compare = FolderCompare("", args.extractPath, HashEngine(algorithm=args.algorithm), detectMoves=args.detect_moves)
+    ZipCompare.compare_zip(compare, args.oldZip, args.newZip)
+    ZipCompare.extract_new(compare)
+    for relativePath, node in sorted(compare.diff_dict.items()):
+        print(node.status, node.encoding, relativePath)
+    for relativePath in sorted(compare.deleted_dict):
+        print('deleted', relativePath)
@@ -2,8 +2,16 @@ import os
 import shutil
 from ConfigParser import ConfigParser
 from FolderCompare import FolderCompare
+from DiffManifest import DiffManifest
+from DeltaEncoder import DeltaEncoder
+from ChunkStore import ChunkStore
+from ManifestTable import ManifestTable
+from HashEngine import HashEngine
+from HashIndex import HashIndex
 from Utils import Utils
 from ZipBuilder import ZipBuilder
+from ParallelZip import RawEntry
+from ZipCompare import ZipCompare
 from DmgHelper import DmgHelper
 from publish.SmbService import SmbService
 from publish.SMBUtils import SMBUtils
@@ -19,6 +27,15 @@ class builder:
         self.mount_path=build_path + "mount/"
         self.mount_path_previous=self.mount_path + "previous/app"
         self.mount_path_current=self.mount_path + "current/app"
+        #哈希索引放在 build 目录下，clear 时不会被删除，多次构建之间复用
+        self.hash_index_path=build_path + "hash_index.db"
+        #上一个版本的版本清单，存在时不需要下载上一个版本包
+        self.previous_manifest_file=""
+        #与版本清单比较后得到的当前版本清单
+        self.current_table=None
+        #直接比较两个 zip 版本包的中央目录时，两个版本包都不整体解压
+        self.previous_zip_file=""
+        self.current_zip_file=""
         
         self.configParser=ConfigParser()
         self.previousDmgHelper=None
@@ -38,10 +55,15 @@ class builder:
             os.makedirs(previous_package_path)
         package_info=self.configParser.get_param()
         responsitory=package_info.server_url
-        previous_file_url=package_info.get_previous_url()
-        previous_file=self._pull_package(previous_file_url, previous_package_path)
-        if previous_file == "":
-            return False
+        previous_file=""
+        if self.configParser.get_compare_config()["previous_manifest"]:
+            #上一个版本发布了版本清单时只拉取清单，需要旧文件时再拉取上一个版本包
+            self.previous_manifest_file=self._pull_manifest(package_info.get_previous_manifest_url(), previous_package_path)
+        if self.previous_manifest_file == "":
+            previous_file_url=package_info.get_previous_url()
+            previous_file=self._pull_package(previous_file_url, previous_package_path)
+            if previous_file == "":
+                return False
         #拉取 current 版本包
         current_package_path=self.package_path + "current/"
         if not os.path.exists(current_package_path):
@@ -52,24 +74,21 @@ class builder:
             return False
         
         #如果是dmg文件，挂载
-        if previous_file.endswith(".dmg"):
+        if current_file.endswith(".dmg"):
             return self._mount_dmg(previous_file, current_file)
-        elif previous_file.endswith(".zip"):
+        elif current_file.endswith(".zip"):
+            if self.configParser.get_compare_config()["zip_compare"] and previous_file.endswith(".zip"):
+                return self._prepare_zip_compare(previous_file, current_file)
             return self._unzip(previous_file, current_file)
-        elif previous_file.endswith(".exe"):
+        elif current_file.endswith(".exe"):
             return self._mount_exe(previous_file, current_file)
         
         return False 
     
     def _mount_dmg(self, previous_file, current_file):
-        #挂载 previous 版本包
-        if not os.path.exists(self.mount_path_previous):
-            os.makedirs(self.mount_path_previous)
-        previous_mount_path=self.mount_path_previous
-        if not os.path.exists(previous_mount_path):
-            os.makedirs(previous_mount_path)
-        self.previousDmgHelper=DmgHelper(previous_file, previous_mount_path)
-        self.previousDmgHelper.mount()
+        #挂载 previous 版本包，只使用版本清单时 previous_file 为空
+        if previous_file != "":
+            self._mount_previous_dmg(previous_file)
         
         #挂载 current 版本包
         if not os.path.exists(self.mount_path_current):
@@ -80,15 +99,35 @@ class builder:
         self.currentDmgHelper=DmgHelper(current_file, current_mount_path)
         self.currentDmgHelper.mount()
         return True
+
+    def _mount_previous_dmg(self, previous_file):
+        if not os.path.exists(self.mount_path_previous):
+            os.makedirs(self.mount_path_previous)
+        previous_mount_path=self.mount_path_previous
+        if not os.path.exists(previous_mount_path):
+            os.makedirs(previous_mount_path)
+        self.previousDmgHelper=DmgHelper(previous_file, previous_mount_path)
+        self.previousDmgHelper.mount()
     
     #解压 zip 文件
     def _unzip(self, previous_file, current_file):
-        #解压 previous 版本包
-        ZipBuilder(previous_file).decompress(self.mount_path_previous)
-        #解压 current 版本包
-        ZipBuilder(current_file).decompress(self.mount_path_current)
-        return True
+        #同时解压 previous 和 current 版本包，只使用版本清单时 previous_file 为空
+        jobs=[(current_file, self.mount_path_current)]
+        if previous_file != "":
+            jobs.insert(0, (previous_file, self.mount_path_previous))
+        compare_config=self.configParser.get_compare_config()
+        return ZipBuilder.decompress_all(jobs, compare_config["zip_engine"], compare_config["zip_workers"])
     
+    #直接比较两个 zip 的中央目录，只有变化的条目在比较时解压
+    def _prepare_zip_compare(self, previous_file, current_file):
+        self.previous_zip_file=previous_file
+        self.current_zip_file=current_file
+        for mount_path in (self.mount_path_previous, self.mount_path_current):
+            if os.path.exists(mount_path):
+                shutil.rmtree(mount_path)
+            os.makedirs(mount_path)
+        return True
+
     #挂载 exe 文件
     def _mount_exe(self, previous_file, current_file):
         #挂载 previous 版本包
@@ -121,10 +160,96 @@ class builder:
             file_path = Utils.download(file_url, package_path)
 
         return file_path
-    
+
+    #拉取版本清单，上一个版本没有发布清单时返回空字符串
+    def _pull_manifest(self, manifest_url, package_path):
+        try:
+            return Utils.download(manifest_url, package_path)
+        except Exception as e:
+            print("previous manifest is not available: " + str(e))
+            return ""
+
+    #只使用版本清单时，拉取上一个版本包并取出需要的旧文件，没有需要的文件时不拉取
+    #zip 包只解压需要的文件，dmg 只能整体挂载
+    def _fetch_previous(self, relative_paths):
+        if len(relative_paths) == 0:
+            return True
+        print("begin fetch previous files: ", len(relative_paths))
+        previous_package_path=self.package_path + "previous/"
+        if not os.path.exists(previous_package_path):
+            os.makedirs(previous_package_path)
+        previous_file=self._pull_package(self.configParser.get_param().get_previous_url(), previous_package_path)
+        if previous_file == "":
+            return False
+        if previous_file.endswith(".dmg"):
+            self._mount_previous_dmg(previous_file)
+        elif previous_file.endswith(".zip"):
+            ZipBuilder.extract_files(previous_file, [path.replace(os.sep, "/") for path in relative_paths], self.mount_path_previous,
+                                     self.configParser.get_compare_config()["zip_workers"])
+        return True
+
+    #需要旧文件内容的相对路径：差分编码的修改文件，分块导出时所有修改文件的旧文件和删除的文件
+    @staticmethod
+    def _required_previous(folderCompare, compare_config, deltaEncoder):
+        paths=set()
+        for node in folderCompare.diff_dict.values():
+            if node.previous == None:
+                continue
+            if compare_config["chunk_store"]:
+                paths.add(node.previous.relativePath)
+            elif deltaEncoder != None and deltaEncoder.wants(node.previous.size, node.size):
+                paths.add(node.previous.relativePath)
+        if compare_config["chunk_store"]:
+            paths.update(folderCompare.deleted_dict)
+        return sorted(paths)
+
+    #zip 比较时需要解压的新文件：原样拷贝压缩数据写入差异包的条目不需要解压，
+    #差分编码的修改文件、不能原样拷贝的条目，以及经过暂存目录或分块导出时的所有导出文件都需要解压
+    @staticmethod
+    def _required_current(folderCompare, compare_config, deltaEncoder):
+        passthrough=compare_config["direct_archive"] and not compare_config["chunk_store"] and compare_config["zip_passthrough"]
+        paths=[]
+        for node in folderCompare.diff_dict.values():
+            if node.encoding in ("move", "copy"):
+                continue
+            if not passthrough or not RawEntry.supported(node.archive_entry[1]):
+                paths.append(node.relativePath)
+            elif deltaEncoder != None and node.previous != None and deltaEncoder.wants(node.previous.size, node.size):
+                paths.append(node.relativePath)
+        return sorted(paths)
+
+    #比较两个版本，stream 为 True 时返回 compareStream 的生成器，否则返回 None
+    #已经与上一个版本的版本清单或 zip 中央目录比较过时不再比较
+    def _compare(self, folderCompare, stream=False):
+        if self.current_table != None or self.current_zip_file != "":
+            return None
+        if stream:
+            print("begin FolderCompare.compareStream.....")
+            return folderCompare.compareStream()
+        print("begin FolderCompare.....")
+        folderCompare.compare()
+        return None
+
+    #生成当前版本的版本清单，与差异包放在同一个目录一起上传，下一个版本构建时不需要再拉取这个版本包
+    def _write_version_manifest(self, folderCompare, hashIndex, compare_config):
+        if not compare_config["version_manifest"]:
+            return
+        print("begin version manifest.....")
+        algorithm=folderCompare.hash_engine.algorithm
+        current_table=self.current_table
+        if current_table == None and self.current_zip_file != "":
+            #只解压了变化的条目，清单由中央目录生成，未变化的条目从压缩包中流式计算摘要
+            current_table=ZipCompare.manifest_table(folderCompare, self.current_zip_file, compare_config["zip_workers"])
+        elif current_table == None:
+            #比较时计算过的摘要都在哈希索引中，这里大部分文件不需要重新读取
+            current_table=ManifestTable.from_walk(self.mount_path_current, HashEngine.new_hasher(algorithm).digest_size,
+                                                  ignoreRules=folderCompare.ignore_rules)
+            current_table.fill_digests(range(len(current_table)), folderCompare.hash_engine, hashIndex)
+        current_table.save(os.path.dirname(self.export_path) + "/package/" + ManifestTable.MANIFEST_NAME, algorithm)
+
     def build(self):
         #判断路径是否存在
-        if not os.path.exists(self.mount_path_previous):
+        if self.previous_manifest_file == "" and not os.path.exists(self.mount_path_previous):
             print("previous path does not exist!")
             return False
         if not os.path.exists(self.mount_path_current):
@@ -132,25 +257,89 @@ class builder:
             return False
         
         #构建
-        folderCompare=FolderCompare(self.mount_path_previous, self.mount_path_current)
-        print("begin FolderCompare.....")
-        folderCompare.compare()
-        #调用拷贝方法
+        compare_config=self.configParser.get_compare_config()
+        hashEngine=HashEngine(compare_config["workers"], compare_config["use_process"], compare_config["buffer_size"],
+                              compare_config["algorithm"], compare_config["mmap_threshold"], compare_config["io_order"],
+                              compare_config["io_hints"], compare_config["io_window"])
+        hashIndex=None
+        if compare_config["hash_index"]:
+            hashIndex=HashIndex(self.hash_index_path, compare_config["algorithm"])
+        deltaEncoder=None
+        if compare_config["delta"]:
+            deltaEncoder=DeltaEncoder(compare_config["delta_ratio"])
+        folderCompare=FolderCompare(self.mount_path_previous, self.mount_path_current, hashEngine, hashIndex,
+                                    compare_config["mode"], compare_config["sample"], deltaEncoder,
+                                    compare_config["detect_moves"], self.configParser.get_ignore_rules())
+        if self.previous_manifest_file != "":
+            #与上一个版本的版本清单比较，只有差分编码和分块导出需要的旧文件才会拉取
+            print("begin ManifestTable.compare_manifest.....")
+            previous_table, algorithm=ManifestTable.load(self.previous_manifest_file, self.mount_path_previous)
+            if algorithm != hashEngine.algorithm:
+                #摘要必须与版本清单使用同一种算法
+                print("use the algorithm of the previous manifest: " + algorithm)
+                hashEngine.algorithm=algorithm
+                if hashIndex != None:
+                    hashIndex.algorithm=algorithm
+            self.current_table=ManifestTable.compare_manifest(folderCompare, previous_table)
+            if not self._fetch_previous(builder._required_previous(folderCompare, compare_config, deltaEncoder)):
+                return False
+        elif self.current_zip_file != "":
+            #按中央目录的 (大小, crc32) 比较，只解压变化的条目，差分编码和分块导出需要的旧文件再单独解压
+            print("begin ZipCompare.compare_zip.....")
+            ZipCompare.compare_zip(folderCompare, self.previous_zip_file, self.current_zip_file, compare_config["zip_workers"])
+            ZipCompare.extract_new(folderCompare, builder._required_current(folderCompare, compare_config, deltaEncoder),
+                                   compare_config["zip_workers"])
+            required=builder._required_previous(folderCompare, compare_config, deltaEncoder)
+            if len(required) > 0:
+                ZipBuilder.extract_files(self.previous_zip_file, [path.replace(os.sep, "/") for path in required],
+                                         self.mount_path_previous, compare_config["zip_workers"])
         diff_path=self.export_path+"diff/"
-        
-        print("begin folderCompare.copyDiff.....")
-        folderCompare.copyDiff(diff_path)
+        if compare_config["direct_archive"] and not compare_config["chunk_store"]:
+            #差异文件直接写入压缩包，不经过 export/diff 暂存目录
+            return self._build_archive(folderCompare, hashIndex, compare_config)
+        if compare_config["chunk_store"]:
+            #分块导出需要完整的比较结果，新增和修改的文件以分块包的形式导出
+            self._compare(folderCompare)
+            print("begin ChunkStore.export.....")
+            ChunkStore.print_report(ChunkStore().export(folderCompare, diff_path))
+        elif compare_config["stream"]:
+            #流式比较，边比较边拷贝，内存占用与文件总数无关
+            folderCompare.copyDiff(diff_path, self._compare(folderCompare, True))
+        else:
+            self._compare(folderCompare)
+            #调用拷贝方法
+            print("begin folderCompare.copyDiff.....")
+            folderCompare.copyDiff(diff_path)
+        #只有删除的文件时不会拷贝任何文件，差异文件夹需要手动创建
+        if not os.path.exists(diff_path):
+            os.makedirs(diff_path)
         #把 export 文件夹打包成 zip
         diff_package_name=self.configParser.get_param().get_diff_name()
         if not diff_package_name.endswith(".zip"):
             diff_package_name + ".zip"
-        #判断下是否只有一个子文件夹，如果只有一个子文件夹，那么把子文件夹的名字作为 zip 的名字
-        child_path=diff_path
-        lstChild = os.listdir(child_path)
-        lstChild = builder.remove_invalid_file(lstChild)
-        if len(lstChild) == 1:
-            child_path+=lstChild[0]
-        zipBuilder=ZipBuilder(child_path)
+        #当前版本只有一个顶层文件夹时，把这个文件夹作为 zip 的根目录
+        root=self._package_root(folderCompare)
+        child_path=diff_path + root
+        #只有删除的文件时根目录下没有导出任何文件，清单仍然写在根目录下
+        if not os.path.exists(child_path):
+            os.makedirs(child_path)
+        if compare_config["manifest"]:
+            #把变更清单写入 zip 的根目录
+            print("begin DiffManifest.....")
+            package_info=self.configParser.get_param()
+            manifest=DiffManifest.from_compare(folderCompare)
+            manifest.previous_version=package_info.previous_version
+            manifest.current_version=package_info.current_version
+            manifest.root=root
+            manifest.write(os.path.join(child_path, DiffManifest.MANIFEST_NAME))
+            manifest.print()
+        print("diff file count: ", folderCompare.diffCounts())
+        self._write_version_manifest(folderCompare, hashIndex, compare_config)
+        if hashIndex != None:
+            hashIndex.close()
+        folderCompare.hash_engine.close()
+        zipBuilder=ZipBuilder(child_path, compare_config["zip_engine"], compare_config["zip_workers"],
+                              compare_config["zip_auto_store"])
         diff_package_path=os.path.dirname(self.export_path) + "/package/" + diff_package_name
         
         print("begin zipBuilder.compress.....")
@@ -163,11 +352,69 @@ class builder:
         
         return False
 
+    #比较结果直接写入压缩包，变更文件只从 mount_path_current 读取一次，没有中间目录
+    #压缩包内的路径与暂存目录下的相对路径一致，只有一个子文件夹时清单写在该子文件夹下
+    def _build_archive(self, folderCompare, hashIndex, compare_config):
+        #流式比较时边比较边写入压缩包
+        diff=self._compare(folderCompare, compare_config["stream"])
+        #delta 文件临时写在 export/delta 下，压缩包写完后删除
+        delta_path=self.export_path + "delta/"
+        entries=folderCompare.diffEntries(diff, delta_path, compare_config["zip_passthrough"])
+        entries=self._archive_entries(folderCompare, entries, compare_config)
+        diff_package_name=self.configParser.get_param().get_diff_name()
+        diff_package_path=os.path.dirname(self.export_path) + "/package/" + diff_package_name
+        print("begin ZipBuilder.compress_files.....")
+        count=ZipBuilder.compress_files(entries, diff_package_path, workers=compare_config["zip_workers"],
+                                        auto_store=compare_config["zip_auto_store"])["entries"]
+        print("diff file count: ", folderCompare.diffCounts(), "archive entries: ", count)
+        if os.path.exists(delta_path):
+            shutil.rmtree(delta_path)
+        self._write_version_manifest(folderCompare, hashIndex, compare_config)
+        if hashIndex != None:
+            hashIndex.close()
+        folderCompare.hash_engine.close()
+        self.export_diff_file=diff_package_path
+        print("zipBuilder.compress_files.....successed")
+        return True
+
+    #在差异文件之后追加清单条目，清单的根目录与暂存目录的规则一致
+    def _archive_entries(self, folderCompare, entries, compare_config):
+        yield from entries
+        if not compare_config["manifest"]:
+            return
+        print("begin DiffManifest.....")
+        package_info=self.configParser.get_param()
+        manifest=DiffManifest.from_compare(folderCompare)
+        manifest.previous_version=package_info.previous_version
+        manifest.current_version=package_info.current_version
+        manifest.root=self._package_root(folderCompare)
+        manifest.print()
+        yield (manifest.to_bytes(), manifest.arcname())
+
+    #差异包的根目录：当前版本只有一个顶层文件夹时为该文件夹（例如 App.app），否则为空
+    #由当前版本的目录结构决定，与这次导出了哪些文件无关，所以变更清单在每个差异包中的位置都相同
+    def _package_root(self, folderCompare):
+        if self.current_zip_file != "":
+            #zip 比较时当前版本没有整体解压，顶层条目从中央目录得到
+            top_names=set()
+            for relativePath in ZipCompare.read_entries(self.current_zip_file, folderCompare.ignore_rules):
+                parts=relativePath.split(os.sep, 1)
+                top_names.add((parts[0], len(parts) > 1))
+        else:
+            names=builder.remove_invalid_file(os.listdir(self.mount_path_current), folderCompare.ignore_rules)
+            top_names=set((name, os.path.isdir(os.path.join(self.mount_path_current, name))) for name in names)
+        if len(top_names) == 1:
+            name, is_dir=next(iter(top_names))
+            if is_dir:
+                return name
+        return ""
+
     @staticmethod
-    def remove_invalid_file(file_list):
-        #移除.DS_Store文件
-        filter_list=[item for item in file_list if not item.endswith(".DS_Store")]
-        return filter_list
+    def remove_invalid_file(file_list, ignore_rules=None):
+        #移除.DS_Store等被忽略的文件
+        if ignore_rules == None:
+            ignore_rules=FolderCompare.DEFAULT_IGNORE_RULES
+        return ignore_rules.filter(file_list)
         
     def upload(self):
         #上传
@@ -177,7 +424,7 @@ class builder:
             print("export_diff_file does not exist!")
             return False
         
-        server=SmbService()
+        server=SmbService(ignore_rules=self.configParser.get_ignore_rules())
         try:
             remote_dir_url=self.configParser.get_param().get_diff_dir_url()
             #移除以 http://share.mtlab.meitu.com/share/MCP-beta 开始的字符串
@@ -30,7 +30,7 @@ class SmbService:
     
     server= None
     
-    def __init__(self, work_dir='') -> None:
+    def __init__(self, work_dir='', ignore_rules=None) -> None:
         if(work_dir != ''):
             self.work_dir = work_dir
         
@@ -40,7 +40,8 @@ class SmbService:
                         port=self.port,
                         username=self.username,
                         password=self.password,
-                        log_target=self.log_target)
+                        log_target=self.log_target,
+                        ignore_rules=ignore_rules)
            
     #获取连接状态        
     def isConnected(self)->bool:
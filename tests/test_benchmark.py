@@ -0,0 +1,38 @@
+import json
+import pytest
+from Benchmark import Benchmark
+
+
+#不传入哈希引擎时使用默认引擎，启用哈希索引和读取顺序对比也能运行
+def test_run_with_default_engine(tmp_path):
+    benchmark = Benchmark(str(tmp_path), files=20, max_size=16 * 1024)
+    benchmark.generate()
+    result = benchmark.run(index_path=str(tmp_path / "index.db"), io_compare=True)
+    for stage in ("compare", "stage", "compress", "direct", "hash_naive", "hash_ordered"):
+        assert stage in result["stages"]
+
+
+def _scaled(baseline, factor):
+    stages = {name: {key: value * factor if key in Benchmark.CHECK_KEYS else value for key, value in stage.items()}
+              for name, stage in baseline["stages"].items()}
+    return {"params": baseline["params"], "stages": stages}
+
+
+#与仓库中的基线耗时相同时通过
+def test_check_passes_against_saved_baseline():
+    with open(Benchmark.BASELINE_PATH, 'r', -1, "utf-8") as f:
+        baseline = json.load(f)
+    assert baseline["params"] == Benchmark("").params
+    assert Benchmark.check(_scaled(baseline, 1.1), baseline) == []
+
+
+#超过阈值的阶段被列出，参数不同的基线不能对比
+def test_check_reports_regressions():
+    with open(Benchmark.BASELINE_PATH, 'r', -1, "utf-8") as f:
+        baseline = json.load(f)
+    regressions = Benchmark.check(_scaled(baseline, 2), baseline)
+    assert any(regression.startswith("compare.wall_seconds") for regression in regressions)
+    result = _scaled(baseline, 1)
+    result["params"] = dict(baseline["params"], files=1)
+    with pytest.raises(ValueError):
+        Benchmark.check(result, baseline)
@@ -0,0 +1,74 @@
+import os
+import json
+import zipfile
+import pytest
+from HashEngine import HashEngine
+from FolderCompare import FolderCompare
+from ConfigParser import ConfigParser, VersionNode
+from DiffManifest import DiffManifest
+from ZipBuilder import ZipBuilder
+
+#builder 依赖 wget、pysmb 等发布用的模块，未安装时跳过
+builder_module = pytest.importorskip("builder")
+
+
+def _tree(root, files):
+    for name, data in files.items():
+        path = os.path.join(root, *name.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(data)
+
+
+def _builder(current):
+    package = builder_module.builder()
+    package.mount_path_current = current
+    platform = ConfigParser.platform_key()
+    package.configParser.version_dict[platform] = VersionNode(platform, "1.0", "1.1", "", "App.zip")
+    return package
+
+
+def _compare(tmp_path, old_files, new_files):
+    _tree(str(tmp_path / "old"), old_files)
+    _tree(str(tmp_path / "new"), new_files)
+    compare = FolderCompare(str(tmp_path / "old"), str(tmp_path / "new"), HashEngine(1))
+    compare.compare()
+    return compare
+
+
+#当前版本只有一个顶层文件夹时以它为根目录，被忽略的文件不算；多个顶层条目或顶层是文件时根目录为空
+def test_package_root(tmp_path):
+    compare = _compare(tmp_path, {"App.app/a": b"1"}, {"App.app/a": b"2", ".DS_Store": b"x"})
+    assert _builder(str(tmp_path / "new"))._package_root(compare) == "App.app"
+    _tree(str(tmp_path / "new"), {"readme.txt": b"r"})
+    assert _builder(str(tmp_path / "new"))._package_root(compare) == ""
+    _tree(str(tmp_path / "file_only"), {"App.bin": b"b"})
+    assert _builder(str(tmp_path / "file_only"))._package_root(compare) == ""
+
+
+#zip 比较时根目录从当前版本包的中央目录得到，不需要解压
+def test_package_root_from_zip(tmp_path):
+    compare = _compare(tmp_path, {"App.app/a": b"1"}, {"App.app/a": b"2"})
+    package = _builder(str(tmp_path / "missing"))
+    package.current_zip_file = str(tmp_path / "current.zip")
+    ZipBuilder.compress_files(ZipBuilder.list_entries(str(tmp_path / "new")), package.current_zip_file)
+    assert package._package_root(compare) == "App.app"
+
+
+#清单作为最后一个条目写入根目录文件夹下，内容包含新增、修改、删除的文件；关闭 manifest 时不写入
+def test_archive_entries_manifest(tmp_path):
+    compare = _compare(tmp_path, {"App.app/mod": b"old", "App.app/gone": b"g"}, {"App.app/mod": b"newer", "App.app/added": b"n"})
+    package = _builder(str(tmp_path / "new"))
+    zip_path = str(tmp_path / "diff.zip")
+    ZipBuilder.compress_files(package._archive_entries(compare, compare.diffEntries(), {"manifest": True}), zip_path)
+    with zipfile.ZipFile(zip_path) as archive:
+        names = archive.namelist()
+        manifest = json.loads(archive.read("App.app/" + DiffManifest.MANIFEST_NAME).decode("utf-8"))
+    assert names[-1] == "App.app/" + DiffManifest.MANIFEST_NAME
+    assert sorted(names[:-1]) == ["App.app/added", "App.app/mod"]
+    assert manifest["root"] == "App.app"
+    assert (manifest["previous_version"], manifest["current_version"]) == ("1.0", "1.1")
+    assert [entry[:2] for entry in manifest["added"]] == [["App.app/added", 1]]
+    assert [entry[:2] for entry in manifest["modified"]] == [["App.app/mod", 5]]
+    assert [entry[:2] for entry in manifest["deleted"]] == [["App.app/gone", 1]]
+    assert list(package._archive_entries(compare, iter([]), {"manifest": False})) == []
@@ -0,0 +1,88 @@
+import os
+import json
+import random
+from HashEngine import HashEngine
+from ChunkStore import ChunkStore
+from FolderCompare import FolderCompare
+
+
+def _tree(root, files):
+    for name, data in files.items():
+        path = os.path.join(root, *name.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(data)
+
+
+#导出的 recipe 能从旧版本文件和分块包还原出每个新增和修改的文件
+def test_export_restore(tmp_path):
+    generator = random.Random(1)
+    base = generator.randbytes(400 * 1024)
+    other = generator.randbytes(300 * 1024)
+    old_files = {"lib/a.bin": base, "lib/b.bin": other, "gone.bin": generator.randbytes(100 * 1024)}
+    new_files = {
+        "lib/a.bin": base[:150 * 1024] + generator.randbytes(2000) + base[150 * 1024:],
+        "lib/b.bin": other + b"tail",
+        "copy/a_twice.bin": base + base,
+        "new.txt": b"small file",
+        "empty": b"",
+    }
+    old_root = str(tmp_path / "old")
+    new_root = str(tmp_path / "new")
+    _tree(old_root, old_files)
+    _tree(new_root, new_files)
+    compare = FolderCompare(old_root, new_root, HashEngine(1))
+    compare.compare()
+    store = ChunkStore(min_size=4 * 1024, avg_size=16 * 1024, max_size=64 * 1024)
+    diff_dest = str(tmp_path / "diff")
+    report = store.export(compare, diff_dest)
+    assert report["files"] == len(new_files)
+    assert report["file_bytes"] == sum(len(data) for data in new_files.values())
+    #旧文件中的内容和同一版本内重复的内容都不再写入分块包，只有插入点、文件尾部和两份 base 拼接处附近的分块是新的
+    assert report["reused_old_bytes"] > len(base)
+    assert report["pack_bytes"] < 5 * store.max_size
+    with open(os.path.join(diff_dest, ChunkStore.RECIPE_NAME), encoding="utf-8") as f:
+        recipes = json.load(f)
+    assert recipes["chunk"] == {"min": 4 * 1024, "avg": 16 * 1024, "max": 64 * 1024}
+    assert sorted(recipes["files"]) == sorted(new_files)
+    pack_path = os.path.join(diff_dest, ChunkStore.PACK_NAME)
+    for relativePath, recipe in recipes["files"].items():
+        dst_path = str(tmp_path / "restored")
+        ChunkStore.restore(recipe, pack_path, old_root, dst_path)
+        with open(dst_path, "rb") as f:
+            assert f.read() == new_files[relativePath]
+
+
+#分块边界由内容决定，插入数据后只影响附近的分块
+def test_chunks_content_defined(tmp_path):
+    data = os.urandom(512 * 1024)
+    (tmp_path / "a").write_bytes(data)
+    (tmp_path / "b").write_bytes(b"inserted" + data)
+    store = ChunkStore(min_size=4 * 1024, avg_size=16 * 1024, max_size=64 * 1024)
+    chunks_a = store.chunks(str(tmp_path / "a"))
+    chunks_b = store.chunks(str(tmp_path / "b"))
+    assert sum(length for offset, length, digest in chunks_a) == len(data)
+    assert all(store.min_size <= length <= store.max_size for offset, length, digest in chunks_a[:-1])
+    digests_a = {digest for offset, length, digest in chunks_a}
+    assert len([digest for offset, length, digest in chunks_b if digest in digests_a]) >= len(chunks_a) - 2
+
+
+#超过 max_file_size 的文件不分块也不进入旧版本的索引，按完整文件导出
+def test_large_files_export_full(tmp_path):
+    big = os.urandom(64 * 1024)
+    old_root = str(tmp_path / "old")
+    new_root = str(tmp_path / "new")
+    _tree(old_root, {"big.bin": big, "small.bin": b"old small"})
+    _tree(new_root, {"big.bin": big + b"tail", "small.bin": b"new small"})
+    compare = FolderCompare(old_root, new_root, HashEngine(1))
+    compare.compare()
+    store = ChunkStore(min_size=1024, avg_size=4 * 1024, max_size=16 * 1024, max_file_size=32 * 1024)
+    assert store.index([compare.diff_dict["big.bin"].previous]) == {}
+    diff_dest = str(tmp_path / "diff")
+    report = store.export(compare, diff_dest)
+    assert (report["files"], report["full_files"], report["full_bytes"]) == (1, 1, len(big) + 4)
+    assert compare.diff_dict["big.bin"].encoding == "full"
+    with open(os.path.join(diff_dest, "big.bin"), "rb") as f:
+        assert f.read() == big + b"tail"
+    with open(os.path.join(diff_dest, ChunkStore.RECIPE_NAME), encoding="utf-8") as f:
+        assert list(json.load(f)["files"]) == ["small.bin"]
@@ -0,0 +1,76 @@
+import os
+import pytest
+from DeltaEncoder import DeltaEncoder
+
+
+#少量修改、插入和删除的文件差分后能还原，且 delta 明显小于新文件
+def test_round_trip(tmp_path):
+    old_path = str(tmp_path / "old.bin")
+    new_path = str(tmp_path / "new.bin")
+    delta_path = str(tmp_path / "out" / ("new.bin" + DeltaEncoder.SUFFIX))
+    DeltaEncoder.make_sample(old_path, new_path, 1024 * 1024)
+    assert DeltaEncoder().encode(old_path, new_path, delta_path)
+    assert os.path.getsize(delta_path) < os.path.getsize(new_path) // 10
+    decoded_path = str(tmp_path / "decoded.bin")
+    DeltaEncoder.decode(old_path, delta_path, decoded_path)
+    with open(decoded_path, "rb") as decoded, open(new_path, "rb") as new:
+        assert decoded.read() == new.read()
+
+
+#单条 ADD 指令超过 MAX_ADD_SIZE 时拆分，块大小不对齐的尾部也能还原
+def test_round_trip_large_add(tmp_path, monkeypatch):
+    monkeypatch.setattr(DeltaEncoder, "MAX_ADD_SIZE", 1000)
+    shared = os.urandom(200000 + 123)
+    (tmp_path / "old").write_bytes(shared)
+    (tmp_path / "new").write_bytes(shared[:100000] + os.urandom(5000) + shared[100000:])
+    encoder = DeltaEncoder(block_size=1024, min_size=1)
+    assert encoder.encode(str(tmp_path / "old"), str(tmp_path / "new"), str(tmp_path / "delta"))
+    DeltaEncoder.decode(str(tmp_path / "old"), str(tmp_path / "delta"), str(tmp_path / "decoded"))
+    assert (tmp_path / "decoded").read_bytes() == (tmp_path / "new").read_bytes()
+
+
+#无关的文件 delta 超过 ratio，放弃差分且不留下 delta 文件；小文件不做差分
+def test_not_kept(tmp_path):
+    (tmp_path / "old").write_bytes(os.urandom(256 * 1024))
+    (tmp_path / "new").write_bytes(os.urandom(256 * 1024))
+    (tmp_path / "small").write_bytes(b"x" * 100)
+    encoder = DeltaEncoder()
+    assert not encoder.encode(str(tmp_path / "old"), str(tmp_path / "new"), str(tmp_path / "delta"))
+    assert not (tmp_path / "delta").exists()
+    assert not encoder.encode(str(tmp_path / "small"), str(tmp_path / "small"), str(tmp_path / "delta"))
+    assert not (tmp_path / "delta").exists()
+
+
+#基准文件与编码时不同时拒绝还原，delta 文件头无效时报错
+def test_base_mismatch(tmp_path):
+    old_path = str(tmp_path / "old.bin")
+    new_path = str(tmp_path / "new.bin")
+    DeltaEncoder.make_sample(old_path, new_path, 256 * 1024)
+    assert DeltaEncoder().encode(old_path, new_path, str(tmp_path / "delta"))
+    (tmp_path / "other").write_bytes(b"x" * 1000)
+    with pytest.raises(ValueError):
+        DeltaEncoder.decode(str(tmp_path / "other"), str(tmp_path / "delta"), str(tmp_path / "decoded"))
+    #大小相同但内容不同的基准文件由文件头中的 md5 发现
+    data = bytearray((tmp_path / "old.bin").read_bytes())
+    data[-1] ^= 0xff
+    (tmp_path / "same_size").write_bytes(bytes(data))
+    with pytest.raises(ValueError, match="digest"):
+        DeltaEncoder.decode(str(tmp_path / "same_size"), str(tmp_path / "delta"), str(tmp_path / "decoded"))
+    (tmp_path / "bad").write_bytes(b"not a delta file")
+    with pytest.raises(ValueError):
+        DeltaEncoder.decode(old_path, str(tmp_path / "bad"), str(tmp_path / "decoded"))
+
+
+#连续未匹配的字节数或逐字节滚动的总字节数超过上限时放弃差分，即使 delta 仍小于 ratio
+def test_roll_limits(tmp_path, monkeypatch):
+    shared = os.urandom(512 * 1024)
+    (tmp_path / "old").write_bytes(shared)
+    (tmp_path / "new").write_bytes(shared[:100000] + os.urandom(20000) + shared[100000:200000] + os.urandom(20000) + shared[200000:])
+    encoder = DeltaEncoder(block_size=1024)
+    assert encoder.encode(str(tmp_path / "old"), str(tmp_path / "new"), str(tmp_path / "delta"))
+    monkeypatch.setattr(DeltaEncoder, "MAX_MISS_SIZE", 16 * 1024)
+    assert not encoder.encode(str(tmp_path / "old"), str(tmp_path / "new"), str(tmp_path / "delta"))
+    assert not (tmp_path / "delta").exists()
+    monkeypatch.setattr(DeltaEncoder, "MAX_MISS_SIZE", 1024 * 1024)
+    monkeypatch.setattr(DeltaEncoder, "MAX_ROLL_SIZE", 30000)
+    assert not encoder.encode(str(tmp_path / "old"), str(tmp_path / "new"), str(tmp_path / "delta"))
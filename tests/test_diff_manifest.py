@@ -0,0 +1,60 @@
+import os
+import json
+import hashlib
+from HashEngine import HashEngine
+from FolderCompare import FolderCompare
+from DiffManifest import DiffManifest
+
+
+def _tree(root, files):
+    for name, data in files.items():
+        path = os.path.join(root, *name.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(data)
+
+
+def _md5(data):
+    return hashlib.md5(data).hexdigest()
+
+
+def _manifest(tmp_path):
+    _tree(str(tmp_path / "old"), {"App.app/same": b"1", "App.app/bin/mod": b"old", "App.app/gone": b"gone"})
+    _tree(str(tmp_path / "new"), {"App.app/same": b"1", "App.app/bin/mod": b"newer", "App.app/added": b"add"})
+    compare = FolderCompare(str(tmp_path / "old"), str(tmp_path / "new"), HashEngine(1))
+    compare.compare()
+    return DiffManifest.from_compare(compare)
+
+
+#新增、修改、删除的文件都带有大小和摘要，大小预筛选跳过的文件也补齐摘要，路径使用 / 分隔
+def test_from_compare(tmp_path):
+    manifest = _manifest(tmp_path)
+    assert manifest.added == [["App.app/added", 3, _md5(b"add"), "full", ""]]
+    assert manifest.modified == [["App.app/bin/mod", 5, _md5(b"newer"), 3, _md5(b"old"), "full"]]
+    assert manifest.deleted == [["App.app/gone", 4, _md5(b"gone")]]
+    assert manifest.unchanged == 1
+    assert manifest.summary() == {"added": 1, "modified": 1, "deleted": 1, "unchanged": 1, "encoding": {"full": 2}}
+
+
+#to_bytes 与 write 写入相同的紧凑 JSON，load 读回的内容不变
+def test_to_bytes_and_load(tmp_path):
+    manifest = _manifest(tmp_path)
+    manifest.previous_version = "1.0"
+    manifest.current_version = "1.1"
+    manifest.root = "App.app"
+    data = manifest.to_bytes()
+    assert json.loads(data.decode("utf-8"))["summary"]["deleted"] == 1
+    manifest_path = str(tmp_path / "out" / DiffManifest.MANIFEST_NAME)
+    manifest.write(manifest_path)
+    with open(manifest_path, "rb") as file:
+        assert file.read() == data
+    loaded = DiffManifest.load(manifest_path)
+    assert loaded.to_dict() == manifest.to_dict()
+
+
+#清单在压缩包中的路径：根目录为空时在压缩包根目录，否则在根目录文件夹下
+def test_arcname():
+    manifest = DiffManifest()
+    assert manifest.arcname() == DiffManifest.MANIFEST_NAME
+    manifest.root = "App.app"
+    assert manifest.arcname() == "App.app/" + DiffManifest.MANIFEST_NAME
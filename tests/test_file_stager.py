@@ -0,0 +1,94 @@
+import os
+import errno
+import shutil
+import pytest
+from FileStager import FileStager
+
+
+def _source(tmp_path, data=b"content"):
+    src = str(tmp_path / "src")
+    with open(src, "wb") as file:
+        file.write(data)
+    return src
+
+
+def _read(path):
+    with open(path, "rb") as file:
+        return file.read()
+
+
+#不支持的方式失败后回退到下一种，并且后续文件不再尝试；其余方式按普通拷贝模拟，结果与文件系统无关
+@pytest.mark.parametrize("code", [errno.EXDEV, errno.EOPNOTSUPP])
+def test_unsupported_strategy_falls_back(tmp_path, monkeypatch, code):
+    src = _source(tmp_path)
+    stager = FileStager()
+    failed = stager.strategies[0]
+
+    def failing(self, strategy, src_path, dst_path):
+        if strategy == failed:
+            raise OSError(code, os.strerror(code))
+        shutil.copy(src_path, dst_path)
+    monkeypatch.setattr(FileStager, "_stage", failing)
+    used = stager.stage(src, str(tmp_path / "out" / "a"))
+    assert used != failed
+    assert failed not in stager.strategies
+    assert stager.stage(src, str(tmp_path / "out" / "b")) == used
+    assert stager.counters[used] == 2 and stager.counters[failed] == 0
+    assert _read(str(tmp_path / "out" / "a")) == b"content"
+
+
+#其他错误只跳过这一次，半成品文件被删除，方式保留给后续文件
+def test_transient_error_keeps_strategy(tmp_path, monkeypatch):
+    src = _source(tmp_path)
+    stager = FileStager(hardlink=False)
+    failed = stager.strategies[0]
+    calls = []
+
+    def failing(self, strategy, src_path, dst_path):
+        if strategy == failed and len(calls) == 0:
+            calls.append(strategy)
+            with open(dst_path, "wb") as file:
+                file.write(b"partial")
+            raise OSError(errno.EIO, "io error")
+        shutil.copy(src_path, dst_path)
+    monkeypatch.setattr(FileStager, "_stage", failing)
+    dst = str(tmp_path / "a")
+    assert stager.stage(src, dst) != failed
+    assert _read(dst) == b"content"
+    assert failed in stager.strategies
+    assert stager.stage(src, str(tmp_path / "b")) == failed
+
+
+#内核态拷贝没有拷贝完就返回 0 时报错，不留下截断的文件
+@pytest.mark.skipif(not hasattr(os, "copy_file_range"), reason="copy_file_range is not available")
+def test_short_kernel_copy_raises(tmp_path):
+    src = _source(tmp_path, b"12345")
+    with open(src, "rb") as source, open(str(tmp_path / "dst"), "wb") as dst:
+        with pytest.raises(OSError) as info:
+            FileStager._kernel_copy(FileStager.STRATEGY_COPY_FILE_RANGE, source.fileno(), dst.fileno(), 10)
+    assert info.value.errno == errno.EIO
+
+
+#缺少的目标目录自动创建，每个目录只创建一次；已存在的目标文件被替换
+def test_creates_missing_dirs_and_counts(tmp_path):
+    src = _source(tmp_path)
+    stager = FileStager(hardlink=False)
+    dst = str(tmp_path / "deep" / "er" / "file")
+    used = stager.stage(src, dst)
+    assert _read(dst) == b"content"
+    assert stager.created_dirs == {os.path.dirname(dst)}
+    with open(src, "wb") as file:
+        file.write(b"changed")
+    assert stager.stage(src, dst) == used
+    assert _read(dst) == b"changed"
+    assert stager.counters[used] == 2
+    assert sum(stager.counters.values()) == 2
+
+
+#硬链接与源文件共用同一个 inode
+def test_hardlink_first(tmp_path):
+    src = _source(tmp_path)
+    stager = FileStager()
+    dst = str(tmp_path / "out" / "a")
+    assert stager.stage(src, dst) == FileStager.STRATEGY_HARDLINK
+    assert os.stat(dst).st_ino == os.stat(src).st_ino
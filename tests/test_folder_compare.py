@@ -0,0 +1,85 @@
+import os
+import stat
+import zipfile
+from HashEngine import HashEngine
+from FolderCompare import FolderCompare
+from ZipBuilder import ZipBuilder
+
+
+def _tree(root, files):
+    for name, data in files.items():
+        path = os.path.join(root, *name.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(data)
+
+
+def _compare(tmp_path, old_files, new_files, detect_moves=False):
+    old_root = str(tmp_path / "old")
+    new_root = str(tmp_path / "new")
+    _tree(old_root, old_files)
+    _tree(new_root, new_files)
+    compare = FolderCompare(old_root, new_root, HashEngine(1), detectMoves=detect_moves)
+    compare.compare()
+    return compare
+
+
+def _path(name):
+    return name.replace("/", os.sep)
+
+
+def test_compare_statuses(tmp_path):
+    compare = _compare(tmp_path, {"a/same": b"1", "a/mod": b"old", "a/size": b"x", "a/gone": b"g", ".hidden": b"h"},
+                       {"a/same": b"1", "a/mod": b"new", "a/size": b"xy", "a/added": b"n", ".hidden": b"changed"})
+    assert {path: node.status for path, node in compare.diff_dict.items()} == {
+        _path("a/mod"): "modified", _path("a/size"): "modified", _path("a/added"): "added"}
+    assert list(compare.deleted_dict) == [_path("a/gone")]
+
+
+#move / copy 的文件不导出内容，单独统计；作为 move 来源的删除文件不计入 deleted
+def test_diff_counts_separate_moves(tmp_path):
+    moved = os.urandom(500)
+    copied = os.urandom(600)
+    compare = _compare(tmp_path, {"old_name": moved, "keep": copied, "gone": b"g"},
+                       {"new_name": moved, "keep": copied, "keep_copy": copied, "added": b"n"}, detect_moves=True)
+    assert compare.diffCounts() == {"added": 1, "modified": 0, "moved": 1, "copied": 1, "deleted": 1, "exported": 1}
+    export = str(tmp_path / "export")
+    assert compare.copyDiff(export) == 1
+    assert os.listdir(export) == ["added"]
+
+
+#流式比较与完整比较的结果相同，遍历按相对路径的字符串顺序输出
+def test_stream_matches_compare(tmp_path):
+    old_files = {"b/x": b"1", "a/y": b"2", "a-b": b"3", "c": b"4"}
+    new_files = {"b/x": b"9", "a/y": b"2", "a-b": b"3", "d": b"5"}
+    compare = _compare(tmp_path, old_files, new_files)
+    expected = {path: node.status for path, node in compare.diff_dict.items()}
+    streamed = {node.relativePath: node.status for node in compare.compareStream()}
+    assert streamed == expected
+    assert list(compare.deleted_dict) == ["c"]
+    paths = [record[1] for record in FolderCompare.walkSorted(str(tmp_path / "new"))]
+    assert paths == sorted(paths)
+
+
+#符号链接按链接本身比较和导出，暂存目录和直接写入压缩包得到相同的条目
+def test_symlinks_export_as_links(tmp_path):
+    compare = _compare(tmp_path, {"lib/A/data": b"1", "link": b"x"}, {"lib/A/data": b"1"})
+    new_root = str(tmp_path / "new")
+    os.symlink("A", os.path.join(new_root, "lib", "Current"))
+    os.symlink("lib/A/data", os.path.join(new_root, "link"))
+    os.symlink("missing", os.path.join(new_root, "dangling"))
+    compare.compare()
+    assert sorted(compare.diff_dict) == ["dangling", _path("lib/Current"), "link"]
+    assert compare.diff_dict["link"].status == "modified"
+    export = str(tmp_path / "export")
+    compare.copyDiff(export)
+    staged = {}
+    for record in FolderCompare.walk(export):
+        assert os.path.islink(record[0])
+        staged[record[1].replace(os.sep, "/")] = os.fsencode(os.readlink(record[0]))
+    zip_path = str(tmp_path / "direct.zip")
+    ZipBuilder.compress_files(compare.diffEntries(), zip_path)
+    with zipfile.ZipFile(zip_path) as archive:
+        assert all(stat.S_ISLNK(info.external_attr >> 16) for info in archive.infolist())
+        assert {info.filename: archive.read(info) for info in archive.infolist()} == staged
+    assert staged["lib/Current"] == b"A"
@@ -0,0 +1,136 @@
+import os
+import hashlib
+import pytest
+from HashEngine import HashEngine
+
+
+def _files(tmp_path):
+    files = {"empty": b"", "small": b"abc", "block": os.urandom(3 * 1024 * 1024 + 7)}
+    paths = []
+    for name, data in files.items():
+        (tmp_path / name).write_bytes(data)
+        paths.append(str(tmp_path / name))
+    return paths, list(files.values())
+
+
+#线程池、进程池、mmap 读取的结果与 hashlib 相同，顺序与输入顺序一致
+@pytest.mark.parametrize("algorithm", HashEngine.HASHLIB_ALGORITHMS)
+@pytest.mark.parametrize("use_process", [False, True])
+def test_hash_files(tmp_path, algorithm, use_process):
+    paths, contents = _files(tmp_path)
+    expected = [hashlib.new(algorithm, data).hexdigest() for data in contents]
+    with HashEngine(2, use_process, buffer_size=64 * 1024, algorithm=algorithm) as engine:
+        assert engine.hash_files(paths) == expected
+    assert HashEngine(1, algorithm=algorithm, mmap_threshold=1).hash_files(paths) == expected
+
+
+#逐块比较：大小不同、首尾块不同、中间块不同
+def test_compare_pairs(tmp_path):
+    data = os.urandom(300 * 1024)
+    (tmp_path / "a").write_bytes(data)
+    (tmp_path / "same").write_bytes(data)
+    (tmp_path / "middle").write_bytes(data[:150 * 1024] + b"x" + data[150 * 1024 + 1:])
+    (tmp_path / "tail").write_bytes(data[:-1] + b"x")
+    (tmp_path / "short").write_bytes(data[:-1])
+    pairs = [(str(tmp_path / "a"), str(tmp_path / name)) for name in ("same", "middle", "tail", "short")]
+    for sample in (False, True):
+        assert HashEngine(2).compare_pairs(pairs, sample, block_size=64 * 1024) == [True, False, False, False]
+
+
+#符号链接不跟随，摘要和逐块比较都按链接目标字符串计算
+def test_symlink_hashes_link_text(tmp_path):
+    (tmp_path / "target").write_bytes(os.urandom(2 * 1024 * 1024))
+    os.symlink("target", str(tmp_path / "link"))
+    os.symlink("target", str(tmp_path / "same"))
+    os.symlink("missing", str(tmp_path / "dangling"))
+    for mmap_threshold in (0, 1):
+        assert HashEngine.calculate(str(tmp_path / "link"), mmap_threshold=mmap_threshold) == hashlib.md5(b"target").hexdigest()
+    assert HashEngine(1).hash_files([str(tmp_path / "dangling")]) == [hashlib.md5(b"missing").hexdigest()]
+    assert HashEngine(1).compare_pairs([(str(tmp_path / "link"), str(tmp_path / "same")),
+                                        (str(tmp_path / "link"), str(tmp_path / "dangling"))]) == [True, False]
+
+
+#io_hints 默认关闭，丢弃页缓存只在显式打开时使用
+def test_io_hints_default_off():
+    assert not HashEngine(1).io_hints
+
+
+#读取顺序：none 保持输入顺序，inode 按 inode 排序，extent 按物理偏移排序，有文件取不到偏移时回退到 inode
+def test_read_order(tmp_path, monkeypatch):
+    paths = [str(tmp_path / name) for name in ("a", "b", "c")]
+    inodes = [30, 10, 20]
+    assert HashEngine(1, io_order=HashEngine.ORDER_NONE).read_order(paths, inodes) == [0, 1, 2]
+    assert HashEngine(1, io_order=HashEngine.ORDER_INODE).read_order(paths, inodes) == [1, 2, 0]
+    offsets = {paths[0]: 5, paths[1]: 9, paths[2]: 1}
+    monkeypatch.setattr(HashEngine, "physical_offset", staticmethod(lambda file_path: offsets[file_path]))
+    assert HashEngine(1, io_order=HashEngine.ORDER_EXTENT).read_order(paths, inodes) == [2, 0, 1]
+    offsets[paths[2]] = None
+    assert HashEngine(1, io_order=HashEngine.ORDER_EXTENT).read_order(paths, inodes) == [1, 2, 0]
+
+
+#物理偏移取不到时返回 None：空文件、不存在的文件、没有 fcntl 的系统
+def test_physical_offset(tmp_path, monkeypatch):
+    (tmp_path / "empty").write_bytes(b"")
+    (tmp_path / "data").write_bytes(os.urandom(64 * 1024))
+    assert HashEngine.physical_offset(str(tmp_path / "empty")) is None
+    assert HashEngine.physical_offset(str(tmp_path / "missing")) is None
+    offset = HashEngine.physical_offset(str(tmp_path / "data"))
+    assert offset is None or offset >= 0
+    monkeypatch.setattr("HashEngine.fcntl", None)
+    assert HashEngine.physical_offset(str(tmp_path / "data")) is None
+
+
+#窗口小于单个文件时每次只有一个文件在读取，结果仍按输入顺序返回，打开 io_hints 时每个文件预读一次
+def test_hash_window(tmp_path, monkeypatch):
+    paths, contents = _files(tmp_path)
+    prefetched = []
+    monkeypatch.setattr(HashEngine, "prefetch", lambda self, file_path, size: prefetched.append(file_path))
+    engine = HashEngine(2, io_hints=True, window_bytes=1024, buffer_size=64 * 1024)
+    sizes = [len(data) for data in contents]
+    order = [2, 0, 1]
+    assert engine._hash_window(paths, sizes, order) == [hashlib.md5(data).digest() for data in contents]
+    assert prefetched == ([paths[i] for i in order] if engine.io_hints else [])
+
+
+#每个文件恰好在一个批次中，大文件单独成批排在最前，其余批次的大小接近目标大小，文件数不超过上限
+def test_make_batches():
+    sizes = [100] * 40 + [5000, 3000] + [0] * 10
+    batches = HashEngine.make_batches(sizes, 2, batch_bytes=1000, batch_files=8)
+    assert sorted(i for batch in batches for i in batch) == list(range(len(sizes)))
+    assert batches[0] == [40] and batches[1] == [41]
+    totals = [sum(sizes[i] for i in batch) for batch in batches]
+    assert totals == sorted(totals, reverse=True)
+    assert all(len(batch) <= 8 for batch in batches)
+    assert all(total <= 1000 for total in totals[2:])
+    #总大小较小时目标大小为总大小的 1/(workers*4)，每个进程能分到多个批次
+    assert len(HashEngine.make_batches([10] * 64, 4)) == 16
+    assert HashEngine.make_batches([], 4) == []
+
+
+#小文件为主且数量和总大小足够时才使用进程池，慢速算法的小文件阈值更低
+def test_prefer_process():
+    many_small = [512 * 1024] * 1024
+    assert HashEngine.prefer_process("md5", many_small, 4)
+    assert not HashEngine.prefer_process("md5", many_small, 1)
+    assert not HashEngine.prefer_process("md5", many_small[:100], 4)
+    assert not HashEngine.prefer_process("md5", [1024] * 1024, 4)
+    assert not HashEngine.prefer_process("md5", [8 * 1024 * 1024] * 1024, 4)
+    assert not HashEngine.prefer_process("sha256", many_small, 4)
+    assert HashEngine.prefer_process("sha256", [32 * 1024] * 16 * 1024, 4)
+
+
+#进程池在多次调用之间复用，close 后重新创建，with 退出时关闭
+def test_process_pool_reused(tmp_path):
+    paths, contents = _files(tmp_path)
+    expected = [hashlib.md5(data).hexdigest() for data in contents]
+    with HashEngine(2, True) as engine:
+        assert engine.process_pool is None
+        assert engine.hash_files(paths) == expected
+        pool = engine.process_pool
+        assert pool is not None
+        assert engine.hash_files(paths) == expected
+        assert engine.process_pool is pool
+        engine.close()
+        assert engine.process_pool is None
+        assert engine.hash_files(paths) == expected
+    assert engine.process_pool is None
@@ -0,0 +1,134 @@
+import os
+import time
+import shutil
+import hashlib
+import zipfile
+from HashEngine import HashEngine
+from HashIndex import HashIndex
+from FolderCompare import FolderCompare
+from ParallelUnzip import ParallelUnzip
+
+DATE_TIME = (2024, 1, 2, 3, 4, 6)
+MTIME_NS = 10 ** 18
+
+
+def _digests(root, index):
+    compare = FolderCompare(root, root, HashEngine(1), index)
+    nodes = compare.getFileNodes(root)
+    compare.fillMD5([(root, list(nodes.values()))])
+    return {relativePath: node.md5 for relativePath, node in nodes.items()}
+
+
+def _write_zip(zip_path, contents):
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        for name, data in contents.items():
+            archive.writestr(zipfile.ZipInfo(name, DATE_TIME), data)
+
+
+#清空后重新解压到同一个目录：inode 可能被复用，修改时间来自压缩包，内容变化但大小不变的文件不能命中旧记录
+def test_reextracted_tree_is_rehashed(tmp_path):
+    old = {"app/f%02d.bin" % i: bytes([i]) * 4096 for i in range(20)}
+    new = {name: bytes([255 - data[0]]) * 4096 for name, data in old.items()}
+    _write_zip(str(tmp_path / "old.zip"), old)
+    _write_zip(str(tmp_path / "new.zip"), new)
+    root = str(tmp_path / "current")
+    index = HashIndex(str(tmp_path / "index.db"))
+    ParallelUnzip(1).extract([(str(tmp_path / "old.zip"), root)])
+    _digests(root, index)
+    shutil.rmtree(root)
+    ParallelUnzip(1).extract([(str(tmp_path / "new.zip"), root)])
+    index.hits = 0
+    digests = _digests(root, index)
+    index.close()
+    assert index.hits == 0
+    for name, data in new.items():
+        assert digests[name.replace("/", os.sep)] == hashlib.md5(data).hexdigest()
+
+
+#原地改写内容并恢复大小和修改时间，状态改变时间变化后不能命中
+def test_rewritten_file_is_rehashed(tmp_path):
+    root = str(tmp_path / "tree")
+    os.makedirs(root)
+    path = os.path.join(root, "a.bin")
+    with open(path, "wb") as file:
+        file.write(b"a" * 100)
+    os.utime(path, ns=(MTIME_NS, MTIME_NS))
+    index = HashIndex(str(tmp_path / "index.db"))
+    _digests(root, index)
+    time.sleep(0.01)
+    with open(path, "wb") as file:
+        file.write(b"b" * 100)
+    os.utime(path, ns=(MTIME_NS, MTIME_NS))
+    index.hits = 0
+    assert _digests(root, index)["a.bin"] == hashlib.md5(b"b" * 100).hexdigest()
+    assert index.hits == 0
+    index.close()
+
+
+#记录不以根目录为键：同一个文件从另一个挂载点访问时仍然命中，并且在重新打开索引后保留
+def test_index_is_independent_of_root(tmp_path):
+    root = str(tmp_path / "tree")
+    os.makedirs(os.path.join(root, "sub"))
+    with open(os.path.join(root, "sub", "a.bin"), "wb") as file:
+        file.write(b"content")
+    index_path = str(tmp_path / "index.db")
+    index = HashIndex(index_path)
+    expected = _digests(root, index)
+    index.close()
+    other_root = str(tmp_path / "mounted")
+    os.symlink(root, other_root)
+    index = HashIndex(index_path)
+    assert _digests(other_root, index) == expected
+    assert index.hits == 1
+    index.close()
+
+
+#算法不同时不复用记录
+def test_algorithm_mismatch_misses(tmp_path):
+    index = HashIndex(str(tmp_path / "index.db"), "md5")
+    index.store("a", 1, 2, 3, 4, "00")
+    index.flush()
+    assert index.lookup("a", 1, 2, 3, 4) == "00"
+    assert index.lookup("a", 1, 2, 3, 5) is None
+    index.close()
+    index = HashIndex(str(tmp_path / "index.db"), "sha256")
+    assert index.lookup("a", 1, 2, 3, 4) is None
+    index.close()
+
+
+#没有状态改变时间时既不查询也不记录
+def test_missing_ctime_is_not_cached(tmp_path):
+    index = HashIndex(str(tmp_path / "index.db"))
+    index.store("a", 1, 2, 3, None, "00")
+    assert index.count() == 0 and index.lookup("a", 1, 2, 3, None) is None
+    index.store("a", 1, 2, 3, 4, "00")
+    assert index.lookup("a", 1, 2, 3, 4) == "00"
+    assert index.lookup("a", 1, 2, 3, 5) is None
+    index.close()
+
+
+def test_compact_removes_dead_records(tmp_path):
+    index = HashIndex(str(tmp_path / "index.db"))
+    index.store("a", 1, 2, 3, 4, "00")
+    index.store("b", 1, 2, 5, 4, "11")
+    assert index.compact([("a", 3)]) == 1
+    assert index.count() == 1
+    index.close()
+
+
+#删除少量记录时不执行 VACUUM，空闲页比例超过阈值或显式要求时才回收空间
+def test_compact_vacuums_only_when_needed(tmp_path, monkeypatch):
+    index = HashIndex(str(tmp_path / "index.db"))
+    for i in range(5000):
+        index.store("dir/file%05d" % i, i, i, i, i, "%032x" % i)
+    index.flush()
+    monkeypatch.setattr(HashIndex, "VACUUM_RATIO", 1.0)
+    assert index.compact([("dir/file%05d" % i, i) for i in range(1000)]) == 4000
+    assert index.free_ratio() > 0.5
+    index.compact(vacuum=True)
+    assert index.free_ratio() == 0
+    monkeypatch.setattr(HashIndex, "VACUUM_RATIO", 0.25)
+    assert index.compact([("dir/file%05d" % i, i) for i in range(10)]) == 990
+    assert index.free_ratio() == 0
+    assert index.count() == 10
+    index.close()
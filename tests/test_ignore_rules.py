@@ -0,0 +1,50 @@
+import os
+from IgnoreRules import IgnoreRules
+from ConfigParser import ConfigParser
+
+
+def _path(path):
+    return path.replace("/", os.sep)
+
+
+#默认规则与原来的遍历过滤一致：只忽略隐藏文件和任意层级的 Applications，其他系统文件不在默认规则中
+def test_default_patterns():
+    rules = IgnoreRules()
+    assert rules.match("Applications", True)
+    assert rules.match(_path("App.app/Contents/Applications"), True)
+    assert rules.match(_path("sub/.DS_Store"))
+    assert not rules.match(_path("sub/__MACOSX"), True)
+    assert not rules.match("Thumbs.db")
+    assert not rules.match(_path("App.app/Contents/Info.plist"))
+    assert not rules.match("MyApplications", True)
+
+
+def test_anchored_and_directory_only():
+    rules = IgnoreRules(["/build", "cache/", "*.log", "docs/**/*.tmp"])
+    assert rules.match("build", True)
+    assert not rules.match(_path("sub/build"), True)
+    assert rules.match(_path("a/cache"), True)
+    assert not rules.match(_path("a/cache"), False)
+    assert rules.match(_path("a/b/x.log"))
+    assert rules.match(_path("docs/x.tmp"))
+    assert rules.match(_path("docs/a/b/x.tmp"))
+    assert not rules.match(_path("other/x.tmp"))
+
+
+#有取反规则时最后一条匹配的规则生效
+def test_negation():
+    rules = IgnoreRules(["*.bin", "!keep.bin"])
+    assert rules.match("a.bin")
+    assert not rules.match(_path("sub/keep.bin"))
+    assert rules.filter(["a.bin", "keep.bin", "c.txt"]) == ["keep.bin", "c.txt"]
+
+
+#config.json 在默认规则之外忽略 Windows 和 ditto 生成的系统文件
+def test_config_patterns():
+    parser = ConfigParser()
+    parser.parse()
+    rules = parser.get_ignore_rules()
+    assert rules.patterns[:2] == IgnoreRules.DEFAULT_PATTERNS
+    assert rules.match(_path("sub/__MACOSX"), True)
+    assert rules.match(_path("a/Thumbs.db"))
+    assert rules.match("desktop.ini")
@@ -0,0 +1,149 @@
+import os
+import random
+import shutil
+import hashlib
+import pytest
+from HashEngine import HashEngine
+from FolderCompare import FolderCompare
+from ManifestTable import ManifestTable, PathTable
+
+
+def _table(path_table, files):
+    table = ManifestTable("", 16, path_table)
+    for relativePath in sorted(files):
+        size, digest = files[relativePath]
+        table.append(relativePath, size, 0, 0, digest=digest)
+    return table
+
+
+#逐个文件比较的参考结果
+def _expected(old_files, new_files):
+    result = {"added": set(), "removed": set(), "modified": set(), "pending": set(), "unchanged": 0, "size_changed": 0}
+    for relativePath in old_files.keys() - new_files.keys():
+        result["removed"].add(relativePath)
+    for relativePath in new_files.keys() - old_files.keys():
+        result["added"].add(relativePath)
+    for relativePath in old_files.keys() & new_files.keys():
+        (old_size, old_digest), (new_size, new_digest) = old_files[relativePath], new_files[relativePath]
+        if old_size != new_size:
+            result["modified"].add(relativePath)
+            result["size_changed"] += 1
+        elif old_digest is None or new_digest is None:
+            result["pending"].add(relativePath)
+        elif old_digest != new_digest:
+            result["modified"].add(relativePath)
+        else:
+            result["unchanged"] += 1
+    return result
+
+
+def _paths(old, new, result):
+    return {
+        "added": {new.path(row) for row in result["added"]},
+        "removed": {old.path(row) for row in result["removed"]},
+        "modified": {new.path(new_row) for old_row, new_row in result["modified"]},
+        "pending": {new.path(new_row) for old_row, new_row in result["pending"]},
+        "unchanged": result["unchanged"],
+        "size_changed": result["size_changed"],
+    }
+
+
+#跨越多个比较区间的清单，结果与逐个文件比较相同，修改的行号指向同一个路径
+def test_diff_matches_reference():
+    generator = random.Random(5)
+    old_files = {}
+    for i in range(3 * ManifestTable.MAX_BLOCK + 100):
+        relativePath = os.path.join("d%02d" % (i % 37), "f%05d" % i)
+        old_files[relativePath] = (generator.randrange(1000), generator.randbytes(16))
+    new_files = dict(old_files)
+    for relativePath in generator.sample(sorted(old_files), 300):
+        del new_files[relativePath]
+    for i in range(300):
+        new_files[os.path.join("d%02d" % generator.randrange(40), "n%05d" % i)] = (1, generator.randbytes(16))
+    for relativePath in generator.sample(sorted(new_files), 200):
+        size, digest = new_files[relativePath]
+        new_files[relativePath] = generator.choice([(size + 1, digest), (size, generator.randbytes(16)), (size, None)])
+    path_table = PathTable()
+    old = _table(path_table, old_files)
+    new = _table(path_table, new_files)
+    result = ManifestTable.diff(old, new)
+    assert _paths(old, new, result) == _expected(old_files, new_files)
+    assert all(old.path(old_row) == new.path(new_row) for old_row, new_row in result["modified"] + result["pending"])
+    assert sorted(result["added"]) == result["added"]
+    assert sorted(result["removed"]) == result["removed"]
+
+
+def test_diff_edges():
+    path_table = PathTable()
+    files = {"a": (1, b"\x01" * 16), os.path.join("b", "c"): (2, b"\x02" * 16)}
+    empty = _table(path_table, {})
+    full = _table(path_table, files)
+    assert ManifestTable.diff(empty, full)["added"] == [0, 1]
+    assert ManifestTable.diff(full, empty)["removed"] == [0, 1]
+    assert ManifestTable.diff(full, _table(path_table, files))["unchanged"] == 2
+    with pytest.raises(ValueError):
+        ManifestTable.diff(full, _table(PathTable(), files))
+
+
+#补充摘要后 pending 中的文件对归入 modified 或 unchanged
+def test_resolve_pending():
+    path_table = PathTable()
+    old = _table(path_table, {"same": (3, b"\x01" * 16), "changed": (3, b"\x02" * 16)})
+    new = _table(path_table, {"same": (3, None), "changed": (3, None)})
+    result = ManifestTable.diff(old, new)
+    assert len(result["pending"]) == 2
+    new.set_hexdigest(0, "03" * 16)
+    new.set_hexdigest(1, "01" * 16)
+    ManifestTable.resolve(old, new, result)
+    assert result["pending"] == []
+    assert [new.path(new_row) for old_row, new_row in result["modified"]] == ["changed"]
+    assert result["unchanged"] == 1
+
+
+def _tree(root, files):
+    for name, data in files.items():
+        path = os.path.join(root, *name.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(data)
+
+
+#保存再读取后路径、大小和摘要都不变，缺少摘要的清单不能保存
+def test_save_load(tmp_path):
+    root = str(tmp_path / "tree")
+    _tree(root, {"a.txt": b"a", "dir/b.txt": b"bb", "dir/sub/c": b"", "z": b"zzz"})
+    table = ManifestTable.from_walk(root)
+    with pytest.raises(ValueError):
+        table.save(str(tmp_path / "manifest.json"), "md5")
+    table.fill_digests(range(len(table)), HashEngine(1))
+    manifest_path = str(tmp_path / "out" / ManifestTable.MANIFEST_NAME)
+    table.save(manifest_path, "md5")
+    loaded, algorithm = ManifestTable.load(manifest_path, root)
+    assert algorithm == "md5"
+    assert [(loaded.path(row), loaded.sizes[row], loaded.hexdigest(row)) for row in range(len(loaded))] == \
+        [(table.path(row), table.sizes[row], table.hexdigest(row)) for row in range(len(table))]
+
+
+#用上一个版本的清单代替上一个版本的文件比较，旧文件可以不存在
+def test_compare_manifest(tmp_path):
+    old_root = str(tmp_path / "old")
+    new_root = str(tmp_path / "new")
+    _tree(old_root, {"same": b"1", "mod": b"old", "size": b"x", "gone": b"g", "renamed": b"moved content"})
+    _tree(new_root, {"same": b"1", "mod": b"new", "size": b"xy", "added": b"n", "dir/renamed": b"moved content"})
+    old_table = ManifestTable.from_walk(old_root)
+    old_table.fill_digests(range(len(old_table)), HashEngine(1))
+    manifest_path = str(tmp_path / ManifestTable.MANIFEST_NAME)
+    old_table.save(manifest_path, "md5")
+    shutil.rmtree(old_root)
+    loaded, algorithm = ManifestTable.load(manifest_path, old_root)
+    compare = FolderCompare(old_root, new_root, HashEngine(1, algorithm=algorithm), detectMoves=True)
+    new_table = ManifestTable.compare_manifest(compare, loaded)
+    assert {path: node.status for path, node in compare.diff_dict.items()} == {
+        "mod": "modified", "size": "modified", "added": "added", os.path.join("dir", "renamed"): "added"}
+    assert compare.diff_dict["mod"].previous.md5 == hashlib.md5(b"old").hexdigest()
+    assert sorted(compare.deleted_dict) == ["gone", "renamed"]
+    assert compare.diff_dict[os.path.join("dir", "renamed")].encoding == "move"
+    assert compare.diffCounts()["deleted"] == 1
+    #新清单的所有行都有摘要，可以直接保存为这个版本的版本清单
+    assert all(new_table.hashed)
+    assert new_table.path(0) == "added" and new_table.hexdigest(0) == hashlib.md5(b"n").hexdigest()
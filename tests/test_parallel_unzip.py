@@ -0,0 +1,94 @@
+import os
+import stat
+import time
+import hashlib
+import zipfile
+import pytest
+from ParallelUnzip import ParallelUnzip
+
+DATE_TIME = (2024, 1, 2, 3, 4, 6)
+
+
+def _info(name, mode):
+    info = zipfile.ZipInfo(name, DATE_TIME)
+    info.create_system = 3
+    info.external_attr = mode << 16
+    return info
+
+
+def _symlink_zip(zip_path, link):
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        archive.writestr(_info("app/data.txt", stat.S_IFREG | 0o644), b"data")
+        archive.writestr(_info("app/link", stat.S_IFLNK | 0o777), link)
+
+
+def test_round_trip(tmp_path):
+    zip_path = str(tmp_path / "a.zip")
+    contents = {"app/a.txt": b"hello " * 10000, "app/bin/run": b"#!/bin/sh\n", "app/empty": b""}
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr(_info("app/a.txt", stat.S_IFREG | 0o644), contents["app/a.txt"])
+        archive.writestr(_info("app/bin/run", stat.S_IFREG | 0o755), contents["app/bin/run"])
+        archive.writestr(_info("app/empty", stat.S_IFREG | 0o600), b"", zipfile.ZIP_STORED)
+        archive.writestr("__MACOSX/app/._a.txt", b"resource")
+    dst = str(tmp_path / "out")
+    unzip = ParallelUnzip(2, buffer_size=4096)
+    assert unzip.extract([(zip_path, dst)]) == 3
+    for name, data in contents.items():
+        with open(os.path.join(dst, name), "rb") as file:
+            assert file.read() == data
+    assert os.stat(os.path.join(dst, "app/bin/run")).st_mode & 0o777 == 0o755
+    assert os.stat(os.path.join(dst, "app/a.txt")).st_mtime == time.mktime(DATE_TIME + (0, 0, -1))
+    assert not os.path.exists(os.path.join(dst, "__MACOSX"))
+
+
+def test_partial_extract_and_hash(tmp_path):
+    zip_path = str(tmp_path / "a.zip")
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("a.txt", b"a" * 5000)
+        archive.writestr("b.txt", b"b")
+    dst = str(tmp_path / "out")
+    ParallelUnzip(1).extract([(zip_path, dst, ["b.txt"])])
+    assert os.listdir(dst) == ["b.txt"]
+    digests = ParallelUnzip(1).hash_entries(zip_path, ["a.txt", "b.txt"], hashlib.md5)
+    assert digests == {"a.txt": hashlib.md5(b"a" * 5000).hexdigest(), "b.txt": hashlib.md5(b"b").hexdigest()}
+    with pytest.raises(KeyError):
+        ParallelUnzip(1).extract([(zip_path, dst, ["missing.txt"])])
+
+
+def test_relative_symlink_inside_root(tmp_path):
+    zip_path = str(tmp_path / "a.zip")
+    _symlink_zip(zip_path, "data.txt")
+    dst = str(tmp_path / "out")
+    ParallelUnzip(1).extract([(zip_path, dst)])
+    assert os.readlink(os.path.join(dst, "app", "link")) == "data.txt"
+
+
+@pytest.mark.parametrize("link", ["/etc/passwd", "../../outside", "../../../tmp"])
+def test_symlink_outside_root_is_rejected(tmp_path, link):
+    zip_path = str(tmp_path / "a.zip")
+    _symlink_zip(zip_path, link)
+    dst = str(tmp_path / "out")
+    with pytest.raises(zipfile.BadZipFile):
+        ParallelUnzip(1).extract([(zip_path, dst)])
+    assert not os.path.lexists(os.path.join(dst, "app", "link"))
+
+
+def test_unsafe_name_is_rejected(tmp_path):
+    zip_path = str(tmp_path / "a.zip")
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        archive.writestr("../evil.txt", b"x")
+    with pytest.raises(zipfile.BadZipFile):
+        ParallelUnzip(1).extract([(zip_path, str(tmp_path / "out"))])
+    assert not os.path.exists(str(tmp_path / "evil.txt"))
+
+
+def test_bad_crc_is_detected(tmp_path):
+    zip_path = str(tmp_path / "a.zip")
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        archive.writestr("a.txt", b"0123456789")
+    with open(zip_path, "r+b") as file:
+        data = file.read()
+        file.seek(data.index(b"0123456789"))
+        file.write(b"x")
+    with pytest.raises(zipfile.BadZipFile):
+        ParallelUnzip(1).extract([(zip_path, str(tmp_path / "out"))])
@@ -0,0 +1,114 @@
+import os
+import zlib
+import stat
+import random
+import zipfile
+from ParallelZip import ParallelZip, RawEntry
+
+
+def _check(zip_path, expected):
+    with zipfile.ZipFile(zip_path) as archive:
+        assert archive.testzip() is None
+        assert {info.filename: archive.read(info) for info in archive.infolist() if not info.is_dir()} == expected
+
+
+def test_crc32_combine():
+    generator = random.Random(1)
+    for length1, length2 in ((0, 0), (1, 0), (0, 7), (100, 3), (5000, 70000)):
+        data1 = generator.randbytes(length1)
+        data2 = generator.randbytes(length2)
+        assert ParallelZip.crc32_combine(zlib.crc32(data1), zlib.crc32(data2), length2) == zlib.crc32(data1 + data2)
+
+
+#多块文件按块并行压缩，每块以前一块末尾的数据作为字典，解压结果与原文件相同
+def test_round_trip_multi_block(tmp_path):
+    generator = random.Random(2)
+    src = tmp_path / "src"
+    (src / "sub").mkdir(parents=True)
+    files = {
+        "text.txt": b"upgrade package " * 20000,
+        "sub/random.bin": generator.randbytes(300000),
+        "sub/empty": b"",
+        "名字.txt": b"utf-8 name",
+    }
+    for name, data in files.items():
+        (src / name).write_bytes(data)
+    entries = [(str(src / "sub"), "sub")] + [(str(src / name), name) for name in files] + [(b"in memory", "memory.json")]
+    writer = ParallelZip(workers=2, block_size=64 * 1024)
+    stats = writer.write(entries, str(tmp_path / "out.zip"))
+    assert stats["entries"] == len(entries)
+    _check(str(tmp_path / "out.zip"), dict(files, **{"memory.json": b"in memory"}))
+
+
+#超过 Zip64 限制时写入 Zip64 扩展字段和结束记录
+def test_zip64(tmp_path, monkeypatch):
+    monkeypatch.setattr(ParallelZip, "ZIP64_LIMIT", 1000)
+    files = {"f%02d" % i: bytes([i]) * (500 + i * 100) for i in range(20)}
+    writer = ParallelZip(workers=2, block_size=512)
+    writer.write([(data, name) for name, data in files.items()], str(tmp_path / "out.zip"))
+    _check(str(tmp_path / "out.zip"), files)
+    with zipfile.ZipFile(str(tmp_path / "out.zip")) as archive:
+        assert any(info.extra.startswith(b"\x01\x00") for info in archive.infolist())
+
+
+#已经压缩过的扩展名和试压缩没有收益的数据直接存储
+def test_auto_store(tmp_path):
+    generator = random.Random(3)
+    (tmp_path / "photo.jpg").write_bytes(b"x" * 10000)
+    (tmp_path / "noise.bin").write_bytes(generator.randbytes(3 * 1024 * 1024))
+    (tmp_path / "text.txt").write_bytes(b"abc" * 10000)
+    writer = ParallelZip(workers=1)
+    entries = [(str(tmp_path / name), name) for name in ("photo.jpg", "noise.bin", "text.txt")]
+    writer.write(entries, str(tmp_path / "out.zip"))
+    with zipfile.ZipFile(str(tmp_path / "out.zip")) as archive:
+        methods = {info.filename: info.compress_type for info in archive.infolist()}
+    assert methods == {"photo.jpg": zipfile.ZIP_STORED, "noise.bin": zipfile.ZIP_STORED, "text.txt": zipfile.ZIP_DEFLATED}
+    assert writer.stats["decisions"]["extension_stored"] == 1
+    assert writer.stats["decisions"]["sample_stored"] == 1
+
+
+#原样拷贝的条目与源条目的压缩方式、crc、大小和属性都相同
+def test_raw_passthrough(tmp_path):
+    src_zip = str(tmp_path / "src.zip")
+    link = zipfile.ZipInfo("link", (2024, 1, 2, 3, 4, 6))
+    link.external_attr = (stat.S_IFLNK | 0o777) << 16
+    with zipfile.ZipFile(src_zip, "w") as archive:
+        archive.writestr("deflated.txt", b"hello world " * 100000, zipfile.ZIP_DEFLATED, 9)
+        archive.writestr("stored.bin", os.urandom(200000), zipfile.ZIP_STORED)
+        archive.writestr("empty", b"", zipfile.ZIP_DEFLATED)
+        archive.writestr(link, b"deflated.txt")
+    with zipfile.ZipFile(src_zip) as archive:
+        infos = archive.infolist()
+        expected = {"copy/" + info.filename: archive.read(info) for info in infos}
+    writer = ParallelZip(workers=2, block_size=64 * 1024)
+    writer.write([(RawEntry(src_zip, info), "copy/" + info.filename) for info in infos], str(tmp_path / "out.zip"))
+    assert writer.stats["raw"] == len(infos)
+    _check(str(tmp_path / "out.zip"), expected)
+    with zipfile.ZipFile(str(tmp_path / "out.zip")) as archive:
+        for info in infos:
+            copied = archive.getinfo("copy/" + info.filename)
+            assert (copied.compress_type, copied.CRC, copied.compress_size, copied.file_size, copied.date_time) == \
+                (info.compress_type, info.CRC, info.compress_size, info.file_size, info.date_time)
+        assert stat.S_ISLNK(archive.getinfo("copy/link").external_attr >> 16)
+
+
+def test_raw_entry_supported():
+    info = zipfile.ZipInfo("a")
+    info.compress_type = zipfile.ZIP_DEFLATED
+    assert RawEntry.supported(info)
+    info.flag_bits |= 0x1
+    assert not RawEntry.supported(info)
+    info = zipfile.ZipInfo("b")
+    info.compress_type = zipfile.ZIP_LZMA
+    assert not RawEntry.supported(info)
+
+
+#符号链接按链接本身写入，不跟随到目标
+def test_symlink_source(tmp_path):
+    (tmp_path / "target").write_bytes(b"content")
+    os.symlink("missing-target", str(tmp_path / "dangling"))
+    ParallelZip(workers=1).write([(str(tmp_path / "dangling"), "dangling")], str(tmp_path / "out.zip"))
+    with zipfile.ZipFile(str(tmp_path / "out.zip")) as archive:
+        info = archive.getinfo("dangling")
+        assert stat.S_ISLNK(info.external_attr >> 16)
+        assert archive.read(info) == b"missing-target"
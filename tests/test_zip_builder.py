@@ -0,0 +1,30 @@
+import os
+import zipfile
+from ZipBuilder import ZipBuilder
+
+
+def _framework(root):
+    versions = os.path.join(root, "Fw.framework", "Versions")
+    os.makedirs(os.path.join(versions, "A"))
+    with open(os.path.join(versions, "A", "Fw"), "wb") as file:
+        file.write(b"binary")
+    os.symlink("A", os.path.join(versions, "Current"))
+    os.symlink("Versions/Current/Fw", os.path.join(root, "Fw.framework", "Fw"))
+    return os.path.join(root, "Fw.framework")
+
+
+#指向文件夹的符号链接按链接写入，解压后仍是链接
+def test_directory_symlink_round_trip(tmp_path):
+    src = _framework(str(tmp_path / "src"))
+    zip_path = str(tmp_path / "fw.zip")
+    ZipBuilder(src).compress(zip_path)
+    with zipfile.ZipFile(zip_path) as archive:
+        names = archive.namelist()
+        assert archive.read("Fw.framework/Versions/Current") == b"A"
+    assert "Fw.framework/Versions/Current/Fw" not in names
+    dst = str(tmp_path / "out")
+    ZipBuilder.decompress_all([(zip_path, dst)])
+    current = os.path.join(dst, "Fw.framework", "Versions", "Current")
+    assert os.path.islink(current) and os.readlink(current) == "A"
+    with open(os.path.join(dst, "Fw.framework", "Fw"), "rb") as file:
+        assert file.read() == b"binary"
@@ -0,0 +1,121 @@
+import os
+import stat
+import hashlib
+import zipfile
+from HashEngine import HashEngine
+from FolderCompare import FolderCompare
+from ZipCompare import ZipCompare
+from ZipBuilder import ZipBuilder
+from ManifestTable import ManifestTable
+
+DATE_TIME = (2024, 1, 2, 3, 4, 6)
+
+
+def _info(name, mode=stat.S_IFREG | 0o644):
+    info = zipfile.ZipInfo(name, DATE_TIME)
+    info.create_system = 3
+    info.external_attr = mode << 16
+    info.compress_type = zipfile.ZIP_DEFLATED
+    return info
+
+
+def _write_zip(zip_path, files, links=None):
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        for name, data in files.items():
+            archive.writestr(_info(name), data)
+        for name, target in (links or {}).items():
+            archive.writestr(_info(name, stat.S_IFLNK | 0o777), target)
+
+
+def _compare(tmp_path, old_files, new_files, old_links=None, new_links=None, detect_moves=False):
+    old_zip = str(tmp_path / "old.zip")
+    new_zip = str(tmp_path / "new.zip")
+    _write_zip(old_zip, old_files, old_links)
+    _write_zip(new_zip, new_files, new_links)
+    compare = FolderCompare(str(tmp_path / "old"), str(tmp_path / "new"), HashEngine(1), detectMoves=detect_moves)
+    ZipCompare.compare_zip(compare, old_zip, new_zip, 1)
+    return compare, new_zip
+
+
+def _path(name):
+    return name.replace("/", os.sep)
+
+
+def test_classifies_by_size_and_crc(tmp_path):
+    old = {"app/same.txt": b"same", "app/size.txt": b"short", "app/crc.txt": b"aaaa", "app/gone.txt": b"gone"}
+    new = {"app/same.txt": b"same", "app/size.txt": b"longer", "app/crc.txt": b"bbbb", "app/new.txt": b"new"}
+    compare, new_zip = _compare(tmp_path, old, new)
+    assert {path: node.status for path, node in compare.diff_dict.items()} == {
+        _path("app/size.txt"): "modified", _path("app/crc.txt"): "modified", _path("app/new.txt"): "added"}
+    assert list(compare.deleted_dict) == [_path("app/gone.txt")]
+    node = compare.diff_dict[_path("app/crc.txt")]
+    assert node.md5 == hashlib.md5(b"bbbb").hexdigest()
+    assert node.previous.md5 == hashlib.md5(b"aaaa").hexdigest()
+    assert compare.stage_stats["unchanged"] == 1
+
+
+#符号链接改变而链接目标没有变化时，目标不会被解压，比较不能跟随链接；两边都按链接文本计算摘要
+def test_changed_symlink_with_unchanged_target(tmp_path):
+    files = {"Fw/Versions/A/lib": b"a" * 100, "Fw/Versions/B/lib": b"b" * 100}
+    compare, new_zip = _compare(tmp_path, files, files,
+                                {"Fw/Versions/Current": "A", "Fw/lib": "Versions/Current/lib"},
+                                {"Fw/Versions/Current": "B", "Fw/lib": "Versions/Current/lib"})
+    assert list(compare.diff_dict) == [_path("Fw/Versions/Current")]
+    node = compare.diff_dict[_path("Fw/Versions/Current")]
+    assert node.md5 == hashlib.md5(b"B").hexdigest()
+    assert node.previous.md5 == hashlib.md5(b"A").hexdigest()
+
+
+def test_detects_moves(tmp_path):
+    data = os.urandom(1000)
+    compare, new_zip = _compare(tmp_path, {"app/old_name.bin": data}, {"app/new_name.bin": data}, detect_moves=True)
+    node = compare.diff_dict[_path("app/new_name.bin")]
+    assert node.encoding == "move"
+    assert node.source == _path("app/old_name.bin")
+
+
+#版本清单由中央目录生成，所有条目都有摘要，未变化的条目也包含在内
+def test_manifest_table_covers_all_entries(tmp_path):
+    old = {"app/a.txt": b"a", "app/b.txt": b"b"}
+    new = {"app/a.txt": b"a", "app/b.txt": b"bb", "app/c.txt": b"c"}
+    compare, new_zip = _compare(tmp_path, old, new, new_links={"app/link": "a.txt"})
+    table = ZipCompare.manifest_table(compare, new_zip, 1)
+    rows = {table.path(row): table.hexdigest(row) for row in range(len(table))}
+    expected = dict(new, **{"app/link": b"a.txt"})
+    assert rows == {_path(name): hashlib.md5(data).hexdigest() for name, data in expected.items()}
+    assert [table.path(row) for row in range(len(table))] == sorted(rows)
+
+
+#比较时不解压新版本的条目，需要文件内容的条目由 extract_new 按需解压
+def test_compare_does_not_extract(tmp_path):
+    old = {"app/a.txt": b"a" * 100, "app/b.txt": b"b"}
+    new = {"app/a.txt": b"c" * 100, "app/b.txt": b"bb"}
+    compare, new_zip = _compare(tmp_path, old, new)
+    assert not os.path.exists(compare.new_path)
+    assert compare.diff_dict[_path("app/a.txt")].archive_entry[1].filename == "app/a.txt"
+    assert ZipCompare.extract_new(compare, [_path("app/a.txt")], 1) == 1
+    assert os.listdir(os.path.join(compare.new_path, "app")) == ["a.txt"]
+
+
+#同一个目录树由文件夹遍历和压缩包中央目录生成的清单相同，符号链接按链接本身记录，包括指向文件夹和不存在的目标
+def test_manifest_sources_agree_on_symlinks(tmp_path):
+    root = str(tmp_path / "tree")
+    os.makedirs(os.path.join(root, "Fw", "Versions", "A"))
+    with open(os.path.join(root, "Fw", "Versions", "A", "lib"), "wb") as file:
+        file.write(os.urandom(5000))
+    os.symlink("A", os.path.join(root, "Fw", "Versions", "Current"))
+    os.symlink("Versions/Current/lib", os.path.join(root, "Fw", "lib"))
+    os.symlink("missing", os.path.join(root, "dangling"))
+    walked = ManifestTable.from_walk(root)
+    walked.fill_digests(range(len(walked)), HashEngine(1))
+    zip_path = str(tmp_path / "tree.zip")
+    ZipBuilder.compress_files(ZipBuilder.list_entries(root), zip_path)
+    table = ZipCompare.manifest_table(FolderCompare(str(tmp_path / "old"), root, HashEngine(1)), zip_path, 1)
+
+    def rows(manifest):
+        return [(manifest.path(row), manifest.sizes[row], manifest.hexdigest(row), manifest.link(row)) for row in range(len(manifest))]
+    assert rows(table) == rows(walked)
+    assert [walked.link(row) for row in range(len(walked))] == [None, "A", "Versions/Current/lib", "missing"]
+    manifest_path = str(tmp_path / ManifestTable.MANIFEST_NAME)
+    walked.save(manifest_path, "md5")
+    assert rows(ManifestTable.load(manifest_path, root)[0]) == rows(walked)